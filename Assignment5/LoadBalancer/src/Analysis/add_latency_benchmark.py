@@ -0,0 +1,100 @@
+import asyncio
+import sys
+import time
+
+import aiohttp
+import numpy as np
+
+# Port of the load balancer, default 5000
+port = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+url = f'http://127.0.0.1:{port}'
+
+# Benchmark settings
+DURATION = 20  # Seconds of /home traffic
+CONCURRENCY = 50  # Concurrent /home requests
+ADD_AT = 5  # Seconds into the run at which /add is sent
+HOSTNAME = 'Bench-Server'  # Hostname of the server added and removed
+
+
+async def home_worker(session, deadline, samples):
+    """
+    Sends /home requests back to back until the deadline.
+
+    Args:
+        session (aiohttp.ClientSession): Session used for the requests.
+        deadline (float): perf_counter() value at which to stop.
+        samples (list): Receives (start time, latency in seconds, ok) per request.
+    """
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            async with session.get(f'{url}/home') as response:
+                await response.read()
+                ok = response.status == 200
+        except Exception:
+            ok = False
+        samples.append((start, time.perf_counter() - start, ok))
+
+
+async def membership_change(session, window):
+    """
+    Adds one server, then removes it, recording when the /add call was in progress.
+
+    Args:
+        session (aiohttp.ClientSession): Session used for the requests.
+        window (list): Receives the (start, end) perf_counter() values of the /add call.
+    """
+    await asyncio.sleep(ADD_AT)
+    start = time.perf_counter()
+    async with session.post(f'{url}/add', json={'n': 1, 'hostnames': [HOSTNAME]}) as response:
+        print(f"/add -> {response.status}: {await response.text()}".strip())
+    window.append((start, time.perf_counter()))
+
+    async with session.delete(f'{url}/rm', json={'n': 1, 'hostnames': [HOSTNAME]}) as response:
+        print(f"/rm -> {response.status}")
+
+
+def report(label, latencies):
+    """
+    Prints latency percentiles for a group of requests.
+
+    Args:
+        label (str): Name of the group.
+        latencies (list): Latencies in seconds.
+    """
+    if not latencies:
+        print(f"{label:>14} {0:>8}")
+        return
+    p50, p99, worst = np.percentile(np.array(latencies) * 1e3, [50, 99, 100])
+    print(f"{label:>14} {len(latencies):>8} {p50:>9.1f} {p99:>9.1f} {worst:>9.1f}")
+
+
+async def main():
+    """
+    Measures /home latency while a concurrent /add is in progress.
+
+    Requests are split by whether they started during the /add call. Before
+    /home stopped taking the membership lock, requests during /add waited
+    for the container to be created.
+    """
+    print(f"/home latency at {url}: {CONCURRENCY} concurrent requests for {DURATION}s, /add at {ADD_AT}s")
+    samples, window = [], []
+    timeout = aiohttp.ClientTimeout(total=60)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        deadline = time.perf_counter() + DURATION
+        workers = [home_worker(session, deadline, samples) for _ in range(CONCURRENCY)]
+        await asyncio.gather(membership_change(session, window), *workers)
+
+    add_start, add_end = window[0]
+    during = [latency for start, latency, _ in samples if add_start <= start <= add_end]
+    outside = [latency for start, latency, _ in samples if not add_start <= start <= add_end]
+    errors = sum(not ok for _, _, ok in samples)
+
+    print(f"/add took {(add_end - add_start) * 1e3:.0f} ms, {errors} failed /home requests")
+    print(f"{'requests':>14} {'count':>8} {'p50 (ms)':>9} {'p99 (ms)':>9} {'max (ms)':>9}")
+    report('during /add', during)
+    report('outside /add', outside)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,308 @@
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+# Make the load balancer modules importable when run from any directory.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'load_balancer'))
+
+from ConsistentHashing import ConsistentHashMap
+from HashFunctions import HASH_FUNCTIONS
+from RoutingEngines import ENGINES, create_hash_map
+
+# Number of lookups timed per configuration.
+LOOKUPS = 20000
+
+
+def build_ring(server_count, n_virtual=9, hash_function='polynomial'):
+    """
+    Builds a ring large enough to hold the requested number of servers.
+
+    Args:
+        server_count (int): Number of servers to add.
+        n_virtual (int): Number of virtual nodes per server.
+        hash_function (str): Hash strategy name.
+
+    Returns:
+        ConsistentHashMap: The populated hash map.
+    """
+    # Keep the occupancy of the default deployment (3 x 9 of 512 slots).
+    n_slots = max(512, server_count * n_virtual * 19)
+    return ConsistentHashMap(
+        hostnames=[f'Server-{i}' for i in range(server_count)],
+        n_slots=n_slots,
+        n_virtual=n_virtual,
+        hash_function=hash_function,
+    )
+
+
+def linear_find(ring, request_id):
+    """
+    Reference lookup that walks the slots one cell at a time.
+
+    Args:
+        ring (ConsistentHashMap): The hash map to query.
+        request_id (int): The ID of the request.
+
+    Returns:
+        str: The hostname of the owning server.
+    """
+    request_hash = ring.requestHash(request_id) % ring.n_slots
+    while ring.slots[request_hash] is None:
+        request_hash = (request_hash + 1) % ring.n_slots
+    return ring.slots[request_hash]
+
+
+def time_lookups(lookup, request_ids):
+    """
+    Times a lookup function over a list of request IDs.
+
+    Args:
+        lookup (callable): Function taking a request ID.
+        request_ids (list): Request IDs to look up.
+
+    Returns:
+        float: Mean latency per lookup in microseconds.
+    """
+    start = time.perf_counter()
+    for request_id in request_ids:
+        lookup(request_id)
+    return (time.perf_counter() - start) / len(request_ids) * 1e6
+
+
+def bench_find(server_counts=(10, 100, 1000)):
+    """
+    Compares the linear slot walk against the bisect lookup.
+
+    Per-lookup latency is printed for each server count; tests/ checks
+    that both lookups route identically.
+
+    Args:
+        server_counts (tuple): Server counts to benchmark.
+    """
+    print("find(): linear walk vs sorted-ring bisect")
+    print(f"{'servers':>8} {'slots':>8} {'linear (us)':>12} {'bisect (us)':>12} {'speedup':>8}")
+    for server_count in server_counts:
+        ring = build_ring(server_count)
+        request_ids = [random.randint(100000, 999999) for _ in range(LOOKUPS)]
+
+        linear = time_lookups(lambda r: linear_find(ring, r), request_ids)
+        bisected = time_lookups(ring.find, request_ids)
+        print(f"{server_count:>8} {ring.n_slots:>8} {linear:>12.3f} {bisected:>12.3f} {linear / bisected:>7.1f}x")
+
+
+def bench_find_many(batch_sizes=(10**3, 10**4, 10**5, 10**6, 10**7), server_count=3, hash_function='polynomial'):
+    """
+    Measures batch routing throughput of find_many().
+
+    Scalar find() throughput is reported for batches up to 1e5 IDs.
+
+    Args:
+        batch_sizes (tuple): Numbers of request IDs per batch.
+        server_count (int): Number of servers in the ring.
+        hash_function (str): Hash strategy name (polynomial and md5 are vectorized).
+    """
+    print(f"\nfind_many(): batch routing with {server_count} servers, {hash_function} hash")
+    print(f"{'IDs':>10} {'find (lookups/s)':>18} {'find_many (lookups/s)':>22}")
+    ring = build_ring(server_count, hash_function=hash_function)
+    rng = np.random.default_rng(0)
+    for batch_size in batch_sizes:
+        request_ids = rng.integers(100000, 999999, size=batch_size, endpoint=True)
+
+        start = time.perf_counter()
+        ring.find_many(request_ids)
+        batched = batch_size / (time.perf_counter() - start)
+
+        scalar = '-'
+        if batch_size <= 10**5:
+            scalar_ids = request_ids.tolist()
+            start = time.perf_counter()
+            for request_id in scalar_ids:
+                ring.find(request_id)
+            scalar = f"{batch_size / (time.perf_counter() - start):,.0f}"
+        print(f"{batch_size:>10} {scalar:>18} {batched:>22,.0f}")
+
+
+def bench_hash_functions(server_counts=(2, 3, 4, 5, 6), requests=10000):
+    """
+    Compares the registered hash strategies on lookup cost and load spread.
+
+    Lookup cost is the mean find() latency on the default 3-server ring.
+    Spread is measured like the client load test: route `requests` random
+    request IDs on the default 512-slot ring and report the max/mean load
+    ratio and the coefficient of variation of per-server counts.
+
+    Args:
+        server_counts (tuple): Server counts to measure spread at.
+        requests (int): Number of request IDs routed per configuration.
+    """
+    print(f"\nHash functions: lookup cost and load spread over {requests} requests")
+    header = f"{'hash':>12} {'find (us)':>10}"
+    for server_count in server_counts:
+        header += f" {f'N={server_count} max/mean':>15} {'cv':>5}"
+    print(header)
+
+    request_ids = [random.randint(100000, 999999) for _ in range(requests)]
+    for name in HASH_FUNCTIONS:
+        ring = ConsistentHashMap(hostnames=[f'Server-{i}' for i in range(3)], hash_function=name)
+        row = f"{name:>12} {time_lookups(ring.find, request_ids):>10.3f}"
+
+        for server_count in server_counts:
+            ring = ConsistentHashMap(hostnames=[f'Server-{i}' for i in range(server_count)], hash_function=name)
+            counts = dict.fromkeys(ring.getServerList(), 0)
+            for request_id in request_ids:
+                counts[ring.find(request_id)] += 1
+            loads = np.array(list(counts.values()), dtype=float)
+            row += f" {loads.max() / loads.mean():>15.2f} {loads.std() / loads.mean():>5.2f}"
+        print(row)
+
+
+def build_engine(engine, server_count, n_virtual=9):
+    """
+    Builds a routing engine with the given number of servers.
+
+    The ring gets the same slot count as build_ring(); the other engines
+    need no sizing.
+
+    Args:
+        engine (str): Engine name.
+        server_count (int): Number of servers to add.
+        n_virtual (int): Number of virtual nodes per server for the ring.
+
+    Returns:
+        The populated routing engine.
+    """
+    kwargs = {}
+    if engine == 'ring':
+        kwargs = {'n_slots': max(512, server_count * n_virtual * 19), 'n_virtual': n_virtual}
+    return create_hash_map(engine, hostnames=[f'Server-{i}' for i in range(server_count)], **kwargs)
+
+
+def keys_moved(engine_map, request_ids, change):
+    """
+    Applies a membership change and returns the fraction of keys that moved.
+
+    Args:
+        engine_map: The routing engine.
+        request_ids (list): Request IDs to track.
+        change (callable): Function applying the change to the engine.
+
+    Returns:
+        float: Fraction of request IDs whose owner changed.
+    """
+    before = [engine_map.find(r) for r in request_ids]
+    change(engine_map)
+    after = [engine_map.find(r) for r in request_ids]
+    return sum(b != a for b, a in zip(before, after)) / len(request_ids)
+
+
+def bench_engines(server_counts=(10, 100, 1000), keys=5000):
+    """
+    Compares routing engines on lookup latency, memory and key movement.
+
+    Memory is the traced allocation size of the built engine. Key
+    movement is the fraction of `keys` request IDs that change owner when
+    one server is added, and when a server from the middle of the
+    membership list is removed (ideal: 1/(N+1) and 1/N).
+
+    Args:
+        server_counts (tuple): Server counts to benchmark.
+        keys (int): Number of request IDs used for latency and movement.
+    """
+    print("\nRouting engines: latency, memory and keys moved")
+    print(f"{'engine':>12} {'servers':>8} {'find (us)':>10} {'memory (KB)':>12} {'add moved':>10} {'rm moved':>9} {'ideal':>6}")
+    request_ids = [random.randint(100000, 999999) for _ in range(keys)]
+    for engine in ENGINES:
+        for server_count in server_counts:
+            tracemalloc.start()
+            engine_map = build_engine(engine, server_count)
+            memory = tracemalloc.get_traced_memory()[0] / 1024
+            tracemalloc.stop()
+
+            latency = time_lookups(engine_map.find, request_ids)
+            added = keys_moved(engine_map, request_ids, lambda m: m.add('Server-new'))
+            removed = keys_moved(engine_map, request_ids, lambda m: m.remove(f'Server-{server_count // 2}'))
+            print(f"{engine:>12} {server_count:>8} {latency:>10.3f} {memory:>12.1f} {added:>10.4f} {removed:>9.4f} {1 / (server_count + 1):>6.4f}")
+
+
+def bench_rebalance(server_count=20, removed=5, keys=20000):
+    """
+    Compares keys moved by rebalance() against rebuilding the ring from scratch.
+
+    The ring gets `server_count` servers, loses `removed` of them and gains
+    one, which leaves virtual nodes displaced from their home slots. The
+    rebuild re-adds the surviving servers in order, as the old rebalance did.
+
+    Args:
+        server_count (int): Number of servers added initially.
+        removed (int): Number of servers removed before rebalancing.
+        keys (int): Number of request IDs tracked.
+    """
+    print(f"\nrebalance(): keys moved after removing {removed} of {server_count} servers and adding one")
+    print(f"{'probing':>10} {'rebuild':>8} {'rebalance':>10} {'plan ranges':>12}")
+    request_ids = [random.randint(100000, 999999) for _ in range(keys)]
+    for probing in ('linear', 'quadratic'):
+        ring = ConsistentHashMap(hostnames=[f'Server-{i}' for i in range(server_count)], probing=probing)
+        for i in range(removed):
+            ring.remove(f'Server-{i * 3}')
+        ring.add('Server-new')
+        before = [ring.find(r) for r in request_ids]
+
+        rebuilt = ConsistentHashMap(hostnames=ring.getServerList(), probing=probing)
+        rebuild_moved = sum(b != rebuilt.find(r) for b, r in zip(before, request_ids)) / keys
+
+        plan = ring.rebalance()
+        moved = sum(b != ring.find(r) for b, r in zip(before, request_ids)) / keys
+        print(f"{probing:>10} {rebuild_moved:>8.4f} {moved:>10.4f} {len(plan):>12}")
+
+
+def bench_storage(slot_counts=(512, 65536, 4 * 1024 * 1024), server_count=3):
+    """
+    Measures construction time and memory of the compact slot store.
+
+    Memory is the traced allocation size of the built ring. For reference,
+    the last column is the size of a plain Python list with one entry per
+    slot, which is what the slot store used to cost before the ring data.
+
+    Args:
+        slot_counts (tuple): Ring sizes to benchmark.
+        server_count (int): Number of servers added to each ring.
+    """
+    print(f"\nSlot storage: construction time and memory with {server_count} servers")
+    print(f"{'slots':>9} {'build (ms)':>11} {'memory (KB)':>12} {'list slots (KB)':>16}")
+    hostnames = [f'Server-{i}' for i in range(server_count)]
+    for n_slots in slot_counts:
+        tracemalloc.start()
+        start = time.perf_counter()
+        ring = ConsistentHashMap(hostnames=hostnames, n_slots=n_slots)
+        build = (time.perf_counter() - start) * 1e3
+        memory = tracemalloc.get_traced_memory()[0] / 1024
+        tracemalloc.stop()
+
+        tracemalloc.start()
+        slot_list = [None] * n_slots
+        list_memory = tracemalloc.get_traced_memory()[0] / 1024
+        tracemalloc.stop()
+        del ring, slot_list
+        print(f"{n_slots:>9} {build:>11.1f} {memory:>12.1f} {list_memory:>16.1f}")
+
+
+def main():
+    """
+    Runs all ring benchmarks.
+    """
+    random.seed(0)
+    bench_find()
+    bench_find_many()
+    bench_find_many(hash_function='md5')
+    bench_hash_functions()
+    bench_engines()
+    bench_rebalance()
+    bench_storage()
+
+
+if __name__ == "__main__":
+    main()
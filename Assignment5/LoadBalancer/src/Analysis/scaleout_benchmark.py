@@ -0,0 +1,113 @@
+import asyncio
+import sys
+import time
+
+import aiohttp
+
+# Port of the load balancer, default 5000
+port = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+url = f'http://127.0.0.1:{port}'
+
+# Benchmark settings
+N = int(sys.argv[2]) if len(sys.argv) > 2 else 10  # Servers added by /add
+CONCURRENCY = 20  # Concurrent /home requests
+WARMUP_REQUESTS = 300  # /home requests sent before /add to learn the existing server IDs
+TIMEOUT = 120  # Seconds to wait for every new server to serve a request
+HOSTNAME_PREFIX = 'Scale'  # Hostnames added and removed: Scale-1 .. Scale-N
+
+
+def server_id(payload: dict):
+    """
+    Extracts the server ID from a /home response.
+
+    Args:
+        payload (dict): JSON body of the response.
+
+    Returns:
+        int: The server ID, or None if the body has none.
+    """
+    try:
+        return int(payload['message'].split(':')[-1].strip())
+    except (KeyError, ValueError, AttributeError):
+        return None
+
+
+async def home(session):
+    """
+    Sends one /home request.
+
+    Args:
+        session (aiohttp.ClientSession): Session used for the request.
+
+    Returns:
+        int: ID of the server that answered, or None on failure.
+    """
+    try:
+        async with session.get(f'{url}/home') as response:
+            if response.status != 200:
+                return None
+            return server_id(await response.json())
+    except Exception:
+        return None
+
+
+async def home_worker(session, known, first_seen, done):
+    """
+    Sends /home requests back to back, recording when each new server first answers.
+
+    Args:
+        session (aiohttp.ClientSession): Session used for the requests.
+        known (set): Server IDs that answered before /add.
+        first_seen (dict): Receives server ID -> perf_counter() of its first answer.
+        done (asyncio.Event): Set once N new servers have answered.
+    """
+    while not done.is_set():
+        serv_id = await home(session)
+        if serv_id is not None and serv_id not in known and serv_id not in first_seen:
+            first_seen[serv_id] = time.perf_counter()
+            if len(first_seen) >= N:
+                done.set()
+
+
+async def main():
+    """
+    Measures time-to-first-served-request of servers added with /add.
+
+    Reports how long /add took, when the first new server answered a
+    /home request, and when all N of them had. Run it with and without
+    WARM_POOL_SIZE set on the load balancer to compare cold and warm
+    scale-out.
+    """
+    hostnames = [f'{HOSTNAME_PREFIX}-{i}' for i in range(1, N + 1)]
+    timeout = aiohttp.ClientTimeout(total=60)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        known = set(await asyncio.gather(*[home(session) for _ in range(WARMUP_REQUESTS)])) - {None}
+        print(f"Scale-out at {url}: /add n={N}, existing server IDs {sorted(known)}")
+
+        first_seen, done = {}, asyncio.Event()
+        workers = [asyncio.create_task(home_worker(session, known, first_seen, done)) for _ in range(CONCURRENCY)]
+
+        start = time.perf_counter()
+        async with session.post(f'{url}/add', json={'n': N, 'hostnames': hostnames}) as response:
+            print(f"/add -> {response.status}")
+        add_done = time.perf_counter()
+
+        try:
+            await asyncio.wait_for(done.wait(), TIMEOUT)
+        except asyncio.TimeoutError:
+            print(f"Only {len(first_seen)} of {N} new servers answered within {TIMEOUT}s")
+        done.set()
+        await asyncio.gather(*workers)
+
+        async with session.delete(f'{url}/rm', json={'n': N, 'hostnames': hostnames}) as response:
+            print(f"/rm -> {response.status}")
+
+    served = sorted(t - start for t in first_seen.values())
+    print(f"{'/add returned':>28} {(add_done - start) * 1e3:>9.0f} ms")
+    if served:
+        print(f"{'first new server served':>28} {served[0] * 1e3:>9.0f} ms")
+        print(f"{f'{len(served)} new servers served':>28} {served[-1] * 1e3:>9.0f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -3,10 +3,21 @@ import signal
 import requests
 import asyncio
 import aiohttp
+import csv
 import json
+import math
+import random
 import matplotlib.pyplot as plt
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
 from pprint import pp
-from time import time
+from time import time, perf_counter
+
+try:  # PyYAML is only needed for YAML scenario files
+    import yaml
+except ImportError:
+    yaml = None
 
 # Get the port number from command-line arguments, default to 5000 if not provided
 port = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
@@ -52,7 +63,7 @@ def make_request(endpoint: str, payload=None):
         return f'Response: {response.text} | Code: {response.status_code}'
 
 # Load testing function with concurrency using asyncio and aiohttp
-async def gather_with_concurrency(session: aiohttp.ClientSession, batch: int, *urls: str):
+async def gather_with_concurrency(session: aiohttp.ClientSession, batch: int, *urls: str, latencies: list = None):
     """
     Execute multiple HTTP requests concurrently with a limit on the number of concurrent requests.
 
@@ -60,6 +71,7 @@ async def gather_with_concurrency(session: aiohttp.ClientSession, batch: int, *u
         session (aiohttp.ClientSession): The session used to make HTTP requests.
         batch (int): The maximum number of concurrent requests.
         *urls (str): The list of URLs to send requests to.
+        latencies (list, optional): Receives the latency in seconds of every successful request.
 
     Returns:
         list: List of responses or None for requests that resulted in exceptions.
@@ -70,8 +82,11 @@ async def gather_with_concurrency(session: aiohttp.ClientSession, batch: int, *u
     async def fetch(url: str):
         async with semaphore:  # Ensure that no more than 'batch' requests run concurrently
             try:
+                start = perf_counter()
                 async with session.get(url) as response:
                     await response.read()  # Read the response content
+                if latencies is not None:
+                    latencies.append(perf_counter() - start)
                 await asyncio.sleep(0)  # Yield control to the event loop to avoid blocking
                 return response
             except Exception as e:
@@ -83,48 +98,181 @@ async def gather_with_concurrency(session: aiohttp.ClientSession, batch: int, *u
             else r for r in 
             await asyncio.gather(*tasks, return_exceptions=True)]  # Return results, handling exceptions
 
+# Percentile of a list of values, linearly interpolated
+def percentile(values: list, q: float):
+    """
+    Compute the q-th percentile of a list of values.
+
+    Args:
+        values (list): The values (need not be sorted).
+        q (float): Percentile between 0 and 100.
+
+    Returns:
+        float: The interpolated percentile, or 0.0 for an empty list.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+# Latency histogram with log-spaced buckets, merged across processes by adding counts
+HIST_MIN = 1e-6  # Lower edge of bucket 0 in seconds
+HIST_BUCKETS_PER_DECADE = 100  # Buckets per factor of 10 (each ~2.3% wide)
+
+def hist_bucket(seconds: float):
+    """
+    Get the histogram bucket of a latency.
+
+    Args:
+        seconds (float): The latency.
+
+    Returns:
+        int: The bucket index.
+    """
+    return max(0, int(math.log10(max(seconds, HIST_MIN) / HIST_MIN) * HIST_BUCKETS_PER_DECADE))
+
+def hist_percentile(hist: dict, q: float):
+    """
+    Compute the q-th percentile of a latency histogram.
+
+    Args:
+        hist (dict): Bucket index -> count.
+        q (float): Percentile between 0 and 100.
+
+    Returns:
+        float: Upper edge of the bucket holding the percentile, or 0.0 for an empty histogram.
+    """
+    total = sum(hist.values())
+    if not total:
+        return 0.0
+    seen = 0
+    for bucket in sorted(hist):
+        seen += hist[bucket]
+        if seen >= total * q / 100:
+            break
+    return HIST_MIN * 10 ** ((bucket + 1) / HIST_BUCKETS_PER_DECADE)
+
+# Extract the server ID from a /home response
+async def response_server_id(response):
+    """
+    Get the ID of the server that answered a /home request.
+
+    Args:
+        response (aiohttp.ClientResponse): The response, or None if the request failed.
+
+    Returns:
+        int: The server ID, or 0 for a failed request or an unexpected answer.
+    """
+    if response is None or not response.status == 200:
+        return 0
+    try:
+        return payload_server_id(await response.json())  # Parse the JSON response
+    except Exception as e:
+        print(f"Error processing response: {e}")
+        return 0
+
+def payload_server_id(payload: dict):
+    """Extract the server ID from the JSON body of a /home response."""
+    return int(payload.get('message', '').split(':')[-1].strip())
+
+# One process's share of the load test
+async def load_share(target: str, request_count: int, concurrency: int):
+    """
+    Send /home requests with a concurrency limit and tally the answers.
+
+    Args:
+        target (str): Base URL of the load balancer.
+        request_count (int): Number of requests to send.
+        concurrency (int): Maximum concurrent requests.
+
+    Returns:
+        tuple: (requests per server ID with 0 = errors, latency histogram,
+        wall-clock start time, wall-clock end time)
+    """
+    latencies = []
+    async with aiohttp.ClientSession() as session:
+        started = time()
+        responses = await gather_with_concurrency(
+            session, concurrency,
+            *[f'{target}/home' for _ in range(request_count)],
+            latencies=latencies
+        )
+        finished = time()
+
+    # Parse the answers after the timed run, so parsing does not compete with sending
+    counts = Counter([await response_server_id(response) for response in responses])
+    hist = Counter(hist_bucket(latency) for latency in latencies)
+    return dict(counts), dict(hist), started, finished
+
+# Entry point of a load test worker process
+def load_share_process(target: str, request_count: int, concurrency: int):
+    """Run load_share() in a worker process with its own event loop and connection pool."""
+    return asyncio.run(load_share(target, request_count, concurrency))
+
+# Read the load balancer's counters from /rep
+async def lb_report(session: aiohttp.ClientSession):
+    """
+    Get the load balancer's report, including its CPU time and proxy counters.
+
+    Args:
+        session (aiohttp.ClientSession): The session used to make HTTP requests.
+
+    Returns:
+        dict: The 'message' part of /rep, or an empty dict if unavailable.
+    """
+    try:
+        async with session.get(f'{url}/rep') as response:
+            payload = await response.json()
+        return payload['message']
+    except Exception:
+        return {}
+
 # Main testing function for load testing
-async def tester(server_count=3):
+async def tester(server_count=3, procs=1):
     """
     Perform load testing by sending 10,000 requests to the specified number of servers.
 
     Args:
         server_count (int): The number of servers to test.
+        procs (int): Number of worker processes sharing the requests and the
+            1000-request concurrency limit, each with its own event loop and
+            connection pool.
 
     Returns:
         dict: A dictionary of counts representing the number of requests handled by each server.
     """
-    print(f"Testing with {server_count} servers at {url} for 10000 requests")
+    print(f"Testing with {server_count} servers at {url} for 10000 requests" + (f" from {procs} processes" if procs > 1 else ""))
     
     N = server_count
     counts = {k: 0 for k in range(N+1)}  # Dictionary to count requests per server (including errors)
     counts[0] = 0  # Count for errors
 
-    # Create an asynchronous session for making HTTP requests
     async with aiohttp.ClientSession() as session:
-        responses = await gather_with_concurrency(
-            session, 1000,  # Limit to 1000 concurrent requests at a time
-            *[f'{url}/home' for _ in range(10000)]  # Send 10,000 requests to the /home endpoint
-        )
-    
-    # Process the responses and count successful requests per server
-    for response in responses:
-        if response is None or not response.status == 200:
-            counts[0] += 1  # Increment error count if no response or non-200 status code
-            continue
-            
-        try:
-            payload = await response.json()  # Parse the JSON response
-            serv_id = int(payload.get('message', '').split(':')[-1].strip())  # Extract server ID
-            
-            # Increment the count for the appropriate server ID
-            if serv_id is not None and 1 <= serv_id <= N:
-                counts[serv_id] += 1
-            else:
-                counts[0] += 1  # Increment error count for invalid server ID
-        except Exception as e:
-            print(f"Error processing response: {e}")
-            counts[0] += 1  # Increment error count on exception
+        report_before = await lb_report(session)
+        if procs == 1:
+            results = [await load_share(url, 10000, 1000)]  # Limit to 1000 concurrent requests at a time
+        else:
+            # Shard the 10,000 requests and the concurrency limit over the processes
+            shares = [10000 // procs + (i < 10000 % procs) for i in range(procs)]
+            loop = asyncio.get_running_loop()
+            with ProcessPoolExecutor(max_workers=procs, mp_context=get_context('spawn')) as pool:
+                results = await asyncio.gather(*[
+                    loop.run_in_executor(pool, load_share_process, url, share, math.ceil(1000 / procs))
+                    for share in shares
+                ])
+        report_after = await lb_report(session)
+
+    # Merge the per-process counts and latency histograms
+    hist = Counter()
+    for share_counts, share_hist, _, _ in results:
+        hist.update(share_hist)
+        for serv_id, count in share_counts.items():
+            # Count answers from unexpected server IDs as errors
+            counts[serv_id if 1 <= serv_id <= N else 0] += count
+    elapsed = max(finished for *_, finished in results) - min(started for _, _, started, _ in results)
     
     # Print the counts of requests handled by each server (and errors)
     pp(counts)
@@ -135,6 +283,22 @@ async def tester(server_count=3):
 
     print(f"Success rate: {success_count/total_count*100:.2f}% ({success_count}/{total_count})")
 
+    # Throughput and latency at 1000 concurrent clients
+    print(f"Throughput: {total_count / elapsed:.0f} requests/s ({elapsed:.2f}s total)")
+    print(f"Latency: p50 {hist_percentile(hist, 50) * 1e3:.1f} ms, p99 {hist_percentile(hist, 99) * 1e3:.1f} ms")
+    if 'cpu_seconds' in report_before and 'cpu_seconds' in report_after:
+        cpu = report_after['cpu_seconds'] - report_before['cpu_seconds']
+        print(f"Load balancer CPU: {cpu / total_count * 1e6:.0f} us per request")
+    if 'proxy' in report_before and 'proxy' in report_after:
+        fired = {k: report_after['proxy'][k] - report_before['proxy'][k] for k in ('hedges', 'hedge_wins', 'retries')}
+        print(f"Hedges: {fired['hedges']} ({fired['hedge_wins']} won), retries: {fired['retries']}")
+
+    # Max/mean load ratio over servers (1.0 = perfectly even)
+    server_loads = [counts[k] for k in range(1, N+1)]
+    if success_count:
+        print(f"Max/mean load ratio: {max(server_loads) / (success_count / N):.2f}"
+              + (f" (balancing: {report_after['balancing']})" if 'balancing' in report_after else ""))
+
     # Make sure we have bars for all IDs from 0..N, even if some are zero
     for k in range(N+1):
         counts.setdefault(k, 0)
@@ -172,14 +336,337 @@ async def tester(server_count=3):
     
     return counts
 
+# Open-loop load generator: requests start on a fixed schedule, whatever the responses do
+async def open_loop(rate: float, duration: float, arrival: str = 'constant'):
+    """
+    Send /home requests at a target rate for a fixed duration and report latency percentiles.
+
+    Every request's start time is scheduled up front (evenly spaced for
+    'constant', exponential gaps for 'poisson') and does not wait for earlier
+    requests to finish. Latency is measured from the scheduled start, so time
+    a request spent waiting because the generator or the load balancer fell
+    behind is counted instead of hidden (no coordinated omission).
+
+    Args:
+        rate (float): Target requests per second.
+        duration (float): Seconds to keep generating requests.
+        arrival (str): 'constant' or 'poisson'.
+
+    Returns:
+        dict: The summary written to the JSON results file.
+    """
+    if arrival not in ('constant', 'poisson'):
+        raise ValueError(f"Unknown arrival process: {arrival}")
+
+    # Scheduled start of every request, in seconds from the start of the run
+    schedule, t = [], 0.0
+    while True:
+        t += random.expovariate(rate) if arrival == 'poisson' else 1 / rate
+        if t >= duration:
+            break
+        schedule.append(t)
+    print(f"Open-loop test at {url}: {rate:g} requests/s ({arrival}) for {duration:g}s, {len(schedule)} requests")
+
+    results = []  # (scheduled start, latency, status), status 0 = no response
+    bodies = []  # Bodies of the successful answers, parsed after the run
+
+    # No connection limit: a capped pool would queue requests and close the loop again
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=10)) as session:
+        async def fire(scheduled: float, start: float):
+            try:
+                async with session.get(f'{url}/home') as response:
+                    body = await response.read()
+                    status = response.status
+                if status == 200:
+                    bodies.append(body)
+            except Exception:
+                status = 0
+            results.append((scheduled, perf_counter() - start, status))
+
+        tasks = []
+        t0 = perf_counter()
+        for scheduled in schedule:
+            delay = t0 + scheduled - perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(fire(scheduled, t0 + scheduled)))
+        await asyncio.gather(*tasks)
+        elapsed = perf_counter() - t0
+        report = await lb_report(session)
+
+    # Requests answered by each server
+    server_counts = Counter()
+    for body in bodies:
+        try:
+            server_counts[payload_server_id(json.loads(body))] += 1
+        except Exception:
+            pass
+
+    ok = [latency for _, latency, status in results if status == 200]
+    errors_per_second = [0] * max(1, int(duration + 0.999))
+    for scheduled, _, status in results:
+        if status != 200:
+            errors_per_second[int(scheduled)] += 1
+
+    summary = {
+        'target_rate': rate,
+        'arrival': arrival,
+        'duration_s': duration,
+        'sent': len(results),
+        'succeeded': len(ok),
+        'errors': len(results) - len(ok),
+        'throughput_rps': len(ok) / elapsed,
+        'latency_ms': {f'p{q:g}': percentile(ok, q) * 1e3 for q in (50, 90, 99, 99.9)},
+        'errors_per_second': errors_per_second,
+        'balancing': report.get('balancing'),
+        'server_counts': {str(k): v for k, v in sorted(server_counts.items())},
+        'max_server_share': max(server_counts.values()) / len(ok) if server_counts else 0.0,
+    }
+
+    print(f"Throughput: {summary['throughput_rps']:.0f} requests/s ({len(ok)}/{len(results)} succeeded in {elapsed:.2f}s)")
+    print("Latency: " + ", ".join(f"{q} {v:.1f} ms" for q, v in summary['latency_ms'].items()))
+    print(f"Errors: {summary['errors']} ({summary['errors'] / duration:.1f}/s, peak {max(errors_per_second)}/s)")
+    print(f"Max server share: {summary['max_server_share'] * 100:.1f}% of {len(server_counts)} servers"
+          + (f" (balancing: {summary['balancing']})" if summary['balancing'] else ""))
+
+    # Machine-readable results next to the plots
+    filename = f'../../plots/openloop-{rate:g}rps-{arrival}'
+    with open(f'{filename}.json', 'w') as f:
+        json.dump(summary, f, indent=4)
+    with open(f'{filename}.csv', 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['scheduled_s', 'latency_ms', 'status'])
+        for scheduled, latency, status in sorted(results):
+            writer.writerow([f'{scheduled:.6f}', f'{latency * 1e3:.3f}', status])
+    print(f"Results saved as {filename}.json and {filename}.csv")
+
+    return summary
+
+# Scenario runner: open-loop load with membership changes and container kills on a timeline
+SCENARIO_ACTIONS = ('add', 'rm', 'kill', 'rate')  # Event types a scenario may contain
+
+def load_scenario(path: str):
+    """
+    Read and validate a scenario file.
+
+    A scenario is a JSON (or, with PyYAML installed, YAML) object:
+
+        name       - used to name the result files (default: file name)
+        duration   - seconds to run
+        rate       - initial /home requests per second
+        arrival    - 'constant' (default) or 'poisson'
+        interval   - seconds per point of the output time series (default 1)
+        kill_command - command a hostname is appended to for 'kill' events
+                       (default ["docker", "kill"])
+        events     - list of {"at": seconds, "action": ..., ...}:
+                     add  {"n", "hostnames"}  - POST /add
+                     rm   {"n", "hostnames"}  - DELETE /rm
+                     kill {"hostname"}        - kill a server container (flatline)
+                     rate {"rate"}            - change the request rate
+
+    Args:
+        path (str): Path of the scenario file.
+
+    Returns:
+        dict: The scenario with defaults filled in and events sorted by time.
+    """
+    with open(path) as f:
+        if path.endswith(('.yaml', '.yml')):
+            if yaml is None:
+                _raise_value_error("Install PyYAML to read YAML scenarios, or use JSON")
+            scenario = yaml.safe_load(f)
+        else:
+            scenario = json.load(f)
+
+    scenario.setdefault('name', path.rsplit('/', 1)[-1].rsplit('.', 1)[0])
+    scenario.setdefault('arrival', 'constant')
+    scenario.setdefault('interval', 1)
+    scenario.setdefault('kill_command', ['docker', 'kill'])
+    scenario['events'] = sorted(scenario.get('events', []), key=lambda event: event['at'])
+    if scenario.get('duration', 0) <= 0 or scenario.get('rate', 0) <= 0:
+        _raise_value_error("Scenario needs a positive duration and rate")
+    if scenario['arrival'] not in ('constant', 'poisson'):
+        _raise_value_error(f"Unknown arrival process: {scenario['arrival']}")
+    for event in scenario['events']:
+        if event.get('action') not in SCENARIO_ACTIONS:
+            _raise_value_error(f"Unknown scenario action {event.get('action')!r}; expected one of {SCENARIO_ACTIONS}")
+    return scenario
+
+async def run_scenario(path: str):
+    """
+    Run a scenario against the load balancer and record a time series.
+
+    /home requests are sent open-loop at the scenario's current rate while
+    the events fire at their scheduled times. Every interval of the run
+    reports throughput, error rate, p99 latency and each server's share of
+    the successful requests, so the series shows how quickly /add or a
+    flatline respawn restores capacity.
+
+    Args:
+        path (str): Path of the scenario file.
+
+    Returns:
+        dict: The results written to the JSON file.
+    """
+    scenario = load_scenario(path)
+    duration, interval = scenario['duration'], scenario['interval']
+    rate = scenario['rate']
+    print(f"Scenario {scenario['name']} at {url}: {duration:g}s, {len(scenario['events'])} events")
+
+    results = []  # (scheduled start, latency, status, body)
+    event_log = []  # What every event did and when
+
+    async def run_event(event: dict, session: aiohttp.ClientSession, t0: float):
+        nonlocal rate
+        start = perf_counter()
+        entry = {**event, 'started_s': round(start - t0, 3)}
+        try:
+            if event['action'] == 'rate':
+                rate = float(event['rate'])
+                entry['result'] = 'ok'
+            elif event['action'] == 'kill':
+                process = await asyncio.create_subprocess_exec(
+                    *scenario['kill_command'], event['hostname'],
+                    stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE)
+                _, stderr = await process.communicate()
+                entry['result'] = 'ok' if process.returncode == 0 else stderr.decode().strip()
+            else:
+                method, endpoint = (session.post, 'add') if event['action'] == 'add' else (session.delete, 'rm')
+                payload = {'n': event.get('n', len(event.get('hostnames', []))), 'hostnames': event.get('hostnames', [])}
+                async with method(f'{url}/{endpoint}', json=payload) as response:
+                    entry['result'] = response.status
+                    entry['response'] = await response.json()
+        except Exception as e:
+            entry['result'] = f'error: {e}'
+        entry['took_s'] = round(perf_counter() - start, 3)
+        event_log.append(entry)
+        print(f"[{entry['started_s']:7.2f}s] {event['action']} -> {entry['result']} ({entry['took_s']:.2f}s)")
+
+    # No connection limit: a capped pool would queue requests and close the loop again
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=10)) as session:
+        async def fire(scheduled: float, start: float):
+            try:
+                async with session.get(f'{url}/home') as response:
+                    body = await response.read()
+                    status = response.status
+            except Exception:
+                body, status = b'', 0
+            results.append((scheduled, perf_counter() - start, status, body))
+
+        tasks, pending_events = [], list(scenario['events'])
+        t0 = perf_counter()
+        scheduled = 0.0
+        while True:
+            scheduled += random.expovariate(rate) if scenario['arrival'] == 'poisson' else 1 / rate
+            while pending_events and pending_events[0]['at'] <= scheduled:
+                event = pending_events.pop(0)
+                delay = t0 + event['at'] - perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.create_task(run_event(event, session, t0)))
+            if scheduled >= duration:
+                break
+            delay = t0 + scheduled - perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(fire(scheduled, t0 + scheduled)))
+        await asyncio.gather(*tasks)
+
+    # Time series by scheduled start, one point per interval
+    points = int(math.ceil(duration / interval))
+    buckets = [[] for _ in range(points)]
+    for scheduled, latency, status, body in results:
+        buckets[min(points - 1, int(scheduled / interval))].append((latency, status, body))
+    series = []
+    for i, bucket in enumerate(buckets):
+        ok = [latency for latency, status, _ in bucket if status == 200]
+        shares = Counter()
+        for _, status, body in bucket:
+            if status == 200:
+                try:
+                    shares[payload_server_id(json.loads(body))] += 1
+                except Exception:
+                    pass
+        series.append({
+            't_s': i * interval,
+            'sent': len(bucket),
+            'throughput_rps': len(ok) / interval,
+            'error_rate': (len(bucket) - len(ok)) / len(bucket) if bucket else 0.0,
+            'p99_ms': percentile(ok, 99) * 1e3,
+            'server_share': {serv_id: count / len(ok) for serv_id, count in sorted(shares.items())},
+        })
+
+    output = {'scenario': scenario, 'events': sorted(event_log, key=lambda e: e['started_s']), 'series': series}
+    filename = f"../../plots/scenario-{scenario['name']}"
+    with open(f'{filename}.json', 'w') as f:
+        json.dump(output, f, indent=4)
+    server_ids = sorted({serv_id for point in series for serv_id in point['server_share']})
+    with open(f'{filename}.csv', 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['t_s', 'sent', 'throughput_rps', 'error_rate', 'p99_ms'] + [f'share_{k}' for k in server_ids])
+        for point in series:
+            writer.writerow([point['t_s'], point['sent'], f"{point['throughput_rps']:.1f}",
+                             f"{point['error_rate']:.4f}", f"{point['p99_ms']:.1f}"]
+                            + [f"{point['server_share'].get(k, 0):.4f}" for k in server_ids])
+
+    # Throughput, error rate and p99 over time, with the events marked
+    t = [point['t_s'] for point in series]
+    fig, axes = plt.subplots(3, 1, figsize=(10, 9), sharex=True)
+    axes[0].plot(t, [point['throughput_rps'] for point in series])
+    axes[0].set_ylabel('Throughput (req/s)')
+    axes[1].plot(t, [point['error_rate'] * 100 for point in series], color='tab:red')
+    axes[1].set_ylabel('Errors (%)')
+    axes[2].plot(t, [point['p99_ms'] for point in series], color='tab:green')
+    axes[2].set_ylabel('p99 latency (ms)')
+    axes[2].set_xlabel('Time (s)')
+    for event in output['events']:
+        for ax in axes:
+            ax.axvline(event['started_s'], color='gray', linestyle='--', linewidth=0.8)
+        axes[0].annotate(event['action'], (event['started_s'], 1), xycoords=('data', 'axes fraction'),
+                         rotation=90, va='top', ha='right', fontsize=8)
+    fig.suptitle(f"Scenario: {scenario['name']}")
+    fig.tight_layout()
+    fig.savefig(f'{filename}.png', dpi=150)
+    plt.close(fig)
+
+    print(f"Results saved as {filename}.json, {filename}.csv and {filename}.png")
+    return output
+
 # Main entry point for running the load test
-async def main(server_count=3):
-    return await tester(server_count=server_count)
+async def main(server_count=3, procs=1):
+    return await tester(server_count=server_count, procs=procs)
 
 # Raise ValueError with a custom message (used for error handling)
 def _raise_value_error(message):
     raise ValueError(message)
 
+# Parse the arguments of the TEST command: [n] [--procs N]
+def parse_test_args(args: list):
+    """
+    Parse the arguments of a load test.
+
+    Args:
+        args (list): Arguments after TEST, e.g. ['3', '--procs', '4'].
+
+    Returns:
+        dict: Keyword arguments for main().
+    """
+    kwargs = {}
+    args = list(args)
+    if '--procs' in args:
+        i = args.index('--procs')
+        if i + 1 >= len(args):
+            _raise_value_error("--procs needs a number of processes")
+        kwargs['procs'] = int(args[i + 1])
+        if kwargs['procs'] < 1:
+            _raise_value_error("--procs must be at least 1")
+        del args[i:i + 2]
+    if args:
+        kwargs['server_count'] = int(args[0])
+    return kwargs
+
 # Parse the user command input
 def parse_command(cmd: str):
     """
@@ -199,7 +686,9 @@ def parse_command(cmd: str):
         "ADD": lambda p: ('ADD', int(p[0]), p[1:]) if p else (_raise_value_error("Not enough arguments for ADD")),
         "DEL": lambda p: ('DEL', int(p[0]), p[1:]) if p else (_raise_value_error("Not enough arguments for DEL")),
         "REP": lambda _: ('REP',),
-        "TEST": lambda p: ('TEST', {"server_count": int(p[0])}) if p else ('TEST', {}),
+        "TEST": lambda p: ('TEST', parse_test_args(p)),
+        "SCENARIO": lambda p: ('SCENARIO', p[0]) if p else (_raise_value_error("Not enough arguments for SCENARIO")),
+        "LOAD": lambda p: ('LOAD', float(p[0]), float(p[1]), *p[2:3]) if len(p) >= 2 else (_raise_value_error("Not enough arguments for LOAD")),
         "HELP": lambda _: ('HELP',),
         "QUIT": lambda _: ('QUIT',)
     }
@@ -227,12 +716,20 @@ def handle_command(cmd: str, *args):
     elif cmd == 'TEST':
         asyncio.run(main(**args[0]))  # Running async function
         return "Test completed"
+    elif cmd == 'LOAD':
+        asyncio.run(open_loop(*args))
+        return "Load test completed"
+    elif cmd == 'SCENARIO':
+        asyncio.run(run_scenario(args[0]))
+        return "Scenario completed"
     elif cmd == 'HELP':
         return """Available commands:
                   ADD n [hostnames...]    - Add n servers with optional hostnames
                   DEL n [hostnames...]    - Delete n servers with optional hostnames
                   REP                     - Get server report
-                  TEST n                  - Run load test with n servers
+                  TEST n [--procs N]      - Run load test with n servers (from N processes)
+                  LOAD rate secs [poisson] - Open-loop load test at rate requests/s
+                  SCENARIO file           - Run a scaling scenario (JSON/YAML timeline)
                   HELP                    - Show this help message
                   QUIT                    - Exit the program"""
     elif cmd == 'QUIT':
@@ -252,7 +749,9 @@ def interactive_mode():
              ADD n [hostnames...]    - Add n servers with optional hostnames
              DEL n [hostnames...]    - Delete n servers with optional hostnames
              REP                     - Get server report
-             TEST n                  - Run load test with n servers
+             TEST n [--procs N]      - Run load test with n servers (from N processes)
+             LOAD rate secs [poisson] - Open-loop load test at rate requests/s
+             SCENARIO file           - Run a scaling scenario (JSON/YAML timeline)
              HELP                    - Show this help message
              QUIT                    - Exit the program""")
 
@@ -278,7 +777,13 @@ if __name__ == '__main__':
     """
     if len(sys.argv) > 2:
         if sys.argv[2].upper() == 'TEST':
-            server_count = int(sys.argv[3]) if len(sys.argv) > 3 else 3
-            asyncio.run(main(server_count=server_count))  # Run the load test
+            asyncio.run(main(**parse_test_args(sys.argv[3:])))  # Run the load test
+        elif sys.argv[2].upper() == 'LOAD':
+            rate = float(sys.argv[3]) if len(sys.argv) > 3 else 500
+            duration = float(sys.argv[4]) if len(sys.argv) > 4 else 30
+            arrival = sys.argv[5] if len(sys.argv) > 5 else 'constant'
+            asyncio.run(open_loop(rate, duration, arrival))  # Run the open-loop load test
+        elif sys.argv[2].upper() == 'SCENARIO':
+            asyncio.run(run_scenario(sys.argv[3]))  # Run a scaling scenario
     else:
         interactive_mode()  # Start the interactive mode
@@ -0,0 +1,147 @@
+import time
+from typing import Dict, Optional
+
+
+CLOSED = 'closed'  # Requests flow normally
+OPEN = 'open'  # Requests are routed around the server
+HALF_OPEN = 'half-open'  # One probe request is let through to test the server
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for one server, fed by the outcome of proxied requests.
+
+    The breaker keeps exponentially weighted moving averages (EWMA) of the
+    server's error rate and latency. It opens when the error EWMA reaches
+    error_threshold (or the latency EWMA exceeds latency_limit), which makes
+    routing skip the server. After open_seconds it turns half-open and lets a
+    single probe request through: success closes it, failure opens it again.
+    """
+
+    __slots__ = ('alpha', 'error_threshold', 'latency_limit', 'open_seconds',
+                 'state', 'error_rate', 'latency', 'opened_at', 'probing', 'last_success')
+
+    def __init__(self, alpha: float = 0.2, error_threshold: float = 0.5,
+                 latency_limit: Optional[float] = None, open_seconds: float = 5.0):
+        """
+        Initialize a closed breaker.
+
+        Args:
+            alpha: EWMA weight of the newest request (0 < alpha <= 1)
+            error_threshold: Error EWMA at which the breaker opens
+            latency_limit: Latency EWMA in seconds at which the breaker opens (None = ignore latency)
+            open_seconds: Seconds the breaker stays open before a probe is allowed
+        """
+        self.alpha = alpha
+        self.error_threshold = error_threshold
+        self.latency_limit = latency_limit
+        self.open_seconds = open_seconds
+
+        self.state = CLOSED
+        self.error_rate = 0.0
+        self.latency = 0.0
+        self.opened_at = 0.0
+        self.probing = False  # Whether the half-open probe is in flight
+        self.last_success = 0.0  # monotonic() time of the last successful request
+
+    def allow(self, now: Optional[float] = None) -> bool:
+        """
+        Check whether a request may be sent to the server.
+
+        A True answer for an open or half-open breaker claims the single
+        probe slot, so only call this right before sending the request.
+
+        Args:
+            now: Current monotonic() time (defaults to now)
+
+        Returns:
+            bool: True if the request may be sent
+        """
+        if self.state == CLOSED:
+            return True
+        now = time.monotonic() if now is None else now
+        if self.state == OPEN and now - self.opened_at >= self.open_seconds:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def record(self, ok: bool, latency: float = 0.0, now: Optional[float] = None):
+        """
+        Record the outcome of a request sent to the server.
+
+        Args:
+            ok: Whether the server answered successfully
+            latency: Request latency in seconds (used for successes only)
+            now: Current monotonic() time (defaults to now)
+        """
+        now = time.monotonic() if now is None else now
+        self.error_rate += self.alpha * ((0.0 if ok else 1.0) - self.error_rate)
+        if ok:
+            self.latency += self.alpha * (latency - self.latency)
+            self.last_success = now
+
+        if self.state == HALF_OPEN:
+            self.probing = False
+            if ok:
+                # The probe succeeded: start over with a clean error history
+                self.state = CLOSED
+                self.error_rate = 0.0
+            else:
+                self._trip(now)
+        elif self.state == CLOSED and (
+                self.error_rate >= self.error_threshold
+                or (self.latency_limit is not None and self.latency > self.latency_limit)):
+            self._trip(now)
+
+    def cancel(self):
+        """Release the probe slot of a request that was cancelled before it finished."""
+        self.probing = False
+
+    def _trip(self, now: float):
+        """Open the breaker."""
+        self.state = OPEN
+        self.opened_at = now
+
+    def trip(self, now: Optional[float] = None):
+        """
+        Open the breaker on outside evidence, e.g. another worker's verdict.
+
+        Args:
+            now: Current monotonic() time (defaults to now)
+        """
+        self._trip(time.monotonic() if now is None else now)
+
+    def reset(self):
+        """Close the breaker with a clean error history, e.g. after another worker's probe succeeded."""
+        self.state = CLOSED
+        self.error_rate = 0.0
+        self.probing = False
+
+    def idle(self, seconds: float, now: Optional[float] = None) -> bool:
+        """
+        Check whether the server has had no successful request recently.
+
+        Args:
+            seconds: Length of the window
+            now: Current monotonic() time (defaults to now)
+
+        Returns:
+            bool: True if no request succeeded in the last `seconds`
+        """
+        now = time.monotonic() if now is None else now
+        return now - self.last_success >= seconds
+
+    def to_dict(self) -> Dict:
+        """
+        Get the breaker's state for reporting.
+
+        Returns:
+            Dict: State, error EWMA and latency EWMA in milliseconds
+        """
+        return {
+            'state': self.state,
+            'error_rate': round(self.error_rate, 3),
+            'latency_ms': round(self.latency * 1e3, 1),
+        }
@@ -0,0 +1,355 @@
+import hashlib
+import math
+import struct
+from typing import Callable, Dict, Optional
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for the vectorized request hashes
+    np = None
+
+MASK32 = 0xFFFFFFFF
+MASK64 = 0xFFFFFFFFFFFFFFFF
+
+
+def _rotl32(x: int, r: int) -> int:
+    return ((x << r) | (x >> (32 - r))) & MASK32
+
+
+def _rotl64(x: int, r: int) -> int:
+    return ((x << r) | (x >> (64 - r))) & MASK64
+
+
+# Given Hash Functions
+def polynomial_request_hash(i: int) -> int:
+    return i**2 + 2*i + 17 # H(i) = i^2 + 2*i + 17
+
+def polynomial_server_hash(i: int, j: int) -> int:
+    return i**2 + j**2 + 2*j + 25 # Φ(i, j) = i^2 + j^2 + 2*j + 25
+
+def polynomial_request_hash_many(ids, n_slots: int):
+    ids = ids % n_slots # Reduce first so i^2 cannot overflow int64
+    return (ids * ids + 2 * ids + 17) % n_slots
+
+
+# MD5-Based Hash Functions
+def md5(data: bytes) -> int:
+    return int(hashlib.md5(data).hexdigest(), 16)
+
+
+# Per-step constants of MD5 (RFC 1321): left rotations and sine-derived additions
+MD5_SHIFTS = [7, 12, 17, 22] * 4 + [5, 9, 14, 20] * 4 + [4, 11, 16, 23] * 4 + [6, 10, 15, 21] * 4
+MD5_SINES = [int(abs(math.sin(i + 1)) * 2**32) & MASK32 for i in range(64)]
+MD5_BATCH = 1 << 16  # Request IDs hashed per NumPy pass, bounding the temporary arrays
+
+
+def _md5_decimal_block(ids, n_slots: int):
+    """
+    MD5 of the decimal strings of non-negative IDs, reduced mod n_slots.
+
+    A decimal int64 has at most 19 digits, so every message fits in a
+    single padded 64-byte block and the compression function runs once,
+    on uint32 columns holding one message word each.
+    """
+    n_digits = np.ones(len(ids), dtype=np.int64)
+    for k in range(1, 19):
+        n_digits += ids >= 10**k
+
+    # Padded block: ASCII digits, 0x80, zeros, then the bit length (< 256)
+    block = np.zeros((len(ids), 64), dtype=np.uint8)
+    rows = np.arange(len(ids))
+    powers = 10 ** np.arange(19, dtype=np.int64)
+    for pos in range(int(n_digits.max())):
+        has = pos < n_digits
+        block[has, pos] = 48 + ids[has] // powers[n_digits[has] - 1 - pos] % 10
+    block[rows, n_digits] = 0x80
+    block[:, 56] = n_digits * 8
+    words = block.view('<u4')
+
+    a0, b0, c0, d0 = (np.uint32(v) for v in (0x67452301, 0xEFCDAB89, 0x98BADCFE, 0x10325476))
+    a, b, c, d = (np.full(len(ids), v, dtype=np.uint32) for v in (a0, b0, c0, d0))
+    for i in range(64):
+        if i < 16:
+            f, g = (b & c) | (~b & d), i
+        elif i < 32:
+            f, g = (d & b) | (~d & c), (5 * i + 1) % 16
+        elif i < 48:
+            f, g = b ^ c ^ d, (3 * i + 5) % 16
+        else:
+            f, g = c ^ (b | ~d), (7 * i) % 16
+        f = f + a + np.uint32(MD5_SINES[i]) + words[:, g]
+        shift = MD5_SHIFTS[i]
+        a, d, c, b = d, c, b, b + ((f << np.uint32(shift)) | (f >> np.uint32(32 - shift)))
+
+    # md5() reads the digest as one big-endian integer; reduce it a word at a time
+    remainder = np.zeros(len(ids), dtype=np.uint64)
+    for word in (a + a0, b + b0, c + c0, d + d0):
+        remainder = (remainder * np.uint64(1 << 32) + word.byteswap().astype(np.uint64)) % np.uint64(n_slots)
+    return remainder.astype(np.int64)
+
+
+def md5_request_hash_many(ids, n_slots: int):
+    """
+    Vectorized md5(str(i).encode()) % n_slots for an array of request IDs.
+
+    Args:
+        ids: NumPy int64 array of request IDs
+        n_slots: Number of slots in the ring (below 2**31)
+
+    Returns:
+        numpy.ndarray: Slot index for each request ID
+    """
+    if len(ids) and ids.min() < 0:  # A minus sign is outside the digit-only blocks
+        return np.fromiter((md5(str(int(i)).encode()) % n_slots for i in ids), dtype=np.int64, count=len(ids))
+    return np.concatenate([_md5_decimal_block(ids[start:start + MD5_BATCH], n_slots)
+                           for start in range(0, len(ids), MD5_BATCH)] or [np.zeros(0, dtype=np.int64)])
+
+
+def xxh32(data: bytes, seed: int = 0) -> int:
+    """
+    Pure Python xxHash32.
+
+    Args:
+        data: Bytes to hash
+        seed: 32-bit seed
+
+    Returns:
+        int: 32-bit hash value
+    """
+    p1, p2, p3, p4, p5 = 0x9E3779B1, 0x85EBCA77, 0xC2B2AE3D, 0x27D4EB2F, 0x165667B1
+    length = len(data)
+    i = 0
+
+    if length >= 16:
+        v1 = (seed + p1 + p2) & MASK32
+        v2 = (seed + p2) & MASK32
+        v3 = seed & MASK32
+        v4 = (seed - p1) & MASK32
+        while i + 16 <= length:
+            l1, l2, l3, l4 = struct.unpack_from('<4I', data, i)
+            v1 = (_rotl32((v1 + l1 * p2) & MASK32, 13) * p1) & MASK32
+            v2 = (_rotl32((v2 + l2 * p2) & MASK32, 13) * p1) & MASK32
+            v3 = (_rotl32((v3 + l3 * p2) & MASK32, 13) * p1) & MASK32
+            v4 = (_rotl32((v4 + l4 * p2) & MASK32, 13) * p1) & MASK32
+            i += 16
+        h = (_rotl32(v1, 1) + _rotl32(v2, 7) + _rotl32(v3, 12) + _rotl32(v4, 18)) & MASK32
+    else:
+        h = (seed + p5) & MASK32
+
+    h = (h + length) & MASK32
+
+    while i + 4 <= length:
+        (lane,) = struct.unpack_from('<I', data, i)
+        h = (_rotl32((h + lane * p3) & MASK32, 17) * p4) & MASK32
+        i += 4
+
+    while i < length:
+        h = (_rotl32((h + data[i] * p5) & MASK32, 11) * p1) & MASK32
+        i += 1
+
+    h ^= h >> 15
+    h = (h * p2) & MASK32
+    h ^= h >> 13
+    h = (h * p3) & MASK32
+    h ^= h >> 16
+    return h
+
+
+def fnv1a64(data: bytes) -> int:
+    """
+    64-bit FNV-1a.
+
+    Args:
+        data: Bytes to hash
+
+    Returns:
+        int: 64-bit hash value
+    """
+    h = 0xCBF29CE484222325
+    for byte in data:
+        h = ((h ^ byte) * 0x100000001B3) & MASK64
+    return h
+
+
+def murmur3_32(data: bytes, seed: int = 0) -> int:
+    """
+    Pure Python MurmurHash3 (x86, 32-bit).
+
+    Args:
+        data: Bytes to hash
+        seed: 32-bit seed
+
+    Returns:
+        int: 32-bit hash value
+    """
+    c1, c2 = 0xCC9E2D51, 0x1B873593
+    length = len(data)
+    h = seed & MASK32
+    n_blocks = length // 4
+
+    for (k,) in struct.iter_unpack('<I', data[:n_blocks * 4]):
+        k = (k * c1) & MASK32
+        k = _rotl32(k, 15)
+        k = (k * c2) & MASK32
+        h ^= k
+        h = _rotl32(h, 13)
+        h = (h * 5 + 0xE6546B64) & MASK32
+
+    tail = data[n_blocks * 4:]
+    if tail:
+        k = int.from_bytes(tail, 'little')
+        k = (k * c1) & MASK32
+        k = _rotl32(k, 15)
+        k = (k * c2) & MASK32
+        h ^= k
+
+    h ^= length
+    h ^= h >> 16
+    h = (h * 0x85EBCA6B) & MASK32
+    h ^= h >> 13
+    h = (h * 0xC2B2AE35) & MASK32
+    h ^= h >> 16
+    return h
+
+
+# Fixed key so placements are identical across load balancer restarts
+SIPHASH_KEY = bytes(range(16))
+
+def siphash24(data: bytes, key: bytes = SIPHASH_KEY) -> int:
+    """
+    Pure Python SipHash-2-4.
+
+    Python's built-in hash() also uses SipHash but is salted per process,
+    so it cannot be used to place servers consistently.
+
+    Args:
+        data: Bytes to hash
+        key: 16-byte key
+
+    Returns:
+        int: 64-bit hash value
+    """
+    k0, k1 = struct.unpack('<2Q', key)
+    v0 = k0 ^ 0x736F6D6570736575
+    v1 = k1 ^ 0x646F72616E646F6D
+    v2 = k0 ^ 0x6C7967656E657261
+    v3 = k1 ^ 0x7465646279746573
+
+    def sipround(v0, v1, v2, v3):
+        v0 = (v0 + v1) & MASK64
+        v1 = _rotl64(v1, 13) ^ v0
+        v0 = _rotl64(v0, 32)
+        v2 = (v2 + v3) & MASK64
+        v3 = _rotl64(v3, 16) ^ v2
+        v0 = (v0 + v3) & MASK64
+        v3 = _rotl64(v3, 21) ^ v0
+        v2 = (v2 + v1) & MASK64
+        v1 = _rotl64(v1, 17) ^ v2
+        v2 = _rotl64(v2, 32)
+        return v0, v1, v2, v3
+
+    length = len(data)
+    n_blocks = length // 8
+    for (m,) in struct.iter_unpack('<Q', data[:n_blocks * 8]):
+        v3 ^= m
+        v0, v1, v2, v3 = sipround(v0, v1, v2, v3)
+        v0, v1, v2, v3 = sipround(v0, v1, v2, v3)
+        v0 ^= m
+
+    b = ((length & 0xFF) << 56) | int.from_bytes(data[n_blocks * 8:], 'little')
+    v3 ^= b
+    v0, v1, v2, v3 = sipround(v0, v1, v2, v3)
+    v0, v1, v2, v3 = sipround(v0, v1, v2, v3)
+    v0 ^= b
+
+    v2 ^= 0xFF
+    for _ in range(4):
+        v0, v1, v2, v3 = sipround(v0, v1, v2, v3)
+    return v0 ^ v1 ^ v2 ^ v3
+
+
+class HashStrategy:
+    """
+    A named pair of request and server hash functions for the hash ring.
+
+    Attributes:
+        name (str): Registry name of the strategy
+        request_hash (Callable[[int], int]): Hash of a request ID
+        server_hash (Callable[[int, int], int]): Hash of (server index, virtual node index)
+    """
+
+    def __init__(self, name: str, request_hash: Callable[[int], int], server_hash: Callable[[int, int], int], request_hash_many: Optional[Callable] = None):
+        """
+        Initialize the strategy.
+
+        Args:
+            name: Registry name of the strategy
+            request_hash: Hash of a request ID
+            server_hash: Hash of (server index, virtual node index)
+            request_hash_many: Vectorized request hash taking (ids, n_slots) and returning
+                slot indices; defaults to applying request_hash to each ID
+        """
+        self.name = name
+        self.request_hash = request_hash
+        self.server_hash = server_hash
+        self._request_hash_many = request_hash_many
+
+    def request_hash_many(self, ids, n_slots: int):
+        """
+        Map an array of request IDs to slot indices.
+
+        Args:
+            ids: NumPy int64 array of request IDs
+            n_slots: Number of slots in the ring
+
+        Returns:
+            numpy.ndarray: Slot index for each request ID
+        """
+        if self._request_hash_many is not None:
+            return self._request_hash_many(ids, n_slots)
+        request_hash = self.request_hash
+        return np.fromiter((request_hash(int(i)) % n_slots for i in ids), dtype=np.int64, count=len(ids))
+
+
+def _byte_strategy(name: str, hash_bytes: Callable[[bytes], int], request_hash_many: Optional[Callable] = None) -> HashStrategy:
+    """
+    Build a strategy from a byte-string hash, keyed the same way as the MD5 hashes.
+
+    Without request_hash_many, batches are hashed one ID at a time.
+    """
+    return HashStrategy(
+        name,
+        lambda i: hash_bytes(str(i).encode()),
+        lambda i, j: hash_bytes(f"{i}-{j}".encode()),
+        request_hash_many,
+    )
+
+
+# Registry: name -> hash strategy
+HASH_FUNCTIONS: Dict[str, HashStrategy] = {
+    'polynomial': HashStrategy('polynomial', polynomial_request_hash, polynomial_server_hash, polynomial_request_hash_many),
+    'md5': _byte_strategy('md5', md5, md5_request_hash_many),
+    'xxhash': _byte_strategy('xxhash', xxh32),
+    'fnv1a': _byte_strategy('fnv1a', fnv1a64),
+    'murmur3': _byte_strategy('murmur3', murmur3_32),
+    'siphash': _byte_strategy('siphash', siphash24),
+}
+
+
+def get_hash_function(name: str) -> HashStrategy:
+    """
+    Look up a hash strategy by name.
+
+    Args:
+        name: Registry name (case-insensitive)
+
+    Returns:
+        HashStrategy: The registered strategy
+
+    Raises:
+        ValueError: If no strategy with that name is registered
+    """
+    try:
+        return HASH_FUNCTIONS[name.lower()]
+    except KeyError:
+        raise ValueError(f"Hash function must be one of {list(HASH_FUNCTIONS)}") from None
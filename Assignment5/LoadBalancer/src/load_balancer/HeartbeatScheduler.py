@@ -0,0 +1,210 @@
+import asyncio
+import bisect
+import random
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+import aiohttp
+
+
+RTT_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)  # Upper bounds of the heartbeat RTT histogram buckets
+
+
+class _ServerTimer:
+    """Heartbeat timer and RTT histogram of one server."""
+
+    __slots__ = ('interval', 'due', 'rtt_counts')
+
+    def __init__(self, interval: float, due: float):
+        self.interval = interval
+        self.due = due
+        self.rtt_counts = [0] * (len(RTT_BUCKETS_MS) + 1)  # Last bucket counts RTTs above the largest bound
+
+
+class HeartbeatScheduler:
+    """
+    Heartbeats with a separate, jittered timer for every server.
+
+    A healthy server's interval grows by `backoff` after every successful
+    heartbeat, up to `max_interval`; a failed heartbeat drops it to
+    `min_interval` so suspicious servers are probed quickly. Every next
+    heartbeat is scheduled at interval x (1 ± jitter), so servers never
+    fall into synchronized waves. After `max_fail_count` consecutive
+    failures `on_flatline(hostname)` runs as its own task; the server is
+    not probed until that task finishes.
+    """
+
+    def __init__(self,
+                 hostnames: Callable[[], Iterable[str]],
+                 on_flatline: Callable[[str], Awaitable],
+                 fail_counts: Dict[str, int],
+                 interval: float = 10,
+                 min_interval: float = 2,
+                 max_interval: float = 20,
+                 backoff: float = 1.5,
+                 jitter: float = 0.2,
+                 max_fail_count: int = 5,
+                 concurrency: int = 10,
+                 timeout: float = 1,
+                 should_probe: Optional[Callable[[str], bool]] = None,
+                 address: Optional[Callable[[str], str]] = None,
+                 on_failure: Optional[Callable[[str, int], None]] = None):
+        """
+        Initialize the scheduler.
+
+        Args:
+            hostnames: Returns the servers to monitor; checked on every tick
+            on_flatline: Coroutine function that replaces a failed server
+            fail_counts: Consecutive heartbeat failures per server, updated in place
+            interval: Heartbeat interval of a newly seen server in seconds
+            min_interval: Interval after a failed heartbeat
+            max_interval: Largest interval reached by backing off
+            backoff: Factor applied to the interval after a successful heartbeat
+            jitter: Relative random spread applied to every interval
+            max_fail_count: Consecutive failures before on_flatline runs
+            concurrency: Maximum heartbeats in flight
+            timeout: Seconds before a heartbeat counts as failed
+            should_probe: Optional filter; servers it rejects are treated as
+                healthy without sending a heartbeat (e.g. servers with live traffic)
+            address: Optional map from hostname to the host:port heartbeats go
+                to (default <hostname>:5000)
+            on_failure: Optional hook called with the hostname and its fail
+                count after every failed heartbeat
+        """
+        self.hostnames = hostnames
+        self.on_flatline = on_flatline
+        self.fail_counts = fail_counts
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.jitter = jitter
+        self.max_fail_count = max_fail_count
+        self.timeout = timeout
+        self.should_probe = should_probe
+        self.address = address or (lambda hostname: f'{hostname}:5000')
+        self.on_failure = on_failure
+
+        self.timers: Dict[str, _ServerTimer] = {}
+        self.respawns: Dict[str, asyncio.Task] = {}  # Running on_flatline tasks
+        self.sent = 0  # Heartbeats sent
+        self.failed = 0  # Heartbeats that failed
+        self.skipped = 0  # Heartbeats skipped by should_probe
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._probes: set = set()  # Heartbeats in flight, kept referenced until done
+
+    def _next_due(self, now: float, interval: float) -> float:
+        """Jittered due time of the next heartbeat."""
+        return now + interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _sync_members(self, now: float):
+        """Start timers for new servers and drop those of removed ones."""
+        current = set(self.hostnames())
+        for hostname in current - self.timers.keys():
+            # Spread newly seen servers over a whole interval
+            self.timers[hostname] = _ServerTimer(self.interval, now + random.uniform(0, self.interval))
+        for hostname in self.timers.keys() - current:
+            del self.timers[hostname]
+
+    async def run(self, session: aiohttp.ClientSession, tick: float = 0.5):
+        """
+        Run the scheduler until cancelled.
+
+        Args:
+            session: Session used for heartbeat requests
+            tick: Longest sleep between checks for due timers and membership changes
+        """
+        try:
+            while True:
+                now = time.monotonic()
+                self._sync_members(now)
+                for hostname, timer in self.timers.items():
+                    if timer.due > now or hostname in self.respawns:
+                        continue
+                    # Reschedule right away; the result adjusts the interval
+                    timer.due = self._next_due(now, timer.interval)
+                    if self.should_probe is not None and not self.should_probe(hostname):
+                        self.skipped += 1
+                        self._record(hostname, timer, True)
+                        continue
+                    task = asyncio.create_task(self._probe(session, hostname, timer))
+                    self._probes.add(task)
+                    task.add_done_callback(self._probes.discard)
+
+                next_due = min((timer.due for timer in self.timers.values()), default=now + tick)
+                await asyncio.sleep(min(tick, max(0.0, next_due - time.monotonic())))
+        finally:
+            for task in list(self._probes):
+                task.cancel()
+
+    async def _probe(self, session: aiohttp.ClientSession, hostname: str, timer: _ServerTimer):
+        """Send one heartbeat and record its outcome and RTT."""
+        async with self._semaphore:
+            self.sent += 1
+            start = time.perf_counter()
+            try:
+                async with session.get(f'http://{self.address(hostname)}/heartbeat',
+                                       timeout=aiohttp.ClientTimeout(total=self.timeout)) as response:
+                    await response.read()
+                    ok = response.status == 200
+            except Exception:
+                ok = False
+            rtt_ms = (time.perf_counter() - start) * 1e3
+        if ok:
+            timer.rtt_counts[bisect.bisect_left(RTT_BUCKETS_MS, rtt_ms)] += 1
+        else:
+            self.failed += 1
+        self._record(hostname, timer, ok)
+
+    def _record(self, hostname: str, timer: _ServerTimer, ok: bool):
+        """Apply a heartbeat outcome to the server's fail count and interval."""
+        if self.timers.get(hostname) is not timer:
+            return  # Removed (or removed and re-added) while the heartbeat was in flight
+        now = time.monotonic()
+        if ok:
+            self.fail_counts[hostname] = 0
+            timer.interval = min(self.max_interval, timer.interval * self.backoff)
+            return
+
+        self.fail_counts[hostname] = self.fail_counts.get(hostname, 0) + 1
+        if self.on_failure is not None:
+            self.on_failure(hostname, self.fail_counts[hostname])
+        timer.interval = self.min_interval
+        timer.due = min(timer.due, self._next_due(now, timer.interval))
+        if self.fail_counts[hostname] >= self.max_fail_count and hostname not in self.respawns:
+            task = asyncio.create_task(self.on_flatline(hostname))
+            self.respawns[hostname] = task
+            task.add_done_callback(lambda _, hostname=hostname: self._respawned(hostname))
+
+    def _respawned(self, hostname: str):
+        """Resume heartbeats for a server once on_flatline has finished."""
+        self.respawns.pop(hostname, None)
+        self.fail_counts[hostname] = 0
+        timer = self.timers.get(hostname)
+        if timer is not None:
+            timer.interval = self.min_interval
+            timer.due = self._next_due(time.monotonic(), timer.interval)
+
+    def stats(self) -> Dict:
+        """
+        Get heartbeat counters and, per server, the current interval and RTT histogram.
+
+        Returns:
+            Dict: Totals plus {hostname: {'interval', 'fail_count', 'rtt_ms'}}, where
+            rtt_ms maps each bucket's upper bound ('+Inf' for the last) to a count
+        """
+        bounds: List[str] = [str(b) for b in RTT_BUCKETS_MS] + ['+Inf']
+        return {
+            'sent': self.sent,
+            'failed': self.failed,
+            'skipped': self.skipped,
+            'respawning': sorted(self.respawns),
+            'servers': {
+                hostname: {
+                    'interval': round(timer.interval, 2),
+                    'fail_count': self.fail_counts.get(hostname, 0),
+                    'rtt_ms': dict(zip(bounds, timer.rtt_counts)),
+                }
+                for hostname, timer in self.timers.items()
+            },
+        }
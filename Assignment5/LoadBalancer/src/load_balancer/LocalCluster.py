@@ -0,0 +1,192 @@
+import asyncio
+import contextlib
+import os
+import socket
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'server', 'server.py')  # Replica app
+POLL_INTERVAL = 0.05  # Seconds between checks of a starting replica's port
+
+
+class _Replica:
+    """A running server process and where it listens."""
+
+    __slots__ = ('process', 'port')
+
+    def __init__(self, process: asyncio.subprocess.Process, port: int):
+        self.process = process
+        self.port = port
+
+
+class LocalPool:
+    """
+    Server replicas run as local processes instead of Docker containers.
+
+    Drop-in replacement for ContainerPool (open, close, spawn, remove,
+    stats and address), so /add, /rm, heartbeats and respawns run through
+    the same code paths on a machine without Docker. Every replica is a
+    `server.py` process on its own free port of `host`; address() maps a
+    server hostname to it, since the processes cannot all listen on
+    <hostname>:5000.
+
+    The replicas get the environment built by `env`, so the FAULT_*
+    settings of server.py inject latency, errors and crashes. Each
+    replica's PID is written to <run_dir>/<hostname>.pid, so a benchmark
+    can also kill one from outside (e.g. `pkill -9 -F <run_dir>/Server-2.pid`)
+    and watch the heartbeats respawn it.
+    """
+
+    def __init__(self,
+                 env: Callable[[int], List[str]],
+                 next_id: Callable[[], int],
+                 command: Optional[Callable[[int], List[str]]] = None,
+                 host: str = '127.0.0.1',
+                 run_dir: str = '/tmp/lb_local',
+                 start_timeout: float = 10,
+                 stop_timeout: int = 5,
+                 on_operation: Optional[Callable[[str, float], None]] = None):
+        """
+        Initialize the pool; call open() from the app's startup hook.
+
+        Args:
+            env: Builds a replica's extra environment (KEY=value entries) from its server ID
+            next_id: Returns a new server ID for every replica started
+            command: Builds the command line of a replica from its port
+                (default: this interpreter running server/server.py)
+            host: Loopback address the replicas are reached on
+            run_dir: Directory for the replicas' PID files
+            start_timeout: Seconds a replica gets to start accepting connections
+            stop_timeout: Seconds given to a replica to exit before it is killed
+            on_operation: Optional hook called with the operation ('create' or
+                'remove') and its duration in seconds
+        """
+        self.env = env
+        self.next_id = next_id
+        self.command = command or (lambda port: [sys.executable, SERVER_SCRIPT, str(port)])
+        self.host = host
+        self.run_dir = run_dir
+        self.start_timeout = start_timeout
+        self.stop_timeout = stop_timeout
+        self.on_operation = on_operation
+
+        self._replicas: Dict[str, _Replica] = {}  # Server hostname -> running replica
+
+    async def open(self):
+        """Create the PID file directory."""
+        os.makedirs(self.run_dir, exist_ok=True)
+
+    async def close(self):
+        """Kill the replicas that are still running."""
+        replicas, self._replicas = self._replicas, {}
+        await asyncio.gather(*[self._stop(hostname, replica) for hostname, replica in replicas.items()],
+                             return_exceptions=True)
+
+    def address(self, hostname: str) -> str:
+        """
+        Get the host:port a server is reached on.
+
+        Raises:
+            KeyError: If no replica was started for the hostname
+        """
+        return f'{self.host}:{self._replicas[hostname].port}'
+
+    async def _timed(self, operation: str, awaitable):
+        """Await an operation and report its duration to on_operation."""
+        start = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            if self.on_operation is not None:
+                self.on_operation(operation, time.perf_counter() - start)
+
+    def _free_port(self) -> int:
+        """Ask the kernel for a port that is free on host."""
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.bind((self.host, 0))
+            return sock.getsockname()[1]
+
+    async def _start(self, hostname: str, serv_id: int) -> _Replica:
+        """Start a replica and wait until it accepts connections."""
+        port = self._free_port()
+        env = dict(os.environ, HOSTNAME=hostname)
+        env.update(entry.split('=', 1) for entry in self.env(serv_id))
+        process = await asyncio.create_subprocess_exec(
+            *self.command(port),
+            env=env,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        replica = _Replica(process, port)
+        deadline = time.monotonic() + self.start_timeout
+        while True:
+            if process.returncode is not None:
+                raise RuntimeError(f'Server process for {hostname} exited with code {process.returncode}')
+            try:
+                _, writer = await asyncio.open_connection(self.host, port)
+                writer.close()
+                return replica
+            except OSError:
+                if time.monotonic() > deadline:
+                    await self._stop(hostname, replica)
+                    raise RuntimeError(f'Server process for {hostname} did not start within {self.start_timeout} s')
+                await asyncio.sleep(POLL_INTERVAL)
+
+    async def _stop(self, hostname: str, replica: _Replica):
+        """Terminate a replica, kill it if it does not exit in time, and drop its PID file."""
+        if replica.process.returncode is None:
+            replica.process.terminate()
+            try:
+                await asyncio.wait_for(replica.process.wait(), self.stop_timeout)
+            except asyncio.TimeoutError:
+                replica.process.kill()
+                await replica.process.wait()
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(os.path.join(self.run_dir, f'{hostname}.pid'))
+
+    async def spawn(self, hostname: str) -> Tuple[int, bool]:
+        """
+        Start a replica reachable as `hostname`, replacing any old one.
+
+        Args:
+            hostname: Server hostname
+
+        Returns:
+            Tuple[int, bool]: The server ID the replica runs with, and False
+            (there is no warm pool)
+        """
+        # A failed server's process may still be running
+        old = self._replicas.pop(hostname, None)
+        if old is not None:
+            await self._stop(hostname, old)
+        serv_id = self.next_id()
+        replica = await self._timed('create', self._start(hostname, serv_id))
+        self._replicas[hostname] = replica
+        with open(os.path.join(self.run_dir, f'{hostname}.pid'), 'w') as pid_file:
+            pid_file.write(f'{replica.process.pid}\n')
+        return serv_id, False
+
+    async def remove(self, hostname: str):
+        """
+        Stop a server's replica.
+
+        Args:
+            hostname: Server hostname
+
+        Raises:
+            KeyError: If no replica was started for the hostname
+        """
+        replica = self._replicas.pop(hostname)
+        await self._timed('remove', self._stop(hostname, replica))
+
+    def stats(self) -> dict:
+        """
+        Get the pool's fill level, in the shape of ContainerPool.stats().
+
+        Returns:
+            dict: Target size and ready/creating counts (always 0), and replicas running
+        """
+        running = sum(1 for replica in self._replicas.values() if replica.process.returncode is None)
+        return {'size': 0, 'ready': 0, 'creating': 0, 'running': running}
@@ -0,0 +1,247 @@
+import asyncio
+import bisect
+import time
+from typing import Callable, Dict, Optional, Sequence, Tuple, Union
+
+import aiohttp
+
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)  # Seconds, for requests
+DOCKER_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)  # Seconds, for Docker operations
+LOCK_WAIT_BUCKETS = (0.00001, 0.0001, 0.001, 0.01, 0.1, 1, 10, 60)  # Seconds, for lock waits
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'  # Prometheus text exposition format
+
+
+class Counter:
+    """Monotonically increasing value."""
+
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class Histogram:
+    """
+    Histogram over fixed buckets.
+
+    The bucket counts are allocated once; observe() only bisects the bounds
+    and increments one slot. Counts are stored per bucket and made
+    cumulative when rendered.
+    """
+
+    __slots__ = ('bounds', 'counts', 'sum')
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # Last slot counts values above the largest bound
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+def _escape(value: str) -> str:
+    """Escape a label value for the text format."""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value: float) -> str:
+    """Format a sample value for the text format."""
+    if isinstance(value, int):
+        return str(value)
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    """Render a label set, e.g. {route="/home",le="0.1"}."""
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class MetricFamily:
+    """
+    A named metric with one child (Counter or Histogram) per label value set.
+
+    Children are created on first use and cached, so a hot path can also
+    keep the child returned by labels() and update it directly.
+    """
+
+    def __init__(self, name: str, help: str, kind: str, labelnames: Sequence[str], factory: Callable):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.factory = factory
+        self.children: Dict[Tuple[str, ...], Union[Counter, Histogram]] = {}
+
+    def labels(self, *values: str):
+        """
+        Get the child for a label value set, creating it if needed.
+
+        Args:
+            *values: One value per label name, in order
+
+        Returns:
+            Counter | Histogram: The child metric
+        """
+        child = self.children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f'{self.name} expects labels {self.labelnames}')
+            child = self.children[values] = self.factory()
+        return child
+
+    def remove(self, *values: str):
+        """Drop the child for a label value set (e.g. a removed server)."""
+        self.children.pop(values, None)
+
+    def render(self) -> list:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        for values, child in list(self.children.items()):
+            if self.kind == 'histogram':
+                cumulative = 0
+                for bound, count in zip(child.bounds + (float('inf'),), child.counts):
+                    cumulative += count
+                    le = 'le="' + _number(bound) + '"'
+                    lines.append(f'{self.name}_bucket{_labels(self.labelnames, values, le)} {cumulative}')
+                lines.append(f'{self.name}_sum{_labels(self.labelnames, values)} {_number(child.sum)}')
+                lines.append(f'{self.name}_count{_labels(self.labelnames, values)} {cumulative}')
+            else:
+                lines.append(f'{self.name}{_labels(self.labelnames, values)} {_number(child.value)}')
+        return lines
+
+
+class CallbackFamily:
+    """A gauge or counter whose value is read from the application when scraped."""
+
+    def __init__(self, name: str, help: str, kind: str,
+                 fn: Callable[[], Union[float, Dict[str, float]]], labelname: Optional[str]):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.fn = fn
+        self.labelname = labelname
+
+    def render(self) -> list:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        value = self.fn()
+        if self.labelname is None:
+            lines.append(f'{self.name} {_number(value)}')
+        else:
+            for label, sample in value.items():
+                lines.append(f'{self.name}{_labels((self.labelname,), (label,))} {_number(sample)}')
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Metrics of one load balancer, rendered in the Prometheus text format.
+
+    Counters and histograms are plain objects updated in place by the
+    request handlers; values that the application already tracks (ring
+    size, heartbeat counters, ...) are registered as callbacks and only
+    read when /metrics is scraped.
+    """
+
+    def __init__(self):
+        self.families: list = []
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> MetricFamily:
+        """Register a counter family."""
+        family = MetricFamily(name, help, 'counter', labelnames, Counter)
+        self.families.append(family)
+        return family
+
+    def histogram(self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS,
+                  labelnames: Sequence[str] = ()) -> MetricFamily:
+        """Register a histogram family over fixed bucket upper bounds."""
+        bounds = tuple(sorted(buckets))
+        family = MetricFamily(name, help, 'histogram', labelnames, lambda: Histogram(bounds))
+        self.families.append(family)
+        return family
+
+    def callback(self, name: str, help: str, fn: Callable, kind: str = 'gauge',
+                 labelname: Optional[str] = None) -> CallbackFamily:
+        """
+        Register a metric read from `fn` at scrape time.
+
+        Args:
+            name: Metric name
+            help: Help text
+            fn: Returns the value, or {label value: value} when labelname is set
+            kind: 'gauge' or 'counter'
+            labelname: Name of the single label, if fn returns a dict
+        """
+        family = CallbackFamily(name, help, kind, fn, labelname)
+        self.families.append(family)
+        return family
+
+    def render(self) -> str:
+        """
+        Render every metric.
+
+        Returns:
+            str: Metrics in the Prometheus text exposition format
+        """
+        lines = []
+        for family in self.families:
+            lines.extend(family.render())
+        return '\n'.join(lines) + '\n'
+
+
+class TimedLock(asyncio.Lock):
+    """asyncio.Lock that records how long each acquire waited."""
+
+    def __init__(self, wait: Histogram):
+        super().__init__()
+        self.wait = wait
+
+    async def acquire(self):
+        start = time.perf_counter()
+        result = await super().acquire()
+        self.wait.observe(time.perf_counter() - start)
+        return result
+
+
+def backend_trace_config(requests: MetricFamily, errors: MetricFamily, duration: MetricFamily) -> aiohttp.TraceConfig:
+    """
+    Build an aiohttp trace config that counts and times requests per server.
+
+    Args:
+        requests: Counter family labelled by server
+        errors: Counter family labelled by server; counts exceptions and 5xx answers
+        duration: Histogram family labelled by server
+
+    Returns:
+        aiohttp.TraceConfig: Pass it in a ClientSession's trace_configs
+    """
+    async def on_request_start(session, context, params):
+        context.start = time.perf_counter()
+
+    async def on_request_end(session, context, params):
+        server = params.url.host
+        requests.labels(server).inc()
+        duration.labels(server).observe(time.perf_counter() - context.start)
+        if params.response.status >= 500:
+            errors.labels(server).inc()
+
+    async def on_request_exception(session, context, params):
+        server = params.url.host
+        requests.labels(server).inc()
+        errors.labels(server).inc()
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_request_end.append(on_request_end)
+    trace_config.on_request_exception.append(on_request_exception)
+    return trace_config
@@ -0,0 +1,269 @@
+import asyncio
+import contextlib
+import fcntl
+import json
+import mmap
+import os
+import struct
+from typing import Optional
+
+
+HEADER = struct.Struct('<4s4xQQ')  # Magic, version, payload length
+MAGIC = b'SRG1'  # Leading bytes of a published snapshot
+DEFAULT_CAPACITY = 1 << 22  # Bytes reserved for the snapshot (4 MiB)
+HEALTH_CAPACITY = 1 << 16  # Bytes reserved for the health verdicts (64 KiB)
+READ_ATTEMPTS = 1000  # Torn reads retried before read() gives up
+LOCK_POLL_MIN = 0.001  # Seconds before the first retry of a busy membership lock
+LOCK_POLL_MAX = 0.05  # Longest wait between retries of a busy membership lock
+
+
+class _Seqlock:
+    """
+    A byte string in a memory-mapped file, published under a seqlock.
+
+    The version in the header is odd while a new value is being written,
+    and readers retry until they copy the payload between two equal, even
+    versions. Writers must exclude each other (SharedRing uses flock).
+    """
+
+    def __init__(self, path: str, capacity: int):
+        self.path = path
+        self.capacity = capacity
+        self.fd: Optional[int] = None
+        self._map: Optional[mmap.mmap] = None
+
+    def open(self):
+        """Map the file, creating it if needed."""
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self.fd).st_size < HEADER.size + self.capacity:
+            os.ftruncate(self.fd, HEADER.size + self.capacity)
+        self._map = mmap.mmap(self.fd, HEADER.size + self.capacity)
+
+    def close(self):
+        """Unmap and close the file."""
+        if self._map is not None:
+            self._map.close()
+        if self.fd is not None:
+            os.close(self.fd)
+        self.fd = self._map = None
+
+    def version(self) -> int:
+        """Version of the latest value (0 = nothing published yet)."""
+        magic, version, _ = HEADER.unpack_from(self._map)
+        return version if magic == MAGIC else 0
+
+    def read(self) -> tuple:
+        """Copy the latest value; see SharedRing.read()."""
+        for _ in range(READ_ATTEMPTS):
+            magic, version, length = HEADER.unpack_from(self._map)
+            if magic != MAGIC:
+                return 0, None
+            if version % 2:
+                continue  # A writer is in the middle of publishing
+            data = self._map[HEADER.size:HEADER.size + length]
+            if HEADER.unpack_from(self._map)[1] == version:
+                return version, data
+        return self.version(), None
+
+    def publish(self, data: bytes) -> int:
+        """Publish a new value; see SharedRing.publish()."""
+        if len(data) > self.capacity:
+            raise ValueError(f'Snapshot of {len(data)} bytes exceeds the shared capacity of {self.capacity} ({self.path})')
+        version = self.version()
+        version += version % 2  # A writer that died mid-publish left an odd version
+        HEADER.pack_into(self._map, 0, MAGIC, version + 1, len(data))
+        self._map[HEADER.size:HEADER.size + len(data)] = data
+        HEADER.pack_into(self._map, 0, MAGIC, version + 2, len(data))
+        return version + 2
+
+
+class SharedRing:
+    """
+    Routing state shared by the worker processes of one load balancer.
+
+    The latest to_bytes() snapshot of the hash map lives in a memory-mapped
+    file. Writers hold an exclusive flock on it for the whole membership
+    change (reload, apply, publish), so changes from different workers are
+    serialized. The version in the header works as a seqlock: it is odd
+    while a snapshot is being written, and readers retry until they copy
+    the payload between two equal, even versions. Checking for a newer
+    snapshot is a single header read, cheap enough for every request.
+
+    Health verdicts (the servers some worker found down) are kept the same
+    way in <path>.health, so a server one worker's breaker or the leader's
+    heartbeats gave up on is skipped by every worker. Two more sidecar
+    files hold a cross-process server ID counter (<path>.ids) and the
+    leader lock (<path>.leader), taken by the one worker that runs
+    heartbeats, owns container clean-up and keeps the warm pool.
+    """
+
+    def __init__(self, path: str, capacity: int = DEFAULT_CAPACITY):
+        """
+        Initialize the shared state; call open() in every worker.
+
+        Args:
+            path: File backing the snapshot, ideally on tmpfs (e.g. /dev/shm/lb_ring)
+            capacity: Bytes reserved for the snapshot
+        """
+        self.path = path
+        self.capacity = capacity
+        self._ring = _Seqlock(path, capacity)
+        self._health = _Seqlock(path + '.health', HEALTH_CAPACITY)
+        self._ids_fd: Optional[int] = None
+        self._leader_fd: Optional[int] = None
+
+    @staticmethod
+    def reset(path: str):
+        """Remove the files of a previous run; call once before starting the workers."""
+        for suffix in ('', '.health', '.ids', '.leader'):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path + suffix)
+
+    def open(self):
+        """Map the snapshot and health files, creating them if needed."""
+        self._ring.open()
+        self._health.open()
+        self._ids_fd = os.open(self.path + '.ids', os.O_RDWR | os.O_CREAT, 0o600)
+
+    def close(self):
+        """Unmap the shared files and release every lock held by this worker."""
+        self._ring.close()
+        self._health.close()
+        for fd in (self._ids_fd, self._leader_fd):
+            if fd is not None:
+                os.close(fd)
+        self._ids_fd = self._leader_fd = None
+
+    def version(self) -> int:
+        """Version of the latest snapshot (0 = nothing published yet)."""
+        return self._ring.version()
+
+    def read(self) -> tuple:
+        """
+        Copy the latest snapshot.
+
+        Returns:
+            tuple: (version, snapshot bytes); the bytes are None if nothing was
+            published or no consistent copy could be taken (keep the current map)
+        """
+        return self._ring.read()
+
+    def publish(self, data: bytes) -> int:
+        """
+        Publish a new snapshot; call with lock() held.
+
+        Args:
+            data: The hash map's to_bytes() snapshot
+
+        Returns:
+            int: Version of the published snapshot
+
+        Raises:
+            ValueError: If the snapshot does not fit in the reserved capacity
+        """
+        return self._ring.publish(data)
+
+    @contextlib.asynccontextmanager
+    async def lock(self):
+        """
+        Hold the exclusive membership lock.
+
+        A busy lock is retried with a non-blocking flock and a growing sleep
+        in between, so the event loop keeps serving and a waiter cancelled
+        by a client disconnect or a timeout never takes the lock afterwards
+        (a blocking flock in a thread would, and nobody would release it).
+        The flock belongs to the worker's file descriptor, so tasks of one
+        worker must take turns themselves (loadBalancer.py holds mutexLock).
+        """
+        delay = LOCK_POLL_MIN
+        while True:
+            try:
+                fcntl.flock(self._ring.fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, LOCK_POLL_MAX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._ring.fd, fcntl.LOCK_UN)
+
+    def health_version(self) -> int:
+        """Version of the latest health verdicts (0 = none published yet)."""
+        return self._health.version()
+
+    def read_health(self) -> tuple:
+        """
+        Copy the latest health verdicts.
+
+        Returns:
+            tuple: (version, set of the servers marked down); the set is None
+            if no consistent copy could be taken
+        """
+        version, data = self._health.read()
+        if version == 0:
+            return 0, set()
+        return version, None if data is None else set(json.loads(data))
+
+    def mark_health(self, hostname: str, down: bool) -> bool:
+        """
+        Publish a verdict on a server for the other workers.
+
+        Args:
+            hostname: Server hostname
+            down: Whether the server is down (False = it is back)
+
+        Returns:
+            bool: True if the verdict changed the shared state
+        """
+        fcntl.flock(self._health.fd, fcntl.LOCK_EX)  # Held for a read and a write only
+        try:
+            _, verdicts = self.read_health()
+            verdicts = verdicts or set()  # Unreadable only after a writer died mid-publish
+            if (hostname in verdicts) == down:
+                return False
+            if down:
+                verdicts.add(hostname)
+            else:
+                verdicts.discard(hostname)
+            self._health.publish(json.dumps(sorted(verdicts)).encode())
+            return True
+        finally:
+            fcntl.flock(self._health.fd, fcntl.LOCK_UN)
+
+    def next_id(self, start: int = 0) -> int:
+        """
+        Allocate a server ID unique across the workers.
+
+        Args:
+            start: Last ID in use before the first allocation
+
+        Returns:
+            int: The new ID
+        """
+        fcntl.flock(self._ids_fd, fcntl.LOCK_EX)  # Held for a read and a write only
+        try:
+            raw = os.pread(self._ids_fd, 8, 0)
+            last = struct.unpack('<Q', raw)[0] if len(raw) == 8 else start
+            os.pwrite(self._ids_fd, struct.pack('<Q', last + 1), 0)
+            return last + 1
+        finally:
+            fcntl.flock(self._ids_fd, fcntl.LOCK_UN)
+
+    def try_lead(self) -> bool:
+        """
+        Try to become the leader worker; the lock is held until close() or exit.
+
+        Returns:
+            bool: True if this worker is (now) the leader
+        """
+        if self._leader_fd is not None:
+            return True
+        fd = os.open(self.path + '.leader', os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._leader_fd = fd
+        return True
@@ -1,36 +1,124 @@
 import aiohttp
 import asyncio
+import collections
+import contextlib
+import itertools
+import math
 import os
 import random
 import sys
 import time
-from aiodocker import Docker
 from icecream import ic
-from quart import Quart, request, jsonify
+from quart import Quart, Response, g, request, jsonify
 from colorama import Fore, Style
-from ConsistentHashing import ConsistentHashMap
-from asyncio import Lock
+from RoutingEngines import create_hash_map, load_hash_map
+from CircuitBreaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from HeartbeatScheduler import HeartbeatScheduler
+from ContainerPool import ContainerPool
+from LocalCluster import LocalPool
+from Metrics import CONTENT_TYPE, DOCKER_BUCKETS, LOCK_WAIT_BUCKETS, MetricsRegistry, TimedLock
+from SharedRing import SharedRing
 
 app = Quart(__name__)
-mutexLock = Lock()  # Mutex for thread-safe operations on shared data
+metrics = MetricsRegistry()  # Counters and histograms served at /metrics
+lock_wait = metrics.histogram('lb_lock_wait_seconds', 'Time spent waiting to acquire mutexLock', LOCK_WAIT_BUCKETS).labels()
+mutexLock = TimedLock(lock_wait)  # Mutex for thread-safe operations on shared data
 
 # Configuration parameters
 DEBUG = False
 ic.configureOutput(prefix='[LB] | ')  # Configure icecream debugging output
 ic.disable()  # Disable icecream debugging by default
+HASH_FUNCTION = os.environ.get('HASH_FUNCTION', 'polynomial')  # Hash strategy used by the ring
+ROUTING_ENGINE = os.environ.get('ROUTING_ENGINE', 'ring')  # ring, jump, rendezvous or maglev
+# Balancing: hash (ring owner), p2c (best of two random servers) or p2c-ring (best of ring owner and successor)
+BALANCING = os.environ.get('BALANCING', 'hash').lower()
+# Bounded loads: skip servers above (1 + epsilon) x average in-flight requests (unset = disabled)
+LOAD_BOUND_EPSILON = float(os.environ['LOAD_BOUND_EPSILON']) if os.environ.get('LOAD_BOUND_EPSILON') else None
+# Passthrough: relay the server's body bytes, status and content type unparsed (false = parse and re-serialize)
+PASSTHROUGH = os.environ.get('PASSTHROUGH', 'true').lower() in ('1', 'true', 'yes')
+# Hedging: duplicate a request to the next ring successor once it is slower than this latency percentile (unset = disabled)
+HEDGE_PERCENTILE = float(os.environ['HEDGE_PERCENTILE']) if os.environ.get('HEDGE_PERCENTILE') else None
+MAX_RETRIES = int(os.environ.get('MAX_RETRIES', 1))  # Successors tried after a connection failure in /home
+# Circuit breaker: also open a server's breaker when its latency EWMA exceeds this many seconds (unset = errors only)
+BREAKER_LATENCY_LIMIT = float(os.environ['BREAKER_LATENCY_LIMIT']) if os.environ.get('BREAKER_LATENCY_LIMIT') else None
+WARM_POOL_SIZE = int(os.environ.get('WARM_POOL_SIZE', 0))  # Pre-started server containers kept for /add and respawns
+WORKERS = int(os.environ.get('WORKERS', 1))  # Worker processes sharing the listening socket (1 = single process)
+SHARED_STATE_PATH = os.environ.get('SHARED_STATE_PATH', '/dev/shm/lb_ring')  # Shared routing snapshot when WORKERS > 1
+ORCHESTRATOR = os.environ.get('ORCHESTRATOR', 'docker').lower()  # docker (containers) or local (server processes, no Docker)
+LOCAL_RUN_DIR = os.environ.get('LOCAL_RUN_DIR', '/tmp/lb_local')  # PID files of the local server processes
+# Fault injection settings passed on to every server (see server.py)
+FAULT_ENV = [f'{name}={os.environ[name]}' for name in ('FAULT_LATENCY', 'FAULT_ERROR_RATE', 'FAULT_CRASH_RATE')
+             if os.environ.get(name)]
+if BALANCING not in ('hash', 'p2c', 'p2c-ring'):
+    raise ValueError("BALANCING must be 'hash', 'p2c' or 'p2c-ring'")
+if ORCHESTRATOR not in ('docker', 'local'):
+    raise ValueError("ORCHESTRATOR must be 'docker' or 'local'")
+if ORCHESTRATOR == 'local' and WORKERS > 1:
+    raise ValueError('ORCHESTRATOR=local runs a single worker: the server processes belong to one process')
 
 # Global variables
-Servers = ConsistentHashMap()  # Consistent hash map for server selection
+Servers = create_hash_map(  # Consistent hash map for server selection
+    ROUTING_ENGINE,
+    hostnames=["Server-1", "Server-2", "Server-3"],  # Started by docker-compose
+    hash_function=HASH_FUNCTION,
+)
 heartbeat_fail_count: dict[str, int] = {}  # Track failed heartbeats for each server
+inflight: dict[str, int] = {}  # Proxied requests currently in flight for each server
+inflight_total = 0  # Sum of in-flight requests over all servers
 serv_id = 3  # Server ID counter (starts at 3)
+http_session: aiohttp.ClientSession = None  # Shared keep-alive session to the servers, opened in before_serving
+recent_latencies = collections.deque(maxlen=1000)  # Latencies (seconds) of the last proxied requests
+latency_count = 0  # Proxied requests timed so far
+hedge_delay: float | None = None  # Current hedging threshold in seconds, None until enough samples
+proxy_stats: dict[str, int] = {'hedges': 0, 'hedge_wins': 0, 'retries': 0}  # Extra requests fired by /home
+breakers: dict[str, CircuitBreaker] = {}  # Circuit breaker for each server, fed by proxied requests
+shared = SharedRing(SHARED_STATE_PATH) if WORKERS > 1 else None  # Routing state shared by the worker processes
+shared_version = 0  # Version of the shared snapshot Servers was loaded from
+health_down: set[str] = set()  # Servers the shared health verdicts mark as down
+health_version = 0  # Version of the shared health verdicts applied to the breakers
 
 # Constants
 MAX_FAIL_COUNT = 5  # Maximum number of heartbeat failures before server is considered down
-HEARTBEAT_INTERVAL = 10  # Seconds between heartbeat checks
+HEARTBEAT_INTERVAL = 10  # Seconds between heartbeat checks of a newly seen server
+HEARTBEAT_MIN_INTERVAL = 2  # Seconds between heartbeats of a server whose last heartbeat failed
+HEARTBEAT_MAX_INTERVAL = 20  # Longest interval a healthy server backs off to
+HEARTBEAT_BACKOFF = 1.5  # Interval growth after each successful heartbeat
+HEARTBEAT_JITTER = 0.2  # Relative random spread of every heartbeat interval
 STOP_TIMEOUT = 5  # Timeout for stopping containers
 REQUEST_TIMEOUT = 1  # Timeout for client requests
 REQUEST_BATCH_SIZE = 10  # Number of concurrent requests to process
 DOCKER_TASK_BATCH_SIZE = 10  # Number of concurrent Docker operations
+POOL_LIMIT = 1000  # Maximum open connections to all servers
+POOL_LIMIT_PER_HOST = 200  # Maximum open connections to one server
+POOL_KEEPALIVE_TIMEOUT = 30  # Seconds an idle pooled connection is kept open
+HEDGE_MIN_SAMPLES = 100  # Latency samples needed before hedging starts
+HEDGE_UPDATE_EVERY = 100  # Recompute the hedging threshold every this many samples
+HEDGE_MIN_DELAY = 0.002  # Lower bound on the hedging threshold in seconds
+BREAKER_ALPHA = 0.2  # EWMA weight of the newest request in a circuit breaker
+BREAKER_ERROR_THRESHOLD = 0.5  # Error EWMA at which a breaker opens (4 straight failures from clean)
+BREAKER_OPEN_SECONDS = 5  # Seconds a breaker stays open before a probe request is let through
+P2C_MIN_LATENCY = 0.0005  # Latency floor (seconds) in the cost of servers with few or no samples
+DNS_CACHE_TTL = 10  # Seconds a resolved server hostname is cached
+SHARED_STATE_POLL = 0.1  # Seconds between checks for membership changes made by other workers
+LEADER_RETRY_INTERVAL = 1  # Seconds between attempts of a worker to take over heartbeats
+
+# Metrics; values the load balancer already tracks are read when /metrics is scraped
+route_requests = metrics.counter('lb_requests_total', 'Requests handled, by route', ['route'])
+route_errors = metrics.counter('lb_request_errors_total', 'Requests answered with status >= 400, by route', ['route'])
+route_duration = metrics.histogram('lb_request_duration_seconds', 'Request handling time, by route', labelnames=['route'])
+backend_requests = metrics.counter('lb_backend_requests_total', 'Requests proxied to each server', ['server'])
+backend_errors = metrics.counter('lb_backend_errors_total', 'Proxied requests that failed or got a 5xx answer', ['server'])
+backend_duration = metrics.histogram('lb_backend_duration_seconds', 'Proxied request latency, by server', labelnames=['server'])
+docker_duration = metrics.histogram('lb_docker_operation_seconds', 'Docker operation time', DOCKER_BUCKETS, ['operation'])
+respawns = metrics.counter('lb_respawns_total', 'Servers respawned after failed heartbeats').labels()
+metrics.callback('lb_ring_servers', 'Servers in the ring', lambda: len(Servers))
+metrics.callback('lb_ring_free_slots', 'Servers that can still be added', lambda: Servers.remaining())
+metrics.callback('lb_inflight_requests', 'Proxied requests in flight', lambda: inflight_total)
+metrics.callback('lb_proxy_extra_requests_total', 'Hedged and retried /home requests', lambda: proxy_stats,
+                 kind='counter', labelname='kind')
+metrics.callback('lb_heartbeats_total', 'Heartbeats sent', lambda: heartbeats.sent, kind='counter')
+metrics.callback('lb_heartbeat_failures_total', 'Heartbeats that failed', lambda: heartbeats.failed, kind='counter')
+metrics.callback('lb_warm_pool_ready', 'Pre-started containers ready for /add', lambda: containers.stats()['ready'])
 
 def err_payload(err: Exception):
     """Create standardized error response payload"""
@@ -39,35 +127,225 @@ def err_payload(err: Exception):
         'status': 'failure'
     }
 
-async def gather_with_concurrency(
-    session: aiohttp.ClientSession,
-    batch: int,
-    *urls: str
-):
-    """Execute HTTP requests with limited concurrency
+def find_bounded(request_id: int) -> str | None:
+    """Consistent hashing with bounded loads
     
-    Args:
-        session: aiohttp session to use for requests
-        batch: maximum number of concurrent requests
-        urls: list of URLs to request
-        
-    Returns:
-        List of responses or None for failed requests
+    Walks the ring from the request's position and returns the first server
+    whose in-flight count is below ceil((1 + epsilon) x its weighted share of
+    the load), counting this request, and whose circuit breaker is not open.
+    If every server is over the bound, falls back to route().
     """
-    await asyncio.sleep(0)  # Yield to event loop
-    semaphore = asyncio.Semaphore(batch)
+    load = (1 + LOAD_BOUND_EPSILON) * (inflight_total + 1) / sum(Servers.weights.values())
+    for server_name in Servers.walk(request_id):
+        if inflight.get(server_name, 0) < math.ceil(load * Servers.weights[server_name]) \
+                and get_breaker(server_name).allow():
+            return server_name
+    return route(request_id)
+
+def p2c_cost(server_name: str) -> float:
+    """Expected wait at a server: its latency EWMA x (in-flight requests + 1), per unit of weight"""
+    latency = max(get_breaker(server_name).latency, P2C_MIN_LATENCY)
+    return latency * (inflight.get(server_name, 0) + 1) / Servers.weights.get(server_name, 1)
+
+def find_p2c(request_id: int) -> str | None:
+    """Power of two choices
     
-    async def fetch(url: str):
-        await asyncio.sleep(0)  # Yield to event loop
-        async with semaphore:  # Limit concurrent requests
-            async with session.get(url) as response:
-                await response.read()  # Ensure response body is read
-                return response
+    Samples two candidates, two random servers (p2c) or the request's ring
+    owner and its successor (p2c-ring), and returns the cheaper one by
+    p2c_cost() whose circuit breaker lets the request through. Request IDs
+    are random, so the ring owner has no cached state worth sticking to.
+    """
+    if BALANCING == 'p2c':
+        servers = Servers.getServerList()
+        candidates = random.sample(servers, 2) if len(servers) > 1 else servers
+    else:
+        candidates = list(itertools.islice(Servers.walk(request_id), 2))
+    # allow() is only asked of the server used, so a half-open probe is never left hanging
+    for server_name in sorted(candidates, key=p2c_cost):
+        if get_breaker(server_name).allow():
+            return server_name
+    return route(request_id)
+
+def get_breaker(server_name: str) -> CircuitBreaker:
+    """Get the circuit breaker of a server, creating a closed one if needed"""
+    breaker = breakers.get(server_name)
+    if breaker is None:
+        breaker = breakers[server_name] = CircuitBreaker(
+            alpha=BREAKER_ALPHA,
+            error_threshold=BREAKER_ERROR_THRESHOLD,
+            latency_limit=BREAKER_LATENCY_LIMIT,
+            open_seconds=BREAKER_OPEN_SECONDS,
+        )
+    return breaker
+
+def route(request_id: int, skip=()) -> str | None:
+    """First server in the request's ring order that is not skipped and whose breaker lets the request through"""
+    try:
+        server_name = Servers.find(request_id)
+    except KeyError:
+        return None  # Empty ring
+    if server_name not in skip and get_breaker(server_name).allow():
+        return server_name
+    for server_name in Servers.walk(request_id):
+        if server_name not in skip and get_breaker(server_name).allow():
+            return server_name
+    return None
+
+def record_latency(seconds: float):
+    """Record a proxied request's latency and periodically refresh the hedging threshold"""
+    global hedge_delay, latency_count
+    recent_latencies.append(seconds)
+    latency_count += 1
+    if HEDGE_PERCENTILE is None or len(recent_latencies) < HEDGE_MIN_SAMPLES:
+        return
+    if hedge_delay is None or latency_count % HEDGE_UPDATE_EVERY == 0:
+        ordered = sorted(recent_latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * HEDGE_PERCENTILE / 100))
+        hedge_delay = max(HEDGE_MIN_DELAY, ordered[index])
+
+def record_outcome(server_name: str, breaker: CircuitBreaker, ok: bool, latency: float = 0.0):
+    """Feed a proxied request's outcome to the server's breaker and share the verdict if it flips"""
+    before = breaker.state
+    breaker.record(ok, latency)
+    if breaker.state != before:
+        share_verdict(server_name, breaker.state == OPEN)
+
+def share_verdict(server_name: str, down: bool):
+    """Tell the other workers that a server went down or came back"""
+    if shared is not None:
+        shared.mark_health(server_name, down)
+
+def sync_health():
+    """Apply health verdicts published by other workers to this worker's breakers
     
-    tasks = [fetch(url) for url in urls]
-    return [None if isinstance(r, BaseException)
-            else r for r in
-            await asyncio.gather(*tasks, return_exceptions=True)]
+    A server marked down has its closed breaker opened, so the worker stops
+    sending to it and probes it after BREAKER_OPEN_SECONDS like any open
+    breaker. A server marked up again has its breaker closed.
+    """
+    global health_down, health_version
+    if shared is None or shared.health_version() == health_version:
+        return
+    version, down = shared.read_health()
+    if down is None:
+        return
+    members = set(Servers.getServerList())
+    for hostname in (down - health_down) & members:
+        breaker = get_breaker(hostname)
+        if breaker.state == CLOSED:
+            breaker.trip()
+    for hostname in health_down - down:
+        breaker = breakers.get(hostname)
+        if breaker is not None and breaker.state != CLOSED:
+            breaker.reset()
+    health_down, health_version = down, version
+
+async def forward_home(server_name: str):
+    """Forward a /home request to a server, counting it as in flight until it answers
+    
+    Returns:
+        tuple: The server's response and its body bytes
+    """
+    global inflight_total
+    breaker = get_breaker(server_name)
+    probe = breaker.state == HALF_OPEN  # Only a probe gets through a half-open breaker
+    inflight[server_name] = inflight.get(server_name, 0) + 1
+    inflight_total += 1
+    try:
+        start = time.perf_counter()
+        async with http_session.get(f'http://{containers.address(server_name)}/home') as response:
+            body = await response.read()  # Ensure response body is read
+        latency = time.perf_counter() - start
+        record_latency(latency)
+        record_outcome(server_name, breaker, response.status < 500, latency)
+        backend_requests.labels(server_name).inc()
+        backend_duration.labels(server_name).observe(latency)
+        if response.status >= 500:
+            backend_errors.labels(server_name).inc()
+        return response, body
+    except asyncio.CancelledError:
+        # A losing hedge says nothing about the server's health
+        if probe:
+            breaker.cancel()
+        raise
+    except Exception:
+        record_outcome(server_name, breaker, False)
+        backend_requests.labels(server_name).inc()
+        backend_errors.labels(server_name).inc()
+        raise
+    finally:
+        inflight_total -= 1
+        if server_name in inflight:
+            inflight[server_name] -= 1
+
+def next_serv_id() -> int:
+    """Allocate the server ID of a new container, unique across workers"""
+    global serv_id
+    serv_id = shared.next_id(serv_id) if shared is not None else serv_id + 1
+    return serv_id
+
+def forget_server(hostname: str):
+    """Drop the per-server state of a removed server"""
+    heartbeat_fail_count.pop(hostname, None)
+    inflight.pop(hostname, None)
+    breakers.pop(hostname, None)
+    for family in (backend_requests, backend_errors, backend_duration):
+        family.remove(hostname)
+
+def sync_servers():
+    """Load the shared routing snapshot if another worker has changed membership since"""
+    global Servers, shared_version
+    if shared is None or shared.version() == shared_version:
+        return
+    version, data = shared.read()
+    if data is None:
+        return
+    removed = set(Servers.getServerList())
+    Servers = load_hash_map(data)  # Swapped in one assignment, like ring versions
+    shared_version = version
+    for hostname in removed - set(Servers.getServerList()):
+        forget_server(hostname)
+
+@contextlib.asynccontextmanager
+async def membership_change():
+    """Hold mutexLock around a change to Servers
+    
+    With several workers, also hold the shared lock, start from the latest
+    shared snapshot and publish the result when the block succeeds.
+    """
+    global shared_version
+    async with mutexLock:
+        if shared is None:
+            yield
+            return
+        async with shared.lock():
+            sync_servers()
+            try:
+                yield
+            except BaseException:
+                shared_version = -1  # Reload the published state over any partial change
+                raise
+            shared_version = shared.publish(Servers.to_bytes())
+
+# Shared Docker client, network handle and warm pool for the server containers,
+# or local server processes with the same interface for benchmarks without Docker
+if ORCHESTRATOR == 'local':
+    containers = LocalPool(
+        env=lambda serv_id: [f'SERVER_ID={serv_id}', 'DEBUG=true', *FAULT_ENV],
+        next_id=next_serv_id,
+        run_dir=LOCAL_RUN_DIR,
+        stop_timeout=STOP_TIMEOUT,
+        on_operation=lambda operation, seconds: docker_duration.labels(operation).observe(seconds),
+    )
+else:
+    containers = ContainerPool(
+        image='server:v1',
+        env=lambda serv_id: [f'SERVER_ID={serv_id}', 'DEBUG=true', *FAULT_ENV],
+        next_id=next_serv_id,
+        warm_size=WARM_POOL_SIZE if shared is None else 0,  # With several workers, the leader fills it
+        concurrency=DOCKER_TASK_BATCH_SIZE,
+        stop_timeout=STOP_TIMEOUT,
+        on_operation=lambda operation, seconds: docker_duration.labels(operation).observe(seconds),
+    )
 
 # API Endpoints
 
@@ -75,19 +353,32 @@ async def gather_with_concurrency(
 async def rep():
     """Report the current state of the server cluster"""
     global Servers
+    sync_servers()
     async with mutexLock:  # Ensure thread-safe access to Servers
         return jsonify(ic({
             'message': {
                 'N': len(Servers),  # Number of servers
                 'Servers': Servers.getServerList(),  # List of server hostnames
+                'balancing': BALANCING,  # Server selection for /home (hash, p2c or p2c-ring)
+                'cpu_seconds': time.process_time(),  # CPU time used by the load balancer so far
+                'proxy': {**proxy_stats, 'hedge_delay': hedge_delay},  # Hedges and retries fired so far
+                'breakers': {h: b.to_dict() for h, b in breakers.items()},  # Circuit breaker of each server
+                'shared_down': sorted(health_down),  # Servers marked down by any worker (WORKERS > 1)
+                'heartbeats': heartbeats.stats(),  # Heartbeat counters, intervals and RTT histograms
+                'warm_pool': containers.stats(),  # Pre-started containers ready for /add
             },
             'status': 'successful',
         })), 200
 
+@app.route('/metrics', methods=['GET'])
+async def metrics_endpoint():
+    """Serve the load balancer's metrics in the Prometheus text format"""
+    return Response(metrics.render(), content_type=CONTENT_TYPE)
+
 @app.route('/add', methods=['POST'])
 async def add():
     """Add new server instances to the cluster"""
-    global Servers, heartbeat_fail_count, serv_id
+    global Servers, heartbeat_fail_count
     await asyncio.sleep(0)  # Yield to event loop
     try:
         # Parse request payload
@@ -99,6 +390,8 @@ async def add():
         # Extract parameters
         n = int(payload.get('n', -1))  # Number of servers to add
         hostnames: list[str] = list(payload.get('hostnames', []))  # Optional predefined hostnames
+        weight = float(payload.get('weight', 1))  # Default weight of the new servers
+        weights: dict[str, float] = {h: float(w) for h, w in dict(payload.get('weights', {})).items()}  # Optional per-host weights
         
         # Validate parameters
         if n <= 0:
@@ -107,6 +400,10 @@ async def add():
             raise Exception('Length of hostname list is more than instances to add')
         if len(hostnames) != len(set(hostnames)):
             raise Exception('Hostname list contains duplicates')
+        if not set(weights).issubset(hostnames):
+            raise Exception(f'Weights given for hostnames {set(weights) - set(hostnames)} not in hostname list')
+        if weight <= 0 or any(w <= 0 for w in weights.values()):
+            raise Exception('Server weights must be greater than 0')
             
         # Generate random hostnames if needed
         new_hostnames = set()
@@ -114,7 +411,7 @@ async def add():
             new_hostnames.add(f'Server-{random.randrange(0, 1000):03}-{int(time.time()*1e3) % 1000:03}')
         hostnames.extend(new_hostnames)
         
-        async with mutexLock:  # Ensure thread-safe access to shared data
+        async with membership_change():  # Ensure thread-safe access to shared data
             # Check if we have enough capacity
             if n > Servers.remaining():
                 raise Exception(f'Insufficient slots. Only {Servers.remaining()} slots left')
@@ -123,58 +420,30 @@ async def add():
                 raise Exception(f'Hostnames {set(hostnames) & set(Servers.getServerList())} are already in Servers')
                 
             ic("To add: ", hostnames)
-            semaphore = asyncio.Semaphore(DOCKER_TASK_BATCH_SIZE)  # Limit concurrent Docker operations
             
-            async def spawn_container(docker: Docker, serv_id: int, hostname: str):
-                """Create and start a new Docker container for a server instance"""
+            async def spawn_container(hostname: str):
+                """Start a container for a server instance, from the warm pool if possible"""
                 await asyncio.sleep(0)  # Yield to event loop
-                async with semaphore:  # Limit concurrent Docker operations
-                    try:
-                        # Configure container
-                        container_config = {
-                            'image': 'server:v1',  # Docker image to use
-                            'detach': True,  # Run in background
-                            'env': [f'SERVER_ID={serv_id}', 'DEBUG=true'],  # Environment variables
-                            'hostname': hostname,  # Container hostname
-                            'tty': True,  # Allocate a terminal
-                        }
-                        # Create or replace container
-                        container = await docker.containers.create_or_replace(
-                            name=hostname,
-                            config=container_config,
-                        )
-                        # Connect to network
-                        LB = await docker.networks.get('LB')
-                        await LB.connect({'Container': container.id, 'EndpointConfig': {'Aliases': [hostname]}})
-                        
-                        if DEBUG:
-                            print(f'{Fore.LIGHTGREEN_EX}CREATE | Created container for {hostname}{Style.RESET_ALL}', file=sys.stderr)
+                try:
+                    _, warm = await containers.spawn(hostname)
+                    if DEBUG:
+                        action = 'Claimed warm' if warm else 'Created and started'
+                        print(f'{Fore.MAGENTA}SPAWN | {action} container for {hostname}{Style.RESET_ALL}', file=sys.stderr)
+                except Exception as e:
+                    if DEBUG:
+                        print(f'{Fore.RED}ERROR | {e}{Style.RESET_ALL}', file=sys.stderr)
                         
-                        # Start container
-                        await container.start()
-                        
-                        if DEBUG:
-                            print(f'{Fore.MAGENTA}SPAWN | Started container for {hostname}{Style.RESET_ALL}', file=sys.stderr)
-                    except Exception as e:
-                        if DEBUG:
-                            print(f'{Fore.RED}ERROR | {e}{Style.RESET_ALL}', file=sys.stderr)
-                            
-            async with Docker() as docker:  # Docker client context
-                tasks = []
-                for hostname in hostnames:
-                    # Add server to hash map
-                    Servers.add(hostname)
-                    # Initialize heartbeat counter
-                    heartbeat_fail_count[hostname] = 0
-                    # Increment server ID
-                    serv_id += 1
-                    # Schedule container creation
-                    tasks.append(spawn_container(docker, serv_id, hostname))
-                    print(f"Added {hostname} to hash map. Current servers: {Servers.getServerList()}")
-                    print(f"Server slots for {hostname}: {Servers.server_slots[hostname]}")
-                    
-                # Wait for all containers to be created
-                await asyncio.gather(*tasks, return_exceptions=True)
+            # Wait for all containers to be up
+            await asyncio.gather(*[spawn_container(hostname) for hostname in hostnames], return_exceptions=True)
+                
+            # Publish the servers once their containers are up (/home does not wait on mutexLock)
+            for hostname in hostnames:
+                # Add server to hash map
+                Servers.add(hostname, weights.get(hostname, weight))
+                # Initialize heartbeat counter
+                heartbeat_fail_count[hostname] = 0
+                print(f"Added {hostname} to hash map. Current servers: {Servers.getServerList()}")
+                print(f"Key space share for {hostname}: {Servers.ownership_fraction()[hostname]:.3f}")
                 
             # Get final list of servers
             final_hostnames = Servers.getServerList()
@@ -216,7 +485,7 @@ async def delete():
         if len(hostnames) > n:
             raise Exception('Length of hostname list is more than instances to delete')
             
-        async with mutexLock:  # Ensure thread-safe access to shared data
+        async with membership_change():  # Ensure thread-safe access to shared data
             # Check if specified hostnames exist
             choices = set(Servers.getServerList())
             if not set(hostnames).issubset(choices):
@@ -228,38 +497,30 @@ async def delete():
             hostnames.extend(random_hostnames)
             
             ic("To delete: ", hostnames)
-            semaphore = asyncio.Semaphore(DOCKER_TASK_BATCH_SIZE)  # Limit concurrent Docker operations
             
-            async def remove_container(docker: Docker, hostname: str):
+            async def remove_container(hostname: str):
                 """Stop and remove a Docker container"""
                 await asyncio.sleep(0)  # Yield to event loop
-                async with semaphore:  # Limit concurrent Docker operations
-                    try:
-                        # Get container
-                        container = await docker.containers.get(hostname)
-                        # Stop container with timeout
-                        await container.stop(timeout=STOP_TIMEOUT)
-                        # Delete container
-                        await container.delete(force=True)
+                try:
+                    await containers.remove(hostname)
+                    if DEBUG:
+                        print(f'{Fore.LIGHTYELLOW_EX}REMOVE | Deleted container for {hostname}{Style.RESET_ALL}', file=sys.stderr)
+                except Exception as e:
+                    if DEBUG:
+                        print(f'{Fore.RED}ERROR | {e}{Style.RESET_ALL}', file=sys.stderr)
                         
-                        if DEBUG:
-                            print(f'{Fore.LIGHTYELLOW_EX}REMOVE | Deleted container for {hostname}{Style.RESET_ALL}', file=sys.stderr)
-                    except Exception as e:
-                        if DEBUG:
-                            print(f'{Fore.RED}ERROR | {e}{Style.RESET_ALL}', file=sys.stderr)
-                            
-            async with Docker() as docker:  # Docker client context
-                tasks = []
-                for hostname in hostnames:
-                    # Remove server from hash map
-                    Servers.remove(hostname)
-                    # Remove heartbeat counter
-                    heartbeat_fail_count.pop(hostname, None)
-                    # Schedule container removal
-                    tasks.append(remove_container(docker, hostname))
-                    
-                # Wait for all containers to be removed
-                await asyncio.gather(*tasks, return_exceptions=True)
+            tasks = []
+            for hostname in hostnames:
+                # Remove server from hash map
+                Servers.remove(hostname)
+                # Remove heartbeat counter, breaker and metrics
+                forget_server(hostname)
+                share_verdict(hostname, False)  # A server re-added under this name starts healthy
+                # Schedule container removal
+                tasks.append(remove_container(hostname))
+                
+            # Wait for all containers to be removed
+            await asyncio.gather(*tasks, return_exceptions=True)
                 
             # Get final list of servers
             final_hostnames = Servers.getServerList()
@@ -277,51 +538,147 @@ async def delete():
             print(f'{Fore.RED}ERROR | {e}{Style.RESET_ALL}', file=sys.stderr)
         return jsonify(ic(err_payload(e))), 400
 
+@app.route('/weight', methods=['PUT'])
+async def set_weight():
+    """Change the weights of running servers"""
+    global Servers
+    await asyncio.sleep(0)  # Yield to event loop
+    try:
+        # Parse request payload
+        payload: dict = await request.get_json()
+        ic(payload)  # Log payload for debugging
+        if payload is None:
+            raise Exception('Payload is empty')
+            
+        # Extract parameters
+        weights: dict[str, float] = {h: float(w) for h, w in dict(payload.get('weights', {})).items()}  # Hostname -> new weight
+        
+        # Validate parameters
+        if not weights:
+            raise Exception('No weights given')
+        if any(w <= 0 for w in weights.values()):
+            raise Exception('Server weights must be greater than 0')
+            
+        async with membership_change():  # Ensure thread-safe access to Servers
+            # Check if specified hostnames exist
+            choices = set(Servers.getServerList())
+            if not set(weights).issubset(choices):
+                raise Exception(f'Hostnames {set(weights) - choices} are not in Servers')
+                
+            for hostname, weight in weights.items():
+                Servers.set_weight(hostname, weight)
+                print(f"Set weight of {hostname} to {weight}. Key space share: {Servers.ownership_fraction()[hostname]:.3f}")
+                
+            final_weights = dict(Servers.weights)
+            
+        # Return success response
+        return jsonify(ic({
+            'message': {
+                'N': len(Servers),
+                'Weights': final_weights
+            },
+            'status': 'success'
+        })), 200
+    except Exception as e:
+        if DEBUG:
+            print(f'{Fore.RED}ERROR | {e}{Style.RESET_ALL}', file=sys.stderr)
+        return jsonify(ic(err_payload(e))), 400
+
 @app.route('/home', methods=['GET'])
 async def home():
-    """Handle client request - route to the appropriate server based on consistent hashing"""
+    """Handle client request - route to the appropriate server based on consistent hashing
+    
+    A request slower than the hedging threshold is duplicated to the next ring
+    successor and the first answer wins; a request that fails to connect is
+    retried on the next successor right away. Servers whose circuit breaker
+    is open are skipped.
+    """
     global Servers
     await asyncio.sleep(0)  # Yield to event loop
+    pending = set()  # Forwarded requests still waiting for an answer
     try:
         # Generate random request ID for consistent hashing
         request_id = random.randint(100000, 999999)
         ic(request_id)
+        sync_servers()  # Pick up /add and /rm handled by other workers
         
-        # Find server using consistent hashing
-        async with mutexLock:  # Thread-safe access to Servers
-            server_name = Servers.find(request_id)
-            
-        if server_name is None:
+        # Find server using consistent hashing; lookups read the published
+        # ring version, so routing never waits for /add or /rm to finish
+        if len(Servers) == 0:
             raise Exception('No servers are available')
+        if BALANCING != 'hash':
+            server_name = find_p2c(request_id)
+        elif LOAD_BOUND_EPSILON is not None:
+            server_name = find_bounded(request_id)
+        else:
+            server_name = route(request_id)
+        if server_name is None:
+            # Every breaker is open: route as if none were
+            server_name = Servers.find(request_id)
             
         ic(server_name)
         
-        # Forward request to selected server
-        async def wrapper(session: aiohttp.ClientSession, server_name: str):
-            """Forward request to server and get response"""
-            await asyncio.sleep(0)  # Yield to event loop
-            async with session.get(f'http://{server_name}:5000/home') as response:
-                await response.read()  # Ensure response body is read
-            return response
-            
-        # Set timeout for request
-        timeout = aiohttp.ClientTimeout(connect=REQUEST_TIMEOUT)
+        # Ring successors used for hedges and retries, taken in order
+        tried = {server_name}
+        def successor():
+            next_server = route(request_id, skip=tried)
+            tried.add(next_server)
+            return next_server
+        retries = 0
+        hedged = False
+        hedge_task = None
         
-        # Send request to server
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            tasks = [asyncio.create_task(wrapper(session, server_name))]
-            serv_response = await asyncio.gather(*tasks, return_exceptions=True)
-            serv_response = serv_response[0] if not isinstance(serv_response[0], BaseException) else None
+        # Send request to server over the shared keep-alive session
+        pending.add(asyncio.create_task(forward_home(server_name)))
+        serv_response = None
+        while pending and serv_response is None:
+            hedge = HEDGE_PERCENTILE is not None and hedge_delay is not None and not hedged
+            done, pending = await asyncio.wait(pending, timeout=hedge_delay if hedge else None,
+                                               return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                # Slower than the threshold: race a duplicate on the next successor
+                hedged = True
+                next_server = successor()
+                if next_server is not None:
+                    proxy_stats['hedges'] += 1
+                    hedge_task = asyncio.create_task(forward_home(next_server))
+                    pending.add(hedge_task)
+                continue
+            for task in done:
+                if task.exception() is None:
+                    serv_response = task.result()
+                    if task is hedge_task:
+                        proxy_stats['hedge_wins'] += 1
+                    break
+            else:
+                # Connection failure: retry on the next successor right away
+                next_server = successor() if retries < MAX_RETRIES else None
+                if next_server is not None:
+                    retries += 1
+                    proxy_stats['retries'] += 1
+                    pending.add(asyncio.create_task(forward_home(next_server)))
             
         if serv_response is None:
             raise Exception('Server did not respond')
+        serv_response, body = serv_response
             
         # Return server response
+        if PASSTHROUGH:
+            # Relay the bytes already read, without a JSON decode/encode round trip
+            return Response(
+                body,
+                status=serv_response.status,
+                content_type=serv_response.headers.get('Content-Type', 'application/json'),
+            )
         return jsonify(ic(await serv_response.json())), 200
     except Exception as e:
         if DEBUG:
             print(f'{Fore.RED}ERROR | {e}{Style.RESET_ALL}', file=sys.stderr)
         return jsonify(ic(err_payload(e))), 400
+    finally:
+        # Drop the losing duplicates
+        for task in pending:
+            task.cancel()
 
 @app.route('/<path:path>')
 async def catch_all(path):
@@ -331,139 +688,167 @@ async def catch_all(path):
         'status': 'failure'
     })), 400
 
+# Request metrics
+
+@app.before_request
+async def start_request_timer():
+    """Note when the request started"""
+    g.request_start = time.perf_counter()
+
+@app.after_request
+async def record_request(response: Response):
+    """Count and time the request under its route"""
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    route_requests.labels(route).inc()
+    route_duration.labels(route).observe(time.perf_counter() - g.request_start)
+    if response.status_code >= 400:
+        route_errors.labels(route).inc()
+    return response
+
 # Application lifecycle hooks
 
 @app.before_serving
 async def my_startup():
-    """Initialize background tasks before serving requests"""
+    """Initialize the shared HTTP session and background tasks before serving requests"""
+    global http_session, shared_version
+    if shared is not None:
+        # The first worker up seeds the shared routing state; the others load it
+        shared.open()
+        async with shared.lock():
+            if shared.version() == 0:
+                shared_version = shared.publish(Servers.to_bytes())
+            else:
+                sync_servers()
+        app.add_background_task(watch_shared_state)
+    # One pooled session for /home and heartbeats: connections to each server
+    # are kept alive and reused, and server hostnames are resolved once per TTL
+    connector = aiohttp.TCPConnector(
+        limit=POOL_LIMIT,
+        limit_per_host=POOL_LIMIT_PER_HOST,
+        keepalive_timeout=POOL_KEEPALIVE_TIMEOUT,
+        ttl_dns_cache=DNS_CACHE_TTL,
+    )
+    http_session = aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(connect=REQUEST_TIMEOUT),
+    )
+    await containers.open()  # Shared Docker client; starts filling the warm pool of a single worker
+    if ORCHESTRATOR == 'local':
+        # No docker-compose here: start the initial servers as local processes
+        await asyncio.gather(*[containers.spawn(hostname) for hostname in Servers.getServerList()])
     app.add_background_task(get_heartbeats)  # Start heartbeat monitoring
 
 @app.after_serving
 async def my_shutdown():
     """Clean up resources after serving requests"""
-    # Cancel background tasks
-    app.background_tasks.pop().cancel()
+    # Cancel background tasks (Quart may already have reaped them)
+    for task in list(app.background_tasks):
+        task.cancel()
+    
+    # Close pooled connections to the servers
+    await http_session.close()
     
     # Clean up Docker containers
-    semaphore = asyncio.Semaphore(DOCKER_TASK_BATCH_SIZE)
-    async def wrapper(docker: Docker, server_name: str):
+    async def wrapper(server_name: str):
         """Stop and remove a Docker container"""
         await asyncio.sleep(0)  # Yield to event loop
-        async with semaphore:  # Limit concurrent Docker operations
-            try:
-                container = await docker.containers.get(server_name)
-                await container.stop(timeout=STOP_TIMEOUT)
-                await container.delete(force=True)
-                if DEBUG:
-                    print(f'{Fore.LIGHTYELLOW_EX}REMOVE | Deleted container for {server_name}{Style.RESET_ALL}', file=sys.stderr)
-            except Exception as e:
-                if DEBUG:
-                    print(f'{Fore.RED}ERROR | {e}{Style.RESET_ALL}', file=sys.stderr)
+        try:
+            await containers.remove(server_name)
+            if DEBUG:
+                print(f'{Fore.LIGHTYELLOW_EX}REMOVE | Deleted container for {server_name}{Style.RESET_ALL}', file=sys.stderr)
+        except Exception as e:
+            if DEBUG:
+                print(f'{Fore.RED}ERROR | {e}{Style.RESET_ALL}', file=sys.stderr)
                     
-    async with Docker() as docker:  # Docker client context
-        tasks = [wrapper(docker, server_name) for server_name in Servers.getServerList()]
+    # With several workers, the leader (or whoever took over from it) removes them
+    if shared is None or shared.try_lead():
+        tasks = [wrapper(server_name) for server_name in Servers.getServerList()]
         await asyncio.gather(*tasks, return_exceptions=True)
+    
+    # Remove the warm containers and close the Docker client
+    await containers.close()
+    
+    if shared is not None:
+        shared.close()
 
 # Background tasks
 
 async def get_heartbeats():
     """Background task to monitor server health via heartbeat requests"""
-    global Servers, heartbeat_fail_count, serv_id
     if DEBUG:
         print(f'{Fore.CYAN}HEARTBEAT | Heartbeat background task started{Style.RESET_ALL}', file=sys.stderr)
     await asyncio.sleep(0)  # Yield to event loop
     try:
-        while True:
-            # Get current list of servers
-            async with mutexLock:  # Thread-safe access to Servers
-                if DEBUG:
-                    print(f'{Fore.CYAN}HEARTBEAT | Checking heartbeat every {HEARTBEAT_INTERVAL} seconds{Style.RESET_ALL}', file=sys.stderr)
-                else:
-                    print('HEARTBEAT CHECK')
-                hostnames = Servers.getServerList().copy()
-                
-            # Prepare heartbeat URLs
-            heartbeat_urls = [f'http://{server_name}:5000/heartbeat' for server_name in hostnames]
-            
-            # Set timeout for heartbeat requests
-            timeout = aiohttp.ClientTimeout(connect=REQUEST_TIMEOUT)
-            
-            # Send heartbeat requests to all servers
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                heartbeats = await gather_with_concurrency(session, REQUEST_BATCH_SIZE, *heartbeat_urls)
-                
-            await asyncio.sleep(0)  # Yield to event loop
-            
-            # Handle failed heartbeats
-            semaphore = asyncio.Semaphore(DOCKER_TASK_BATCH_SIZE)
-            async def flatline_wrapper(serv_id: int, server_name: str):
-                """Wrapper for handling failed servers"""
-                await asyncio.sleep(0)  # Yield to event loop
-                async with semaphore:  # Limit concurrent Docker operations
-                    try:
-                        await handle_flatline(serv_id, server_name)
-                    except Exception as e:
-                        if DEBUG:
-                            print(f'{Fore.RED}ERROR | {e}{Style.RESET_ALL}', file=sys.stderr)
-                            
-            flatlines = []
-            async with mutexLock:  # Thread-safe access to shared data
-                for i, response in enumerate(heartbeats):
-                    if response is None or not response.status == 200:
-                        # Increment fail count for server
-                        heartbeat_fail_count[hostnames[i]] = heartbeat_fail_count.get(hostnames[i], 0) + 1
-                        if heartbeat_fail_count[hostnames[i]] >= MAX_FAIL_COUNT:
-                            # Server has failed too many times, restart it
-                            serv_id += 1
-                            flatlines.append(flatline_wrapper(serv_id, hostnames[i]))
-                    else:
-                        # Reset fail count for healthy server
-                        heartbeat_fail_count[hostnames[i]] = 0
-                        
-                # Handle failed servers
-                if flatlines:
-                    await asyncio.gather(*flatlines, return_exceptions=True)
-                    
-            # Wait until next heartbeat check
-            await asyncio.sleep(HEARTBEAT_INTERVAL)
+        # With several workers, only the leader sends heartbeats and respawns servers;
+        # the others take over if it exits
+        while shared is not None and not shared.try_lead():
+            await asyncio.sleep(LEADER_RETRY_INTERVAL)
+        if shared is not None:
+            containers.resize(WARM_POOL_SIZE)  # One warm pool, kept by the leader
+        await heartbeats.run(http_session)
     except asyncio.CancelledError:
         if DEBUG:
             print(f'{Fore.CYAN}HEARTBEAT | Heartbeat background task stopped{Style.RESET_ALL}', file=sys.stderr)
 
-async def handle_flatline(serv_id: int, hostname: str):
-    """Recreate and restart a failed server container"""
+async def watch_shared_state():
+    """Background task picking up membership changes and health verdicts of other workers"""
+    try:
+        while True:
+            sync_servers()
+            sync_health()
+            await asyncio.sleep(SHARED_STATE_POLL)
+    except asyncio.CancelledError:
+        pass
+
+async def respawn(hostname: str):
+    """Replace a server whose heartbeats keep failing; runs as its own task"""
+    respawns.inc()
+    try:
+        await handle_flatline(hostname)
+    except Exception as e:
+        if DEBUG:
+            print(f'{Fore.RED}ERROR | {e}{Style.RESET_ALL}', file=sys.stderr)
+
+def heartbeat_failed(hostname: str, fail_count: int):
+    """Share a server's first failed heartbeat as a down verdict (only the leader sends heartbeats)"""
+    if fail_count == 1:
+        share_verdict(hostname, True)
+
+# Per-server heartbeat timers; servers answering proxied requests are known
+# to be alive, so only idle ones (including those skipped by an open breaker) are polled
+heartbeats = HeartbeatScheduler(
+    hostnames=lambda: Servers.getServerList(),
+    on_flatline=respawn,
+    fail_counts=heartbeat_fail_count,
+    interval=HEARTBEAT_INTERVAL,
+    min_interval=HEARTBEAT_MIN_INTERVAL,
+    max_interval=HEARTBEAT_MAX_INTERVAL,
+    backoff=HEARTBEAT_BACKOFF,
+    jitter=HEARTBEAT_JITTER,
+    max_fail_count=MAX_FAIL_COUNT,
+    concurrency=REQUEST_BATCH_SIZE,
+    timeout=REQUEST_TIMEOUT,
+    should_probe=lambda hostname: get_breaker(hostname).idle(HEARTBEAT_INTERVAL),
+    address=containers.address,
+    on_failure=heartbeat_failed,
+)
+
+async def handle_flatline(hostname: str):
+    """Replace a failed server's container, from the warm pool if possible"""
     await asyncio.sleep(0)  # Yield to event loop
     if DEBUG:
         print(f'{Fore.LIGHTRED_EX}FLATLINE | Flatline of server replica {hostname} detected{Style.RESET_ALL}', file=sys.stderr)
     try:
-        async with Docker() as docker:  # Docker client context
-            # Configure container
-            container_config = {
-                'image': 'server:v1',
-                'detach': True,
-                'env': [f'SERVER_ID={serv_id}', 'DEBUG=true'],
-                'hostname': hostname,
-                'tty': True,
-            }
-            
-            # Create or replace container
-            container = await docker.containers.create_or_replace(name=hostname, config=container_config)
-            
-            # Connect to network
-            LB = await docker.networks.get('LB')
-            connect_config = {
-                'Container': container.id, 
-                'EndpointConfig': {
-                    'Aliases': [hostname]
-                }
-            }
-            await LB.connect(connect_config)
-            
-            # Start container
-            await container.start()
-            
-            if DEBUG:
-                print(f'{Fore.MAGENTA}RESPAWN | Started container for {hostname}{Style.RESET_ALL}', file=sys.stderr)
+        # Replaces the failed container that still holds the name
+        _, warm = await containers.spawn(hostname)
+        
+        # The new container starts with a clean breaker, in every worker
+        breakers.pop(hostname, None)
+        share_verdict(hostname, False)
+        
+        if DEBUG:
+            action = 'Claimed warm' if warm else 'Started'
+            print(f'{Fore.MAGENTA}RESPAWN | {action} container for {hostname}{Style.RESET_ALL}', file=sys.stderr)
     except Exception as e:
         if DEBUG:
             print(f'{Fore.RED}ERROR | {e}{Style.RESET_ALL}', file=sys.stderr)
@@ -471,5 +856,16 @@ async def handle_flatline(serv_id: int, hostname: str):
 if __name__ == '__main__':
     # Get port from command line argument or use default
     port = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    if WORKERS > 1:
+        # Production mode: Hypercorn worker processes accept on one listening
+        # socket and share the routing state through SHARED_STATE_PATH
+        from hypercorn.config import Config
+        from hypercorn.run import run
+        SharedRing.reset(SHARED_STATE_PATH)
+        config = Config()
+        config.bind = [f'0.0.0.0:{port}']
+        config.workers = WORKERS
+        config.application_path = 'loadBalancer:app'
+        sys.exit(run(config))
     # Start the application
     app.run(host='0.0.0.0', port=port, use_reloader=False, debug=DEBUG)
\ No newline at end of file
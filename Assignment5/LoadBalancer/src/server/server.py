@@ -1,10 +1,17 @@
+import asyncio
 import os
+import random
 import sys
 from quart import Quart, jsonify
 
 # Initialize the Quart web application
 app = Quart(__name__)
 
+# Fault injection for benchmarks; all disabled by default
+FAULT_LATENCY = float(os.environ.get('FAULT_LATENCY', 0))  # Seconds added to every /home response
+FAULT_ERROR_RATE = float(os.environ.get('FAULT_ERROR_RATE', 0))  # Fraction of /home requests answered with a 500
+FAULT_CRASH_RATE = float(os.environ.get('FAULT_CRASH_RATE', 0))  # Fraction of /home requests that kill the server
+
 @app.route('/home', methods=['GET'])
 async def home():
     """
@@ -14,9 +21,21 @@ async def home():
     The server ID is fetched from the environment variable 'SERVER_ID', and defaults 
     to '0' if not set.
 
+    Faults configured through FAULT_LATENCY, FAULT_ERROR_RATE and
+    FAULT_CRASH_RATE are applied here: the server may exit at once, answer
+    late, or answer with a 500 error.
+
     Returns:
         JSON response with message containing the server ID and status.
     """
+    # Injected faults: a crash looks like a dead container to the load balancer
+    if FAULT_CRASH_RATE and random.random() < FAULT_CRASH_RATE:
+        os._exit(1)
+    if FAULT_LATENCY:
+        await asyncio.sleep(FAULT_LATENCY)
+    if FAULT_ERROR_RATE and random.random() < FAULT_ERROR_RATE:
+        return jsonify({'message': "Injected error", 'status': "failure"}), 500
+
     # Fetch the server ID from environment variables or default to '0'
     serv_id = os.environ.get('SERVER_ID', '0')
     
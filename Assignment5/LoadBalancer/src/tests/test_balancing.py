@@ -0,0 +1,95 @@
+import collections
+import itertools
+
+import pytest
+
+import loadBalancer as lb
+from RoutingEngines import create_hash_map
+
+REQUEST_IDS = range(100000, 100200)
+
+
+@pytest.fixture
+def servers(monkeypatch):
+    """Three-server ring with fresh breakers and nothing in flight."""
+    servers = create_hash_map('ring', hostnames=['Server1', 'Server2', 'Server3'], hash_function='md5')
+    monkeypatch.setattr(lb, 'Servers', servers)
+    monkeypatch.setattr(lb, 'breakers', {})
+    monkeypatch.setattr(lb, 'inflight', {})
+    monkeypatch.setattr(lb, 'inflight_total', 0)
+    monkeypatch.setattr(lb, 'LOAD_BOUND_EPSILON', 0.25)
+    return servers
+
+
+def test_bounded_returns_owner_under_the_bound(servers):
+    for request_id in REQUEST_IDS:
+        assert lb.find_bounded(request_id) == servers.find(request_id)
+
+
+def test_bounded_skips_servers_over_the_bound(servers, monkeypatch):
+    # Bound: ceil(1.25 x 31 / 3) = 13 in flight per server
+    monkeypatch.setattr(lb, 'inflight', {'Server1': 20, 'Server2': 5, 'Server3': 5})
+    monkeypatch.setattr(lb, 'inflight_total', 30)
+    for request_id in REQUEST_IDS:
+        assert lb.find_bounded(request_id) != 'Server1'
+
+
+def test_bounded_fallback_respects_breakers(servers, monkeypatch):
+    # Every server is over the bound, and the first one's breaker is open
+    monkeypatch.setattr(lb, 'inflight', {hostname: 5 for hostname in servers.getServerList()})
+    lb.get_breaker('Server1').trip()
+    for request_id in REQUEST_IDS:
+        assert lb.find_bounded(request_id) == lb.route(request_id) != 'Server1'
+
+    for hostname in servers.getServerList():
+        lb.get_breaker(hostname).trip()
+    assert lb.find_bounded(REQUEST_IDS[0]) is None
+
+
+def test_bounded_scales_with_weight(servers, monkeypatch):
+    # Bound: ceil(1.25 x 31 / 4 x weight) = 20 for Server1 and 10 for the others
+    servers.set_weight('Server1', 2)
+    monkeypatch.setattr(lb, 'inflight', {'Server1': 15, 'Server2': 10, 'Server3': 10})
+    monkeypatch.setattr(lb, 'inflight_total', 30)
+    assert {lb.find_bounded(request_id) for request_id in REQUEST_IDS} == {'Server1'}
+
+
+def test_p2c_ring_picks_the_cheaper_candidate(servers, monkeypatch):
+    monkeypatch.setattr(lb, 'BALANCING', 'p2c-ring')
+    for request_id in REQUEST_IDS:
+        owner, successor = itertools.islice(servers.walk(request_id), 2)
+        lb.get_breaker(owner).latency = 0.01
+        lb.get_breaker(successor).latency = 0.001
+        assert lb.find_p2c(request_id) == successor
+
+        # An open breaker loses even when its server is cheaper
+        lb.get_breaker(successor).trip()
+        assert lb.find_p2c(request_id) == owner
+        lb.get_breaker(successor).reset()
+        lb.get_breaker(owner).latency = lb.get_breaker(successor).latency = 0.0
+
+
+def test_p2c_cost_counts_inflight_and_weight(servers, monkeypatch):
+    monkeypatch.setattr(lb, 'inflight', {'Server1': 3})
+    servers.set_weight('Server2', 4)
+    lb.get_breaker('Server2').latency = 0.01
+    assert lb.p2c_cost('Server1') == pytest.approx(lb.P2C_MIN_LATENCY * 4)
+    assert lb.p2c_cost('Server2') == pytest.approx(0.01 / 4)
+
+
+def test_hedge_delay_tracks_the_percentile(monkeypatch):
+    monkeypatch.setattr(lb, 'HEDGE_PERCENTILE', 90.0)
+    monkeypatch.setattr(lb, 'recent_latencies', collections.deque(maxlen=1000))
+    monkeypatch.setattr(lb, 'latency_count', 0)
+    monkeypatch.setattr(lb, 'hedge_delay', None)
+
+    for i in range(1, lb.HEDGE_MIN_SAMPLES):
+        lb.record_latency(i / 1000)
+    assert lb.hedge_delay is None
+    lb.record_latency(0.1)
+    assert lb.hedge_delay == pytest.approx(0.091)
+
+    # Fast requests only lower the threshold to HEDGE_MIN_DELAY
+    for _ in range(1000):
+        lb.record_latency(0.0001)
+    assert lb.hedge_delay == lb.HEDGE_MIN_DELAY
@@ -0,0 +1,65 @@
+from CircuitBreaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+def test_breaker_opens_probes_and_closes():
+    breaker = CircuitBreaker(alpha=0.5, error_threshold=0.5, open_seconds=5)
+    assert breaker.state == CLOSED and breaker.allow(now=0)
+
+    breaker.record(True, 0.01, now=1)
+    assert breaker.state == CLOSED
+    breaker.record(False, now=2)
+    assert breaker.state == OPEN and breaker.opened_at == 2
+    assert not breaker.allow(now=6.9)
+
+    # After open_seconds a single probe goes through
+    assert breaker.allow(now=7)
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow(now=7.1)
+
+    breaker.record(True, 0.01, now=7.2)
+    assert breaker.state == CLOSED and breaker.error_rate == 0.0
+    assert breaker.allow(now=7.3)
+
+
+def test_failed_probe_reopens():
+    breaker = CircuitBreaker(alpha=1.0, error_threshold=0.5, open_seconds=5)
+    breaker.record(False, now=0)
+    assert breaker.allow(now=5) and breaker.state == HALF_OPEN
+
+    breaker.record(False, now=6)
+    assert breaker.state == OPEN and breaker.opened_at == 6
+    assert not breaker.allow(now=10)
+    assert breaker.allow(now=11)
+
+
+def test_cancelled_probe_frees_the_slot():
+    breaker = CircuitBreaker(alpha=1.0, open_seconds=5)
+    breaker.record(False, now=0)
+    assert breaker.allow(now=5)
+    assert not breaker.allow(now=5)
+    breaker.cancel()
+    assert breaker.state == HALF_OPEN and breaker.allow(now=5)
+
+
+def test_slow_server_opens_the_breaker():
+    breaker = CircuitBreaker(alpha=0.5, latency_limit=0.1)
+    breaker.record(True, 0.1, now=0)
+    assert breaker.state == CLOSED
+    breaker.record(True, 0.3, now=1)
+    assert breaker.state == OPEN
+    assert breaker.to_dict() == {'state': OPEN, 'error_rate': 0.0, 'latency_ms': 175.0}
+
+
+def test_outside_verdicts():
+    breaker = CircuitBreaker(open_seconds=5)
+    breaker.trip(now=10)
+    assert breaker.state == OPEN and not breaker.allow(now=14)
+    breaker.reset()
+    assert breaker.state == CLOSED and breaker.allow(now=14)
+
+
+def test_idle():
+    breaker = CircuitBreaker()
+    breaker.record(True, 0.01, now=100)
+    assert not breaker.idle(30, now=129)
+    assert breaker.idle(30, now=130)
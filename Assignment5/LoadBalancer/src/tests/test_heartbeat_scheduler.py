@@ -0,0 +1,98 @@
+import asyncio
+import contextlib
+import random
+
+from HeartbeatScheduler import HeartbeatScheduler
+
+
+def make_scheduler(hostnames=('Server1',), **kwargs):
+    async def on_flatline(hostname):
+        flatlined.append(hostname)
+        await asyncio.sleep(0)
+
+    flatlined = []
+    failures = []
+    scheduler = HeartbeatScheduler(
+        hostnames=lambda: hostnames,
+        on_flatline=on_flatline,
+        fail_counts={},
+        on_failure=lambda hostname, count: failures.append((hostname, count)),
+        **kwargs,
+    )
+    return scheduler, flatlined, failures
+
+
+def test_jitter_bounds():
+    random.seed(0)
+    scheduler, _, _ = make_scheduler(jitter=0.2)
+    dues = [scheduler._next_due(100, 10) for _ in range(10000)]
+    assert 108 <= min(dues) < 108.1
+    assert 111.9 < max(dues) <= 112
+
+    # New servers are spread over one whole interval
+    scheduler = make_scheduler(hostnames=[f'Server{i}' for i in range(1000)], interval=10)[0]
+    scheduler._sync_members(100)
+    dues = [timer.due for timer in scheduler.timers.values()]
+    assert 100 <= min(dues) < 100.1 and 109.9 < max(dues) <= 110
+
+
+def test_backoff_and_failure():
+    scheduler, _, failures = make_scheduler(interval=10, min_interval=2, max_interval=20, backoff=1.5)
+    scheduler._sync_members(0)
+    timer = scheduler.timers['Server1']
+
+    intervals = []
+    for _ in range(4):
+        scheduler._record('Server1', timer, True)
+        intervals.append(timer.interval)
+    assert intervals == [15, 20, 20, 20]
+
+    timer.due = 1e9
+    scheduler._record('Server1', timer, False)
+    assert timer.interval == 2 and timer.due < 1e9
+    assert scheduler.fail_counts['Server1'] == 1 and failures == [('Server1', 1)]
+
+    scheduler._record('Server1', timer, True)
+    assert timer.interval == 3 and scheduler.fail_counts['Server1'] == 0
+
+
+def test_flatline_runs_once_and_resumes():
+    async def scenario():
+        scheduler, flatlined, _ = make_scheduler(max_fail_count=3)
+        scheduler._sync_members(0)
+        timer = scheduler.timers['Server1']
+        for _ in range(5):
+            scheduler._record('Server1', timer, False)
+        assert list(scheduler.respawns) == ['Server1']
+        await scheduler.respawns['Server1']
+        await asyncio.sleep(0)
+        assert flatlined == ['Server1'] and not scheduler.respawns
+        assert scheduler.fail_counts['Server1'] == 0 and timer.interval == scheduler.min_interval
+
+    asyncio.run(scenario())
+
+
+def test_outcome_of_removed_server_is_ignored():
+    scheduler, _, failures = make_scheduler()
+    scheduler._sync_members(0)
+    timer = scheduler.timers['Server1']
+    scheduler.hostnames = lambda: ()
+    scheduler._sync_members(1)
+    scheduler._record('Server1', timer, False)
+    assert not failures and not scheduler.fail_counts
+
+
+def test_run_backs_off_skipped_servers():
+    async def scenario():
+        scheduler, _, _ = make_scheduler(('Server1', 'Server2'), interval=0.01, max_interval=0.04, backoff=2,
+                                         should_probe=lambda hostname: False)
+        task = asyncio.create_task(scheduler.run(session=None, tick=0.005))
+        await asyncio.sleep(0.3)
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+        return scheduler
+
+    scheduler = asyncio.run(scenario())
+    assert scheduler.sent == 0 and scheduler.skipped >= 4
+    assert {server['interval'] for server in scheduler.stats()['servers'].values()} == {0.04}
@@ -0,0 +1,141 @@
+import random
+
+import numpy as np
+import pytest
+
+from ConsistentHashing import ConsistentHashMap
+from HashFunctions import HASH_FUNCTIONS, fnv1a64, md5, md5_request_hash_many, murmur3_32, siphash24, xxh32
+from RoutingEngines import ENGINES, create_hash_map, is_prime, load_hash_map
+
+
+def request_ids(count=2000, seed=0):
+    rng = random.Random(seed)
+    return [rng.randint(100000, 999999) for _ in range(count)]
+
+
+def build_ring(server_count, probing='linear', hash_function='polynomial'):
+    """Ring with the occupancy of the default deployment (3 x 9 of 512 slots)."""
+    return ConsistentHashMap(
+        hostnames=[f'Server-{i}' for i in range(server_count)],
+        n_slots=max(512, server_count * 9 * 19),
+        probing=probing,
+        hash_function=hash_function,
+    )
+
+
+def linear_find(ring, request_id):
+    """Reference lookup that walks the slots one cell at a time."""
+    request_hash = ring.requestHash(request_id) % ring.n_slots
+    while ring.slots[request_hash] is None:
+        request_hash = (request_hash + 1) % ring.n_slots
+    return ring.slots[request_hash]
+
+
+@pytest.mark.parametrize('probing', ['linear', 'quadratic'])
+@pytest.mark.parametrize('server_count', [3, 100])
+def test_find_matches_linear_walk(server_count, probing):
+    ring = build_ring(server_count, probing)
+    ring.remove('Server-1')
+    ring.add('Server-new')
+    for request_id in request_ids():
+        assert ring.find(request_id) == linear_find(ring, request_id)
+
+
+@pytest.mark.parametrize('hash_function', list(HASH_FUNCTIONS))
+def test_find_many_matches_find(hash_function):
+    ring = build_ring(3, hash_function=hash_function)
+    ids = request_ids()
+    assert ring.find_many(ids).tolist() == [ring.find(r) for r in ids]
+    assert ring.find_many(ids, as_index=True).tolist() == [ring.servers[ring.find(r)] for r in ids]
+
+    # A change publishes a new ring that the next batch must see
+    ring.remove('Server-0')
+    assert ring.find_many(np.array(ids)).tolist() == [ring.find(r) for r in ids]
+
+
+def test_find_many_empty_ring():
+    with pytest.raises(KeyError):
+        ConsistentHashMap(hostnames=[]).find_many([1, 2, 3])
+
+
+def test_hash_test_vectors():
+    # Published reference values of each algorithm
+    assert md5(b'') == 0xD41D8CD98F00B204E9800998ECF8427E
+    assert xxh32(b'') == 0x02CC5D05
+    assert xxh32(b'abc') == 0x32D153FF
+    assert xxh32(b'Nobody inspects the spammish repetition') == 0xE2293B2F
+    assert fnv1a64(b'') == 0xCBF29CE484222325
+    assert fnv1a64(b'a') == 0xAF63DC4C8601EC8C
+    assert fnv1a64(b'foobar') == 0x85944171F73967E8
+    assert murmur3_32(b'') == 0
+    assert murmur3_32(b'', 1) == 0x514E28B7
+    assert murmur3_32(b'hello') == 0x248BFA47
+    assert murmur3_32(b'The quick brown fox jumps over the lazy dog') == 0x2E4FF723
+    assert siphash24(b'') == 0x726FDB47DD0E0E31
+    assert siphash24(bytes(range(8))) == 0x93F5F5799A932462
+    assert siphash24(bytes(range(15))) == 0xA129CA6149BE45E5
+
+
+def test_polynomial_hashes():
+    polynomial = HASH_FUNCTIONS['polynomial']
+    assert polynomial.request_hash(132574) == 132574**2 + 2 * 132574 + 17
+    assert polynomial.server_hash(2, 5) == 2**2 + 5**2 + 2 * 5 + 25
+    ids = np.array(request_ids(), dtype=np.int64)
+    assert polynomial.request_hash_many(ids, 512).tolist() == [polynomial.request_hash(int(i)) % 512 for i in ids]
+
+
+@pytest.mark.parametrize('n_slots', [512, 65537, 2**31 - 1])
+def test_md5_request_hash_many(n_slots):
+    # Every decimal length from 1 to 19 digits, and an ID with a minus sign
+    ids = np.array([0, 9, 10, -5] + [10**k - 1 for k in range(2, 19)] + [2**63 - 1] + request_ids(), dtype=np.int64)
+    assert md5_request_hash_many(ids, n_slots).tolist() == [md5(str(int(i)).encode()) % n_slots for i in ids]
+
+
+@pytest.mark.parametrize('probing', ['linear', 'quadratic'])
+def test_rebalance_plan_covers_moved_keys(probing):
+    ring = ConsistentHashMap(hostnames=[f'Server-{i}' for i in range(20)], probing=probing)
+    for i in range(5):
+        ring.remove(f'Server-{i * 3}')
+    ring.add('Server-new')
+    ids = request_ids(20000)
+    before = [ring.find(r) for r in ids]
+
+    plan = ring.rebalance()
+    assert plan
+    for request_id, old in zip(ids, before):
+        new = ring.find(request_id)
+        request_hash = ring.requestHash(request_id) % ring.n_slots
+        entries = [entry for entry in plan if entry['start'] <= request_hash <= entry['end']]
+        if old == new:
+            assert not entries
+        else:
+            assert entries == [{'start': entries[0]['start'], 'end': entries[0]['end'], 'old': old, 'new': new}]
+
+
+@pytest.mark.parametrize('engine', list(ENGINES))
+def test_snapshot_round_trip(engine):
+    hash_map = create_hash_map(engine, hostnames=[f'Server-{i}' for i in range(6)], hash_function='md5')
+    hash_map.remove('Server-2')
+    hash_map.add('Server-new')
+
+    restored = load_hash_map(hash_map.to_bytes())
+    assert type(restored) is type(hash_map)
+    assert restored.getServerList() == hash_map.getServerList()
+    ids = request_ids()
+    assert [restored.find(r) for r in ids] == [hash_map.find(r) for r in ids]
+    assert restored.to_bytes() == hash_map.to_bytes()
+
+
+def test_snapshot_rejects_other_data():
+    with pytest.raises(ValueError):
+        load_hash_map(b'not a snapshot')
+
+
+def test_maglev_table_size_must_be_prime():
+    assert [n for n in range(20) if is_prime(n)] == [2, 3, 5, 7, 11, 13, 17, 19]
+    assert is_prime(65537)
+    for table_size in (0, 1, 100, 65536):
+        with pytest.raises(ValueError):
+            create_hash_map('maglev', hostnames=['a', 'b', 'c'], table_size=table_size)
+    maglev = create_hash_map('maglev', hostnames=['a', 'b', 'c'], table_size=101)
+    assert sum(maglev.get_distribution().values()) == 101
@@ -0,0 +1,135 @@
+import asyncio
+import fcntl
+import os
+
+import pytest
+
+import SharedRing as SharedRing_module
+from SharedRing import HEADER, MAGIC, SharedRing
+
+
+@pytest.fixture
+def shared(tmp_path):
+    ring = SharedRing(str(tmp_path / 'ring'))
+    ring.open()
+    yield ring
+    ring.close()
+
+
+def test_cancelled_lock_waiter_never_takes_the_lock(shared):
+    # Another worker: a second open file description of the same file
+    other = os.open(shared.path, os.O_RDWR)
+    try:
+        async def scenario():
+            fcntl.flock(other, fcntl.LOCK_EX)
+            entered = []
+
+            async def waiter():
+                async with shared.lock():
+                    entered.append(True)
+
+            task = asyncio.create_task(waiter())
+            await asyncio.sleep(0.02)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            fcntl.flock(other, fcntl.LOCK_UN)
+            await asyncio.sleep(0.1)
+            assert not entered
+
+            # Nobody holds the lock, so the other worker and then this one get it
+            fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            fcntl.flock(other, fcntl.LOCK_UN)
+            async with shared.lock():
+                with pytest.raises(BlockingIOError):
+                    fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            fcntl.flock(other, fcntl.LOCK_UN)
+
+        asyncio.run(asyncio.wait_for(scenario(), 5))
+    finally:
+        os.close(other)
+
+
+def test_lock_waits_for_the_holder(shared):
+    other = os.open(shared.path, os.O_RDWR)
+    try:
+        async def scenario():
+            fcntl.flock(other, fcntl.LOCK_EX)
+            lock = shared.lock()
+            task = asyncio.create_task(lock.__aenter__())
+            await asyncio.sleep(0.02)
+            assert not task.done()
+            fcntl.flock(other, fcntl.LOCK_UN)
+            await asyncio.wait_for(task, 1)
+            with pytest.raises(BlockingIOError):
+                fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            await lock.__aexit__(None, None, None)
+            fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+        asyncio.run(scenario())
+    finally:
+        os.close(other)
+
+
+def test_publish_and_read(shared, tmp_path):
+    assert shared.version() == 0 and shared.read() == (0, None)
+    assert shared.publish(b'first') == 2
+    assert shared.publish(b'second snapshot') == 4
+
+    # Another worker maps the same file and sees the latest snapshot
+    other = SharedRing(shared.path)
+    other.open()
+    try:
+        assert other.version() == 4
+        assert other.read() == (4, b'second snapshot')
+        assert other.publish(b'third') == 6
+        assert shared.read() == (6, b'third')
+    finally:
+        other.close()
+
+
+def test_read_retries_while_a_writer_publishes(shared, monkeypatch):
+    shared.publish(b'snapshot')
+    # A writer died mid-publish: the version stays odd and no copy is consistent
+    HEADER.pack_into(shared._ring._map, 0, MAGIC, 3, 8)
+    monkeypatch.setattr(SharedRing_module, 'READ_ATTEMPTS', 10)
+    assert shared.read() == (3, None)
+    # The next writer skips the odd version
+    assert shared.publish(b'repaired') == 6
+    assert shared.read() == (6, b'repaired')
+
+
+def test_snapshot_over_capacity(tmp_path):
+    ring = SharedRing(str(tmp_path / 'small'), capacity=4)
+    ring.open()
+    try:
+        with pytest.raises(ValueError):
+            ring.publish(b'too long')
+        assert ring.version() == 0
+    finally:
+        ring.close()
+
+
+def test_health_verdicts(shared):
+    assert shared.read_health() == (0, set())
+    assert shared.mark_health('Server1', True)
+    assert not shared.mark_health('Server1', True)
+    assert shared.mark_health('Server2', True)
+    assert shared.read_health() == (shared.health_version(), {'Server1', 'Server2'})
+    assert shared.mark_health('Server1', False)
+    assert shared.read_health()[1] == {'Server2'}
+
+
+def test_server_ids_and_leader(shared):
+    other = SharedRing(shared.path)
+    other.open()
+    try:
+        assert shared.next_id(start=5) == 6
+        assert other.next_id(start=5) == 7
+        assert shared.try_lead() and shared.try_lead()
+        assert not other.try_lead()
+        shared.close()
+        assert other.try_lead()
+    finally:
+        other.close()
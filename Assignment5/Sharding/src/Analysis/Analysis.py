@@ -1,6 +1,7 @@
 import requests
 import time
 import random  # May be used by PayloadGenerator
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import matplotlib.pyplot as plt
 from payload_generator import PayloadGenerator
@@ -33,47 +34,56 @@ def plot_line_chart(x_values, y_values, x_label, y_label, title, path):
     print(f"Saved plot: {title} to {path}")
 
 
-def launch_rw_requests(low_idx, high_idx):
+def send_request(endpoint, payload):
+    """
+    Sends one read or write request and times it.
+
+    Args:
+        endpoint (str): "/read" or "/write".
+        payload (dict): Request payload.
+
+    Returns:
+        tuple: The endpoint and the request time in seconds.
+    """
+    start = time.time()
+    response = requests.post(BASE_URL + endpoint, json=payload)
+    if response.status_code != 200:
+        print(f"Error during {endpoint[1:]}:", response.text)
+    return endpoint, time.time() - start
+
+
+def launch_rw_requests(low_idx, high_idx, concurrency=1, num_rw=100):
     """
     Launches a series of read and write requests to the server.
     
-    The function creates a payload generator for request data, shuffles read/write
-    endpoints, issues the requests, and times their execution.
+    The function creates a payload generator for request data, builds the
+    payloads for the read and write endpoints, issues the requests, and times
+    their execution. With concurrency > 1, that many clients send requests
+    at the same time from a thread pool.
     
     Args:
         low_idx (int): Lower bound index for generating payload.
         high_idx (int): Upper bound index for generating payload.
+        concurrency (int): Number of concurrent clients.
+        num_rw (int): Number of read requests and of write requests.
     
     Returns:
         tuple: A tuple of two lists containing the read times and write times.
     """
     generator = PayloadGenerator(low_idx, high_idx)
-    num_rw = 100
-    # Create list with 100 read endpoints and 100 write endpoints.
+    # Create list with num_rw read endpoints and num_rw write endpoints.
     endpoints = ["/read"] * num_rw + ["/write"] * num_rw
+    # The generator is not thread-safe, so build every payload up front.
+    payloads = [generator.generate_random_payload(endpoint=endpoint) for endpoint in endpoints]
 
-    read_times = []
-    write_times = []
-    
-    for endpoint in endpoints:
-        start = time.time()
-        if endpoint == "/read":
-            response = requests.post(
-                BASE_URL + "/read",
-                json=generator.generate_random_payload(endpoint="/read")
-            )
-            if response.status_code != 200:
-                print("Error during read:", response.text)
-            read_times.append(time.time() - start)
-        elif endpoint == "/write":
-            response = requests.post(
-                BASE_URL + "/write",
-                json=generator.generate_random_payload(endpoint="/write")
-            )
-            if response.status_code != 200:
-                print("Error during write:", response.text)
-            write_times.append(time.time() - start)
+    if concurrency == 1:
+        results = [send_request(endpoint, payload) for endpoint, payload in zip(endpoints, payloads)]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(send_request, endpoints, payloads))
 
+    read_times = [elapsed for endpoint, elapsed in results if endpoint == "/read"]
+    write_times = [elapsed for endpoint, elapsed in results if endpoint == "/write"]
     return read_times, write_times
 
 
@@ -302,14 +312,65 @@ def subtask_a3():
     )
 
 
+def subtask_a4():
+    """
+    Executes subtask A4 where the number of concurrent clients is varied.
+
+    The function initializes the default configuration and then, for 1 to 32
+    concurrent clients, sends reads and writes at the same time and measures
+    the throughput. The load balancer only serializes operations on the same
+    shard, so throughput should grow with the number of clients until the
+    servers or the database saturate.
+    """
+    payload = {
+        "N": 3,
+        "schema": {
+            "columns": ["stud_id", "stud_name", "stud_marks"],
+            "dtypes": ["Number", "String", "String"]
+        },
+        "shards": [
+            {"stud_id_low": 0, "shard_id": "sh1", "shard_size": 4096},
+            {"stud_id_low": 4096, "shard_id": "sh2", "shard_size": 4096},
+            {"stud_id_low": 8192, "shard_id": "sh3", "shard_size": 4096}
+        ],
+        "servers": {
+            "Server0": ["sh1", "sh2"],
+            "Server1": ["sh2", "sh3"],
+            "Server2": ["sh1", "sh3"]
+        }
+    }
+
+    response = requests.post(BASE_URL + "/init", json=payload)
+    if response.status_code != 200:
+        print("Init Error in subtask A4:", response.text)
+        return
+
+    print("A-4: Varying Number of Concurrent Clients")
+    client_counts = [1, 2, 4, 8, 16, 32]
+    throughputs = []
+    for clients in client_counts:
+        start = time.time()
+        read_times, write_times = launch_rw_requests(0, 12000, concurrency=clients, num_rw=200)
+        elapsed = time.time() - start
+        throughputs.append((len(read_times) + len(write_times)) / elapsed)
+        print(f"{clients:>3} clients: {throughputs[-1]:7.1f} requests/s, "
+              f"mean read {np.mean(read_times) * 1e3:.1f} ms, mean write {np.mean(write_times) * 1e3:.1f} ms")
+
+    print(f"Throughput gain at {client_counts[-1]} clients: {throughputs[-1] / throughputs[0]:.2f}x")
+
+    plot_line_chart(x_values=client_counts, y_values=throughputs,
+                    x_label="Concurrent Clients", y_label="Requests/s",
+                    title="Read/Write Throughput", path="A4_throughput.png")
+
+
 def main():
     """
     Main function to select and run a subtask based on user input.
     """
     try:
-        selected_subtask = int(input("Enter subtask to run [1/2/3]: "))
+        selected_subtask = int(input("Enter subtask to run [1/2/3/4]: "))
     except ValueError:
-        print("Invalid input. Please enter a number (1, 2, or 3).")
+        print("Invalid input. Please enter a number (1, 2, 3, or 4).")
         return
 
     if selected_subtask == 1:
@@ -318,8 +379,10 @@ def main():
         subtask_a2()
     elif selected_subtask == 3:
         subtask_a3()
+    elif selected_subtask == 4:
+        subtask_a4()
     else:
-        print("Invalid subtask number. Please run the script again with a valid subtask number (1, 2, or 3).")
+        print("Invalid subtask number. Please run the script again with a valid subtask number (1, 2, 3, or 4).")
 
 
 if __name__ == "__main__":
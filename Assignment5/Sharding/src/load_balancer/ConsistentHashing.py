@@ -1,7 +1,130 @@
-import hashlib
-from typing import List, Dict, Optional
+import bisect
+import itertools
+import json
+import struct
+import sys
+from array import array
+from typing import List, Dict, Iterator, Optional, Union
 import logging
-import hashlib
+from HashFunctions import HashStrategy, get_hash_function
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for find_many()
+    np = None
+
+# Owner codes are stored as unsigned 16-bit integers; 0 marks an empty slot
+MAX_SERVERS = 65535  # Maximum number of servers in one ConsistentHashMap
+SNAPSHOT_MAGIC = b'CHM1'  # Leading bytes of a ConsistentHashMap snapshot
+
+def pack_snapshot(magic: bytes, header: dict, payload: bytes = b'') -> bytes:
+    """
+    Build a snapshot: 4-byte magic, little-endian header length, JSON header, binary payload.
+    
+    Args:
+        magic: 4-byte format tag
+        header: JSON-serializable metadata
+        payload: Bulk binary data
+        
+    Returns:
+        bytes: The snapshot
+    """
+    header_bytes = json.dumps(header, separators=(',', ':')).encode()
+    return magic + struct.pack('<I', len(header_bytes)) + header_bytes + payload
+
+def unpack_snapshot(data: bytes, magic: bytes) -> tuple:
+    """
+    Split a snapshot built by pack_snapshot().
+    
+    Args:
+        data: The snapshot
+        magic: Expected 4-byte format tag
+        
+    Returns:
+        tuple: (header dict, payload bytes)
+        
+    Raises:
+        ValueError: If the data is not a snapshot of the expected format
+    """
+    data = bytes(data)
+    if data[:4] != magic:
+        raise ValueError(f"Not a {magic.decode()} snapshot")
+    (header_len,) = struct.unpack_from('<I', data, 4)
+    header = json.loads(data[8:8 + header_len])
+    return header, data[8 + header_len:]
+
+def _int_array(typecode: str, payload: bytes) -> array:
+    """
+    Decode a little-endian integer array from a snapshot payload.
+    """
+    values = array(typecode)
+    values.frombytes(payload)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+def _int_array_bytes(values: array) -> bytes:
+    """
+    Encode an integer array as little-endian bytes for a snapshot payload.
+    """
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+class _SlotView:
+    """
+    Read-only list-like view of the ring slots: each item is the owning hostname or None.
+    """
+    
+    __slots__ = ('_owners', '_hostnames')
+    
+    def __init__(self, owners: array, hostnames: List[Optional[str]]):
+        self._owners = owners
+        self._hostnames = hostnames
+    
+    def __len__(self) -> int:
+        return len(self._owners)
+    
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self._hostnames[code] for code in self._owners[idx]]
+        return self._hostnames[self._owners[idx]]
+    
+    def __iter__(self) -> Iterator[Optional[str]]:
+        hostnames = self._hostnames
+        return (hostnames[code] for code in self._owners)
+    
+    def count(self, hostname: Optional[str]) -> int:
+        if hostname is None:
+            return self._owners.count(0)
+        return sum(1 for owner in self if owner == hostname)
+
+
+class _RingVersion:
+    """
+    Immutable snapshot of the sorted ring that lookups read.
+    
+    A new version is published after every change, so readers never see a
+    half-applied add or remove and need no lock.
+    
+    The one exception is `arrays`, a cache of NumPy copies of the ring that
+    find_many() fills on first use so membership changes do not pay for it.
+    It only ever goes from None to arrays built from this version's own
+    tuples, so racing fills store equal values and every reader gets a
+    complete tuple from a single attribute read.
+    """
+    
+    __slots__ = ('positions', 'owners', 'owner_indices', 'n_servers', 'arrays')
+    
+    def __init__(self, positions: tuple, owners: tuple, owner_indices: tuple, n_servers: int):
+        self.positions = positions
+        self.owners = owners
+        self.owner_indices = owner_indices
+        self.n_servers = n_servers
+        # NumPy copies for find_many(), filled on first use (see above)
+        self.arrays = None
+
 
 class ConsistentHashMap:
     """
@@ -14,9 +137,28 @@ class ConsistentHashMap:
         n_slots (int): Number of slots in the hash ring
         n_virtual (int): Number of virtual nodes per server
         probing (str): Method for handling collisions ('linear' or 'quadratic')
+        hash_function (str): Name of the hash strategy in HashFunctions.HASH_FUNCTIONS
+    
+    Slots are stored as an array('H') of owner codes (server index + 1, 0 for
+    empty) next to a table of hostnames, so a ring costs 2 bytes per slot.
+    
+    Writers update the slots and sorted ring in place and then publish an
+    immutable _RingVersion; find(), walk() and find_many() only read the
+    published version, so they are safe to call while another thread or
+    coroutine changes membership.
     """
     
-    def __init__(self,hostnames: Optional[List[str]] = None,n_slots: int = 512,n_virtual: int = 9,probing: str = 'linear'):
+    __slots__ = (
+        'hash_function', 'requestHash', 'serverHash', 'requestHashMany',
+        'servers', 'server_slots', 'weights', 'n_slots', '_owners', '_hostnames',
+        '_ring_positions', '_ring_owners', '_version', '_free_slots', '_arc_lengths',
+        'probing', 'n_virtual',
+    )
+    
+    # Shared by all instances
+    logger = logging.getLogger(__name__)
+    
+    def __init__(self,hostnames: Optional[List[str]] = None,n_slots: int = 512,n_virtual: int = 9,probing: str = 'linear',hash_function: str = 'polynomial'):
         """
         Initialize the consistent hash map.
         
@@ -25,6 +167,7 @@ class ConsistentHashMap:
             n_slots: Number of slots in the hash ring
             n_virtual: Number of virtual nodes per server
             probing: Method for handling collisions ('linear' or 'quadratic')
+            hash_function: Hash strategy name ('polynomial', 'md5', 'xxhash', 'fnv1a', 'murmur3' or 'siphash')
             
         Raises:
             ValueError: If invalid parameters are provided
@@ -36,25 +179,15 @@ class ConsistentHashMap:
             raise ValueError("Number of virtual nodes must be positive")
         if probing.lower() not in ['linear', 'quadratic']:
             raise ValueError("Probing must be either 'linear' or 'quadratic'")
-            
-        # Given Hash Functions
-        def requestHash(i):
-            return i**2 + 2*i + 17 # H(i) = i^2 + 2*i + 17
-
-        def serverHash(i, j):
-            return i**2 + j**2 + 2*j + 25 # Φ(i, j) = i^2 + j^2 + 2*j + 25
-
-
-        # MD5-Based Hash Functions
-        def MD5requestHash(i):
-            return int(hashlib.md5(str(i).encode()).hexdigest(),16)
-
-        def MD5serverHash(i, j):
-            return int(hashlib.md5(f"{i}-{j}".encode()).hexdigest(),16)
+        
+        # Look up the hash functions (raises ValueError for unknown names)
+        strategy: HashStrategy = get_hash_function(hash_function)
         
         # Assign the hash functions
-        self.requestHash = requestHash
-        self.serverHash = serverHash
+        self.hash_function = strategy.name
+        self.requestHash = strategy.request_hash
+        self.serverHash = strategy.server_hash
+        self.requestHashMany = strategy.request_hash_many
         
         # Map: server-hostname -> server-index
         self.servers: Dict[str, int] = {}
@@ -62,17 +195,29 @@ class ConsistentHashMap:
         # Map: server-hostname -> list of slot indices for faster removal
         self.server_slots: Dict[str, List[int]] = {}
         
-        # Slots array
-        self.slots: List[Optional[str]] = [None] * n_slots
+        # Map: server-hostname -> weight (virtual nodes = n_virtual x weight)
+        self.weights: Dict[str, float] = {}
+        
+        # Slots array: owner code per slot, and hostname per owner code (code 0 = empty)
         self.n_slots = n_slots
+        self._owners = array('H', bytes(2 * n_slots))
+        self._hostnames: List[Optional[str]] = [None]
+        
+        # Sorted positions of occupied slots and their owners, used by find()
+        self._ring_positions: List[int] = []
+        self._ring_owners: List[str] = []
+        
+        # Published read-only copy of the ring used by lookups
+        self._version = _RingVersion((), (), (), 0)
+        
+        # Live counters: empty slots, and slots of key space owned per server
+        self._free_slots = n_slots
+        self._arc_lengths: Dict[str, int] = {}
         
         # Configuration
         self.probing = probing.lower()
         self.n_virtual = n_virtual
         
-        # Set up logging
-        self.logger = logging.getLogger(__name__)
-        
         if hostnames is None:
             hostnames = []
         
@@ -83,6 +228,13 @@ class ConsistentHashMap:
             except (IndexError, KeyError) as e:
                 self.logger.warning(f"Failed to add server {hostname}: {e}")
     
+    @property
+    def slots(self) -> _SlotView:
+        """
+        The ring slots as a read-only sequence of hostnames (None for empty slots).
+        """
+        return _SlotView(self._owners, self._hostnames)
+    
     def getServerList(self) -> List[str]:
         """
         Return a list of all server hostnames.
@@ -99,7 +251,7 @@ class ConsistentHashMap:
         Returns:
             int: Number of additional servers that can be added
         """
-        return self.slots.count(None) // self.n_virtual
+        return min(self._free_slots // self.n_virtual, MAX_SERVERS - len(self.servers))
     
     def __len__(self) -> int:
         """
@@ -158,7 +310,7 @@ class ConsistentHashMap:
         max_probes = min(self.n_slots, 1000)  # Limit probing to avoid infinite loops
         probes = 0
         
-        while self.slots[idx] is not None:
+        while self._owners[idx]:
             idx = self.probe(initial_hash, i) % self.n_slots
             i += 1
             probes += 1
@@ -168,20 +320,60 @@ class ConsistentHashMap:
             
         return idx
     
-    def add(self, hostname: str) -> None:
+    def _virtual_count(self, weight: float) -> int:
+        """
+        Number of virtual nodes for a server of the given weight.
+        
+        Args:
+            weight: The server's weight (1.0 = n_virtual virtual nodes)
+            
+        Returns:
+            int: The number of virtual nodes, at least 1
+            
+        Raises:
+            ValueError: If the weight is not positive
+        """
+        if weight <= 0:
+            raise ValueError("Server weight must be positive")
+        return max(1, round(self.n_virtual * weight))
+    
+    def _add_virtual_nodes(self, hostname: str, count: int) -> None:
+        """
+        Place `count` more virtual nodes for a server, continuing its virtual node numbering.
+        
+        Args:
+            hostname: The hostname of the server
+            count: Number of virtual nodes to add
+        """
+        server_idx = self.servers[hostname]
+        first = len(self.server_slots[hostname])
+        for virtual_idx in range(first, first + count):
+            server_hash = self.serverHash(server_idx + 1, virtual_idx + 1)
+            slot_idx = self._find_empty_slot(server_hash)
+            self._owners[slot_idx] = server_idx + 1
+            self.server_slots[hostname].append(slot_idx)
+            self._ring_insert(slot_idx, hostname)
+    
+    def add(self, hostname: str, weight: float = 1.0) -> None:
         """
         Add a server to the hash map.
         
         Args:
             hostname: The hostname of the server to add
+            weight: Relative capacity of the server; it gets round(n_virtual x weight) virtual nodes
             
         Raises:
             IndexError: If there are insufficient slots to add the server
             KeyError: If the hostname already exists
+            ValueError: If the weight is not positive
         """
+        n_virtual = self._virtual_count(weight)
+        
         # Check if there are enough empty slots
-        if self.slots.count(None) < self.n_virtual:
-            raise IndexError(f"Insufficient slots to add new server {hostname}. Need {self.n_virtual} empty slots.")
+        if self._free_slots < n_virtual:
+            raise IndexError(f"Insufficient slots to add new server {hostname}. Need {n_virtual} empty slots.")
+        if len(self.servers) >= MAX_SERVERS:
+            raise IndexError(f"Cannot add server {hostname}. At most {MAX_SERVERS} servers are supported.")
         
         # Check if the hostname already exists
 
@@ -192,14 +384,52 @@ class ConsistentHashMap:
         # Assign a server index
         server_idx = self._get_next_server_idx()
         self.servers[hostname] = server_idx
+        if server_idx + 1 == len(self._hostnames):
+            self._hostnames.append(hostname)
+        else:
+            self._hostnames[server_idx + 1] = hostname
         self.server_slots[hostname] = []
+        self.weights[hostname] = weight
+        self._arc_lengths[hostname] = 0
         
         # Add virtual nodes to the slots
-        for virtual_idx in range(self.n_virtual):
-            server_hash = self.serverHash(server_idx + 1, virtual_idx + 1)
-            slot_idx = self._find_empty_slot(server_hash)
-            self.slots[slot_idx] = hostname
-            self.server_slots[hostname].append(slot_idx)
+        self._add_virtual_nodes(hostname, n_virtual)
+        self._publish()
+    
+    def set_weight(self, hostname: str, weight: float) -> None:
+        """
+        Change a server's weight in place.
+        
+        Only the server's own virtual nodes are added or removed (highest
+        numbered first), so no other server's slots move.
+        
+        Args:
+            hostname: The hostname of the server
+            weight: The new weight
+            
+        Raises:
+            IndexError: If there are insufficient slots for the extra virtual nodes
+            KeyError: If the hostname is not found
+            ValueError: If the weight is not positive
+        """
+        if hostname not in self.servers:
+            raise KeyError(f"Hostname '{hostname}' not found in the hash map")
+        
+        n_virtual = self._virtual_count(weight)
+        current = len(self.server_slots[hostname])
+        
+        if n_virtual > current:
+            if self._free_slots < n_virtual - current:
+                raise IndexError(f"Insufficient slots to grow server {hostname}. Need {n_virtual - current} empty slots.")
+            self._add_virtual_nodes(hostname, n_virtual - current)
+        else:
+            for _ in range(current - n_virtual):
+                slot_idx = self.server_slots[hostname].pop()
+                self._owners[slot_idx] = 0
+                self._ring_delete(slot_idx)
+        
+        self.weights[hostname] = weight
+        self._publish()
     
     def remove(self, hostname: str) -> None:
         """
@@ -219,12 +449,79 @@ class ConsistentHashMap:
         
         # Remove the server from the dictionaries
         self.servers.pop(hostname)
+        self._hostnames[server_idx + 1] = None
         
         # Remove all virtual nodes from the slots using the stored slot indices
         for slot_idx in self.server_slots[hostname]:
-            self.slots[slot_idx] = None
+            self._owners[slot_idx] = 0
+            self._ring_delete(slot_idx)
             
         self.server_slots.pop(hostname)
+        self.weights.pop(hostname)
+        self._arc_lengths.pop(hostname)
+        self._publish()
+    
+    def _ring_insert(self, slot_idx: int, hostname: str) -> None:
+        """
+        Record an occupied slot in the sorted ring arrays.
+        
+        The new slot takes over the arc between its predecessor and itself
+        from the owner of the next slot clockwise.
+        
+        Args:
+            slot_idx: The slot that was just occupied
+            hostname: The hostname owning the slot
+        """
+        pos = bisect.bisect_left(self._ring_positions, slot_idx)
+        if self._ring_positions:
+            prev_slot = self._ring_positions[pos - 1]
+            next_owner = self._ring_owners[pos % len(self._ring_owners)]
+            arc = (slot_idx - prev_slot) % self.n_slots
+            self._arc_lengths[next_owner] -= arc
+            self._arc_lengths[hostname] += arc
+        else:
+            self._arc_lengths[hostname] += self.n_slots
+        self._free_slots -= 1
+        self._ring_positions.insert(pos, slot_idx)
+        self._ring_owners.insert(pos, hostname)
+    
+    def _ring_delete(self, slot_idx: int) -> None:
+        """
+        Drop a freed slot from the sorted ring arrays.
+        
+        The arc owned by the slot is handed to the next slot clockwise.
+        
+        Args:
+            slot_idx: The slot that was just freed
+        """
+        pos = bisect.bisect_left(self._ring_positions, slot_idx)
+        owner = self._ring_owners[pos]
+        if len(self._ring_positions) > 1:
+            prev_slot = self._ring_positions[pos - 1]
+            next_owner = self._ring_owners[(pos + 1) % len(self._ring_owners)]
+            arc = (slot_idx - prev_slot) % self.n_slots
+            self._arc_lengths[owner] -= arc
+            self._arc_lengths[next_owner] += arc
+        else:
+            self._arc_lengths[owner] -= self.n_slots
+        self._free_slots += 1
+        del self._ring_positions[pos]
+        del self._ring_owners[pos]
+    
+    def _publish(self) -> None:
+        """
+        Publish the current ring as a new immutable version for lookups.
+        
+        The version is built completely before the single reference
+        assignment that makes it visible.
+        """
+        owners = tuple(self._ring_owners)
+        self._version = _RingVersion(
+            tuple(self._ring_positions),
+            owners,
+            tuple(self.servers[owner] for owner in owners),
+            len(self.servers),
+        )
     
     def find(self, request_id: int) -> str:
         """
@@ -239,21 +536,107 @@ class ConsistentHashMap:
         Raises:
             KeyError: If no servers are available
         """
-        if not self.servers:
+        version = self._version
+        if not version.positions:
             raise KeyError("No servers available to handle the request")
         
         request_hash = self.requestHash(request_id) % self.n_slots
         
-        # Find the next available server slot
-        original_hash = request_hash
-        while self.slots[request_hash] is None:
-            request_hash = (request_hash + 1) % self.n_slots
+        # First occupied slot at or after the request hash, wrapping around the ring
+        pos = bisect.bisect_left(version.positions, request_hash)
+        if pos == len(version.positions):
+            pos = 0
             
-            # If we've gone all the way around the ring, raise an error
-            if request_hash == original_hash:
-                raise KeyError("No servers available in the hash ring")
+        return version.owners[pos]
+    
+    def walk(self, request_id: int) -> Iterator[str]:
+        """
+        Yield the distinct servers clockwise from a request's position.
+        
+        The first server yielded is find(request_id); the rest are the
+        fallbacks in ring order.
+        
+        Args:
+            request_id: The ID of the request
             
-        return self.slots[request_hash]
+        Yields:
+            str: Server hostnames, each at most once
+        """
+        version = self._version
+        if not version.positions:
+            return
+        
+        request_hash = self.requestHash(request_id) % self.n_slots
+        start = bisect.bisect_left(version.positions, request_hash)
+        n_positions = len(version.positions)
+        
+        seen = set()
+        for offset in range(n_positions):
+            owner = version.owners[(start + offset) % n_positions]
+            if owner not in seen:
+                seen.add(owner)
+                yield owner
+                if len(seen) == version.n_servers:
+                    return
+    
+    def find_n(self, request_id: int, n: int) -> List[str]:
+        """
+        Find the first n distinct servers clockwise from a request's position.
+        
+        Used as a replica set: the first entry is find(request_id) and the
+        rest are the next distinct physical servers on the ring.
+        
+        Args:
+            request_id: The ID of the request (or any integer key)
+            n: Number of servers wanted
+            
+        Returns:
+            List[str]: Up to n hostnames, fewer if the ring has fewer servers
+        """
+        return list(itertools.islice(self.walk(request_id), n))
+    
+    def find_many(self, request_ids, as_index: bool = False):
+        """
+        Find the servers for a whole batch of requests at once.
+        
+        Hashes all request IDs with NumPy and resolves their owners with a
+        single searchsorted over the occupied slots. Gives the same result as
+        calling find() on each ID. The polynomial and MD5 request hashes are
+        vectorized; the other hash functions hash the batch one ID at a time.
+        
+        Args:
+            request_ids: Array-like of integer request IDs
+            as_index: Return server indices instead of hostnames
+            
+        Returns:
+            numpy.ndarray: The hostname (or server index) for each request
+            
+        Raises:
+            ImportError: If NumPy is not installed
+            KeyError: If no servers are available
+        """
+        if np is None:
+            raise ImportError("find_many requires numpy")
+        version = self._version
+        if not version.positions:
+            raise KeyError("No servers available to handle the request")
+        
+        arrays = version.arrays
+        if arrays is None:
+            arrays = version.arrays = (
+                np.array(version.positions, dtype=np.int64),
+                np.array(version.owners, dtype=object),
+                np.array(version.owner_indices, dtype=np.int64),
+            )
+        positions, owners, owner_indices = arrays
+        
+        request_hashes = self.requestHashMany(np.asarray(request_ids, dtype=np.int64), self.n_slots)
+        
+        # First occupied slot at or after each hash, wrapping around the ring
+        pos = np.searchsorted(positions, request_hashes, side='left')
+        pos[pos == len(positions)] = 0
+        
+        return owner_indices[pos] if as_index else owners[pos]
     
     def get_distribution(self) -> Dict[str, int]:
         """
@@ -262,25 +645,188 @@ class ConsistentHashMap:
         Returns:
             Dict[str, int]: A dictionary mapping server hostnames to slot counts
         """
-        distribution = {}
+        return {hostname: len(self.server_slots[hostname]) for hostname in self.servers}
+    
+    def ownership_fraction(self) -> Dict[str, float]:
+        """
+        Get the share of the key space owned by each server.
+        
+        A slot owns every request hash between the previous occupied slot
+        (exclusive) and itself (inclusive), so this reflects where virtual
+        nodes landed rather than just how many there are.
+        
+        Returns:
+            Dict[str, float]: A dictionary mapping server hostnames to the fraction of slots they serve
+        """
+        return {hostname: self._arc_lengths[hostname] / self.n_slots for hostname in self.servers}
+    
+    @staticmethod
+    def _owner_at(positions: List[int], owners: List[str], hash_value: int) -> Optional[str]:
+        """
+        Owner of a hash position in a sorted ring snapshot.
+        
+        Args:
+            positions: Sorted occupied slots
+            owners: Owner of each slot in positions
+            hash_value: Position on the ring
+            
+        Returns:
+            Optional[str]: The owning hostname, or None for an empty ring
+        """
+        if not positions:
+            return None
+        return owners[bisect.bisect_left(positions, hash_value) % len(positions)]
+    
+    def migration_plan(self, old_positions: List[int], old_owners: List[str]) -> List[Dict[str, Union[int, str, None]]]:
+        """
+        List the key ranges whose owner differs between a ring snapshot and the current ring.
+        
+        Args:
+            old_positions: Sorted occupied slots of the snapshot
+            old_owners: Owner of each slot in old_positions
+            
+        Returns:
+            List[Dict]: Entries {'start', 'end', 'old', 'new'}, where start and end are
+                inclusive request hash positions (request hash mod n_slots) and ranges
+                never wrap around the ring
+        """
+        boundaries = sorted(set(old_positions) | set(self._ring_positions))
+        if not boundaries:
+            return []
+        
+        # Each boundary b closes the range (previous boundary, b]; the first one wraps
+        segments = []
+        if boundaries[-1] < self.n_slots - 1:
+            segments.append((boundaries[-1] + 1, self.n_slots - 1, boundaries[0]))
+        segments.append((0, boundaries[0], boundaries[0]))
+        for prev, boundary in zip(boundaries, boundaries[1:]):
+            segments.append((prev + 1, boundary, boundary))
+        segments.sort()
+        
+        plan = []
+        for start, end, boundary in segments:
+            old = self._owner_at(old_positions, old_owners, boundary)
+            new = self._owner_at(self._ring_positions, self._ring_owners, boundary)
+            if old == new:
+                continue
+            if plan and plan[-1]['end'] + 1 == start and plan[-1]['old'] == old and plan[-1]['new'] == new:
+                plan[-1]['end'] = end
+            else:
+                plan.append({'start': start, 'end': end, 'old': old, 'new': new})
+        return plan
+    
+    def to_bytes(self) -> bytes:
+        """
+        Serialize the hash map.
+        
+        The snapshot holds the configuration, each server's index and weight,
+        and the slot of every virtual node, so from_bytes() restores the exact
+        placement without probing.
+        
+        Returns:
+            bytes: The snapshot
+        """
+        header = {
+            'n_slots': self.n_slots,
+            'n_virtual': self.n_virtual,
+            'probing': self.probing,
+            'hash_function': self.hash_function,
+            # [hostname, server index, weight, number of virtual nodes]
+            'servers': [[hostname, server_idx, self.weights[hostname], len(self.server_slots[hostname])]
+                        for hostname, server_idx in self.servers.items()],
+        }
+        slots = array('I')
         for hostname in self.servers:
-            distribution[hostname] = self.slots.count(hostname)
-        return distribution
+            slots.extend(self.server_slots[hostname])
+        return pack_snapshot(SNAPSHOT_MAGIC, header, _int_array_bytes(slots))
     
-    def rebalance(self) -> None:
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'ConsistentHashMap':
         """
-        Rebalance the hash map by redistributing virtual nodes.
+        Restore a hash map from a snapshot made by to_bytes().
         
-        This is useful after adding or removing servers to ensure a more even distribution.
+        Args:
+            data: The snapshot
+            
+        Returns:
+            ConsistentHashMap: The restored hash map
+            
+        Raises:
+            ValueError: If the data is not a ConsistentHashMap snapshot
         """
-        # Save the current servers
-        current_servers = list(self.servers.keys())
+        header, payload = unpack_snapshot(data, SNAPSHOT_MAGIC)
+        hash_map = cls(
+            hostnames=[],
+            n_slots=header['n_slots'],
+            n_virtual=header['n_virtual'],
+            probing=header['probing'],
+            hash_function=header['hash_function'],
+        )
+        slots = _int_array('I', payload)
         
-        # Clear the hash map
-        self.slots = [None] * self.n_slots
-        self.servers = {}
-        self.server_slots = {}
+        offset = 0
+        for hostname, server_idx, weight, count in header['servers']:
+            hash_map.servers[hostname] = server_idx
+            hash_map.weights[hostname] = weight
+            hash_map.server_slots[hostname] = slots[offset:offset + count].tolist()
+            offset += count
+            while len(hash_map._hostnames) <= server_idx + 1:
+                hash_map._hostnames.append(None)
+            hash_map._hostnames[server_idx + 1] = hostname
+            for slot_idx in hash_map.server_slots[hostname]:
+                hash_map._owners[slot_idx] = server_idx + 1
+        
+        # Rebuild the sorted ring and counters in one pass
+        positions = sorted(slots)
+        owners = [hash_map._hostnames[hash_map._owners[slot_idx]] for slot_idx in positions]
+        hash_map._ring_positions = positions
+        hash_map._ring_owners = owners
+        hash_map._free_slots = hash_map.n_slots - len(positions)
+        hash_map._arc_lengths = dict.fromkeys(hash_map.servers, 0)
+        for pos, (slot_idx, hostname) in enumerate(zip(positions, owners)):
+            hash_map._arc_lengths[hostname] += (slot_idx - positions[pos - 1]) % hash_map.n_slots or hash_map.n_slots
+        hash_map._publish()
+        return hash_map
+    
+    def rebalance(self) -> List[Dict[str, Union[int, str, None]]]:
+        """
+        Re-place virtual nodes that were displaced from their home slot.
+        
+        Server indexes are kept. Virtual nodes sitting at their home slot
+        (server hash mod n_slots) stay put; only the ones that were probed
+        elsewhere, typically because the home slot was taken by a server
+        that has since left, are probed again in server index order.
+        
+        Returns:
+            List[Dict]: The migration plan, see migration_plan()
+        """
+        old_positions = list(self._ring_positions)
+        old_owners = list(self._ring_owners)
+        
+        # Clear the ring but keep servers, indexes and weights
+        self._owners = array('H', bytes(2 * self.n_slots))
+        self._ring_positions = []
+        self._ring_owners = []
+        self._free_slots = self.n_slots
+        self._arc_lengths = dict.fromkeys(self.servers, 0)
+        
+        # Pin virtual nodes that are already at their home slot
+        displaced = []
+        for hostname, server_idx in sorted(self.servers.items(), key=lambda item: item[1]):
+            for virtual_idx, slot_idx in enumerate(self.server_slots[hostname]):
+                server_hash = self.serverHash(server_idx + 1, virtual_idx + 1)
+                if slot_idx == server_hash % self.n_slots:
+                    self._owners[slot_idx] = server_idx + 1
+                    self._ring_insert(slot_idx, hostname)
+                else:
+                    displaced.append((hostname, virtual_idx, server_hash))
+        
+        # Probe again for the rest
+        for hostname, virtual_idx, server_hash in displaced:
+            slot_idx = self._find_empty_slot(server_hash)
+            self._owners[slot_idx] = self.servers[hostname] + 1
+            self.server_slots[hostname][virtual_idx] = slot_idx
+            self._ring_insert(slot_idx, hostname)
         
-        # Re-add all servers
-        for hostname in current_servers:
-            self.add(hostname)
\ No newline at end of file
+        self._publish()
+        return self.migration_plan(old_positions, old_owners)
@@ -0,0 +1,222 @@
+import asyncio
+import time
+from typing import Callable, List, Optional, Tuple
+
+from aiodocker import Docker, DockerError
+
+
+class ContainerPool:
+    """
+    Shared Docker client for server containers, with an optional warm pool.
+
+    One aiodocker client and one handle to the load balancer's network are
+    kept for the lifetime of the app instead of being opened per operation.
+
+    With warm_size > 0, that many containers are created and started ahead
+    of time under placeholder names (warm-<id>) and without a server alias,
+    so nothing routes to them. spawn() hands one out by renaming it and
+    re-attaching it to the network under the requested hostname; the app
+    inside has already booted, so scale-out and respawns only wait for those
+    Docker calls. The pool is refilled in the background.
+    """
+
+    def __init__(self,
+                 image: str,
+                 env: Callable[[int], List[str]],
+                 next_id: Callable[[], int],
+                 network: str = 'LB',
+                 warm_size: int = 0,
+                 concurrency: int = 10,
+                 stop_timeout: int = 5,
+                 on_operation: Optional[Callable[[str, float], None]] = None):
+        """
+        Initialize the pool; call open() from the app's startup hook.
+
+        Args:
+            image: Image of the server containers
+            env: Builds a container's environment from its server ID
+            next_id: Returns a new server ID for every container created
+            network: Docker network the load balancer reaches servers on
+            warm_size: Number of pre-started containers to keep (0 = no warm pool)
+            concurrency: Maximum concurrent Docker operations
+            stop_timeout: Seconds given to a container to stop before it is killed
+            on_operation: Optional hook called with the operation ('create',
+                'prestart', 'claim' or 'remove') and its duration in seconds
+        """
+        self.image = image
+        self.env = env
+        self.next_id = next_id
+        self.network_name = network
+        self.warm_size = warm_size
+        self.stop_timeout = stop_timeout
+        self.on_operation = on_operation
+
+        self.docker: Optional[Docker] = None
+        self._network = None  # Cached network handle
+        self._warm: List[Tuple[object, int]] = []  # (container, server ID) ready to hand out
+        self._creating = 0  # Warm containers being created
+        self._refill_task: Optional[asyncio.Task] = None
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def open(self):
+        """Open the Docker client and start filling the warm pool."""
+        self.docker = Docker()
+        self._schedule_refill()
+
+    async def close(self):
+        """Remove the warm containers and close the Docker client."""
+        if self.docker is None:
+            return
+        if self._refill_task is not None:
+            self._refill_task.cancel()
+        warm, self._warm = self._warm, []
+        await asyncio.gather(*[container.delete(force=True) for container, _ in warm], return_exceptions=True)
+        await self.docker.close()
+
+    def address(self, hostname: str) -> str:
+        """Get the host:port a server is reached on: its network alias and the server port."""
+        return f'{hostname}:5000'
+
+    async def network(self):
+        """Get the (cached) handle of the load balancer's network."""
+        if self._network is None:
+            self._network = await self.docker.networks.get(self.network_name)
+        return self._network
+
+    async def _timed(self, operation: str, awaitable):
+        """Await a Docker operation and report its duration to on_operation."""
+        start = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            if self.on_operation is not None:
+                self.on_operation(operation, time.perf_counter() - start)
+
+    async def _create(self, name: str, serv_id: int, aliases: List[str]):
+        """Create, attach and start a container."""
+        container = await self.docker.containers.create_or_replace(
+            name=name,
+            config={
+                'image': self.image,
+                'detach': True,
+                'env': self.env(serv_id),
+                'hostname': name,
+                'tty': True,
+            },
+        )
+        network = await self.network()
+        await network.connect({'Container': container.id, 'EndpointConfig': {'Aliases': aliases}})
+        await container.start()
+        return container
+
+    async def _delete_named(self, name: str):
+        """Force-remove the container with this name, if there is one."""
+        try:
+            container = await self.docker.containers.get(name)
+            await container.delete(force=True)
+        except DockerError as e:
+            if e.status != 404:
+                raise
+
+    async def _claim(self, container, hostname: str):
+        """
+        Give a warm container the name and network alias of a server.
+
+        Its environment and container hostname stay those it was started
+        with (warm-<id>), so a server that reports its own name must be told
+        the new one, e.g. in the payload of its first request.
+        """
+        # A failed server's container may still hold the name
+        await self._delete_named(hostname)
+        await container.rename(hostname)
+        network = await self.network()
+        await network.disconnect({'Container': container.id})
+        await network.connect({'Container': container.id, 'EndpointConfig': {'Aliases': [hostname]}})
+
+    async def spawn(self, hostname: str) -> Tuple[int, bool]:
+        """
+        Bring up a container reachable as `hostname`.
+
+        Args:
+            hostname: Server hostname (container name and network alias)
+
+        Returns:
+            Tuple[int, bool]: The server ID the container runs with, and
+            whether it came from the warm pool
+        """
+        async with self._semaphore:
+            while self._warm:
+                container, serv_id = self._warm.pop()
+                self._schedule_refill()
+                try:
+                    await self._timed('claim', self._claim(container, hostname))
+                    return serv_id, True
+                except DockerError:
+                    # Broken warm container: drop it and try the next one
+                    await asyncio.gather(container.delete(force=True), return_exceptions=True)
+
+            serv_id = self.next_id()
+            await self._timed('create', self._create(hostname, serv_id, [hostname]))
+            return serv_id, False
+
+    async def remove(self, hostname: str):
+        """
+        Stop and remove a server's container.
+
+        Args:
+            hostname: Server hostname (container name)
+        """
+        async with self._semaphore:
+            await self._timed('remove', self._remove(hostname))
+
+    async def _remove(self, hostname: str):
+        """Stop and remove the container with this name."""
+        container = await self.docker.containers.get(hostname)
+        await container.stop(timeout=self.stop_timeout)
+        await container.delete(force=True)
+
+    def resize(self, warm_size: int):
+        """
+        Change the number of pre-started containers to keep.
+
+        A larger pool is filled in the background; surplus warm containers
+        of a smaller one stay until they are claimed or the pool is closed.
+
+        Args:
+            warm_size: Number of pre-started containers to keep (0 = no warm pool)
+        """
+        self.warm_size = warm_size
+        self._schedule_refill()
+
+    def _schedule_refill(self):
+        """Start a background refill unless one is running or the pool is disabled."""
+        if self.warm_size > 0 and (self._refill_task is None or self._refill_task.done()):
+            self._refill_task = asyncio.create_task(self._refill())
+
+    async def _refill(self):
+        """Create warm containers until the pool is full."""
+        async def create_one():
+            serv_id = self.next_id()
+            try:
+                async with self._semaphore:
+                    name = f'warm-{serv_id}'
+                    container = await self._timed('prestart', self._create(name, serv_id, [name]))
+                self._warm.append((container, serv_id))
+            finally:
+                self._creating -= 1
+
+        while len(self._warm) + self._creating < self.warm_size:
+            missing = self.warm_size - len(self._warm) - self._creating
+            self._creating += missing
+            results = await asyncio.gather(*[create_one() for _ in range(missing)], return_exceptions=True)
+            if all(isinstance(r, BaseException) for r in results):
+                break  # Docker is failing; try again on the next spawn
+
+    def stats(self) -> dict:
+        """
+        Get the warm pool's size and fill level.
+
+        Returns:
+            dict: Target size, containers ready and containers being created
+        """
+        return {'size': self.warm_size, 'ready': len(self._warm), 'creating': self._creating}
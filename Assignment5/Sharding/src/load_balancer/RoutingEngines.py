@@ -0,0 +1,633 @@
+import itertools
+import logging
+import math
+from abc import ABC, abstractmethod
+from array import array
+from typing import Dict, Iterator, List, Optional
+
+from ConsistentHashing import SNAPSHOT_MAGIC, ConsistentHashMap, _int_array, _int_array_bytes, pack_snapshot, unpack_snapshot
+from HashFunctions import MASK64, fnv1a64, get_hash_function, murmur3_32
+
+
+ENGINE_SNAPSHOT_MAGIC = b'RTE1'  # Leading bytes of a RoutingEngine snapshot
+
+
+def mix64(x: int) -> int:
+    """
+    SplitMix64 finalizer, used to spread request hashes over 64 bits.
+
+    The polynomial request hash is far from uniform, so every engine mixes
+    it before use.
+
+    Args:
+        x: Value to mix (truncated to 64 bits)
+
+    Returns:
+        int: Mixed 64-bit value
+    """
+    x = (x + 0x9E3779B97F4A7C15) & MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK64
+    return x ^ (x >> 31)
+
+
+def jump_hash(key: int, num_buckets: int) -> int:
+    """
+    Jump consistent hash (Lamping & Veach).
+
+    Args:
+        key: 64-bit key
+        num_buckets: Number of buckets
+
+    Returns:
+        int: Bucket index in [0, num_buckets)
+    """
+    b, j = -1, 0
+    while j < num_buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & MASK64
+        j = int((b + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return b
+
+
+def is_prime(n: int) -> bool:
+    """
+    Trial-division primality test, fast enough for lookup table sizes.
+
+    Args:
+        n: Number to test
+
+    Returns:
+        bool: True if n is prime
+    """
+    if n < 2:
+        return False
+    return all(n % d for d in range(2, math.isqrt(n) + 1))
+
+
+class RoutingEngine(ABC):
+    """
+    Base class for slot-free routing engines.
+
+    Engines expose the same add/remove/find/getServerList API as
+    ConsistentHashMap, but place servers by hostname instead of probing a
+    fixed number of slots, so there is no ceiling on cluster size.
+
+    Membership changes go through _changed(), which publishes immutable
+    lookup structures in single reference assignments; find() and walk()
+    only read those, so they need no lock.
+
+    Attributes:
+        name (str): Engine name used by create_hash_map()
+        hash_function (str): Name of the request hash strategy
+    """
+
+    name = ''
+
+    def __init__(self, hostnames: Optional[List[str]] = None, hash_function: str = 'polynomial'):
+        """
+        Initialize the engine.
+
+        Args:
+            hostnames: List of server hostnames to add initially
+            hash_function: Request hash strategy name (see HashFunctions.HASH_FUNCTIONS)
+
+        Raises:
+            ValueError: If invalid parameters are provided
+        """
+        strategy = get_hash_function(hash_function)
+        self.hash_function = strategy.name
+        self.requestHash = strategy.request_hash
+
+        # Server hostnames in insertion order
+        self._hosts: List[str] = []
+        # Published copy of _hosts read by lookups
+        self._members: tuple = ()
+        # Map: server-hostname -> weight
+        self.weights: Dict[str, float] = {}
+
+        self.logger = logging.getLogger(__name__)
+
+        # Defer _changed() until all initial servers are added
+        self._loading = True
+        for hostname in hostnames or []:
+            try:
+                self.add(hostname)
+            except (IndexError, KeyError) as e:
+                self.logger.warning(f"Failed to add server {hostname}: {e}")
+        self._loading = False
+        self._changed()
+
+    def getServerList(self) -> List[str]:
+        """
+        Return a list of all server hostnames.
+
+        Returns:
+            List[str]: List of server hostnames
+        """
+        return list(self._hosts)
+
+    def remaining(self) -> int:
+        """
+        Return the maximum number of additional servers that can be added.
+
+        Returns:
+            int: Number of additional servers that can be added
+        """
+        return 2**31 - 1 - len(self._hosts)
+
+    def __len__(self) -> int:
+        """
+        Return the number of servers.
+
+        Returns:
+            int: Number of servers
+        """
+        return len(self._hosts)
+
+    def _key(self, request_id: int) -> int:
+        """
+        Map a request ID to a well-mixed 64-bit key.
+        """
+        return mix64(self.requestHash(request_id) & MASK64)
+
+    def _changed(self) -> None:
+        """
+        Hook run after membership changes; publishes the lookup structures.
+        """
+        self._members = tuple(self._hosts)
+
+    def _check_weight(self, weight: float) -> None:
+        """
+        Validate a server weight.
+
+        Raises:
+            ValueError: If the weight is not positive
+        """
+        if weight <= 0:
+            raise ValueError("Server weight must be positive")
+
+    def add(self, hostname: str, weight: float = 1.0) -> None:
+        """
+        Add a server.
+
+        Args:
+            hostname: The hostname of the server to add
+            weight: Relative capacity of the server
+
+        Raises:
+            KeyError: If the hostname already exists
+            ValueError: If the weight is not positive
+        """
+        if hostname in self._hosts:
+            raise KeyError(f"Hostname '{hostname}' already present in the hash map")
+        self._check_weight(weight)
+        self._hosts.append(hostname)
+        self.weights[hostname] = weight
+        if not self._loading:
+            self._changed()
+
+    def set_weight(self, hostname: str, weight: float) -> None:
+        """
+        Change a server's weight.
+
+        Args:
+            hostname: The hostname of the server
+            weight: The new weight
+
+        Raises:
+            KeyError: If the hostname is not found
+            ValueError: If the weight is not positive
+        """
+        if hostname not in self._hosts:
+            raise KeyError(f"Hostname '{hostname}' not found in the hash map")
+        self._check_weight(weight)
+        self.weights[hostname] = weight
+        if not self._loading:
+            self._changed()
+
+    def remove(self, hostname: str) -> None:
+        """
+        Remove a server.
+
+        Args:
+            hostname: The hostname of the server to remove
+
+        Raises:
+            KeyError: If the hostname is not found
+        """
+        if hostname not in self._hosts:
+            raise KeyError(f"Hostname '{hostname}' not found in the hash map")
+        self._hosts.remove(hostname)
+        self.weights.pop(hostname)
+        if not self._loading:
+            self._changed()
+
+    @abstractmethod
+    def find(self, request_id: int) -> str:
+        """
+        Find the server to which a request should be routed.
+
+        Args:
+            request_id: The ID of the request
+
+        Returns:
+            str: The hostname of the server to route the request to
+
+        Raises:
+            KeyError: If no servers are available
+        """
+
+    def walk(self, request_id: int) -> Iterator[str]:
+        """
+        Yield the distinct servers in preference order for a request.
+
+        The first server yielded is find(request_id); the rest follow it in
+        membership order.
+
+        Args:
+            request_id: The ID of the request
+
+        Yields:
+            str: Server hostnames, each at most once
+        """
+        members = self._members
+        if not members:
+            return
+        first = self.find(request_id)
+        start = members.index(first) if first in members else 0
+        for offset in range(len(members)):
+            yield members[(start + offset) % len(members)]
+
+    def find_n(self, request_id: int, n: int) -> List[str]:
+        """
+        Find the first n distinct servers in a request's preference order.
+
+        Args:
+            request_id: The ID of the request (or any integer key)
+            n: Number of servers wanted
+
+        Returns:
+            List[str]: Up to n hostnames, fewer if there are fewer servers
+        """
+        return list(itertools.islice(self.walk(request_id), n))
+
+    def _snapshot_params(self) -> Dict:
+        """
+        Engine-specific constructor arguments to store in a snapshot.
+        """
+        return {}
+
+    def _snapshot_payload(self) -> bytes:
+        """
+        Derived state to store in a snapshot so restoring skips recomputing it.
+        """
+        return b''
+
+    def _restore_payload(self, payload: bytes) -> None:
+        """
+        Rebuild derived state after the servers of a snapshot are loaded.
+        """
+        self._changed()
+
+    def to_bytes(self) -> bytes:
+        """
+        Serialize the engine: its name, parameters and servers with their weights, in order.
+
+        Returns:
+            bytes: The snapshot
+        """
+        header = {
+            'engine': self.name,
+            'hash_function': self.hash_function,
+            'params': self._snapshot_params(),
+            'hosts': [[hostname, self.weights[hostname]] for hostname in self._hosts],
+        }
+        return pack_snapshot(ENGINE_SNAPSHOT_MAGIC, header, self._snapshot_payload())
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'RoutingEngine':
+        """
+        Restore an engine from a snapshot made by to_bytes().
+
+        Args:
+            data: The snapshot
+
+        Returns:
+            RoutingEngine: The restored engine, of the class named in the snapshot
+
+        Raises:
+            ValueError: If the data is not a RoutingEngine snapshot
+        """
+        header, payload = unpack_snapshot(data, ENGINE_SNAPSHOT_MAGIC)
+        engine = ENGINES[header['engine']](hash_function=header['hash_function'], **header['params'])
+        engine._loading = True
+        for hostname, weight in header['hosts']:
+            engine.add(hostname, weight)
+        engine._loading = False
+        engine._restore_payload(payload)
+        return engine
+
+    def rebalance(self) -> List[Dict]:
+        """
+        Placement depends only on the current membership, so there is
+        nothing to re-place.
+
+        Returns:
+            List[Dict]: An empty migration plan
+        """
+        return []
+
+    def get_distribution(self) -> Dict[str, int]:
+        """
+        Get the number of placement units held by each server.
+
+        Returns:
+            Dict[str, int]: A dictionary mapping server hostnames to unit counts
+        """
+        return {hostname: 1 for hostname in self._hosts}
+
+    def ownership_fraction(self) -> Dict[str, float]:
+        """
+        Get the expected share of the key space owned by each server.
+
+        Returns:
+            Dict[str, float]: A dictionary mapping server hostnames to their share
+        """
+        total = sum(self.weights.values())
+        return {hostname: self.weights[hostname] / total for hostname in self._hosts}
+
+
+class JumpHashMap(RoutingEngine):
+    """
+    Jump consistent hash over an ordered list of buckets.
+
+    Lookups are O(log N) with O(1) memory per server. Jump hash can only
+    shrink from the end, so removing a server moves the last bucket into
+    its place: keys of both the removed and the last server move. Buckets
+    are equal-sized, so weights other than 1 are not supported.
+    """
+
+    name = 'jump'
+
+    def _check_weight(self, weight: float) -> None:
+        if weight != 1:
+            raise ValueError("Jump hash does not support server weights")
+
+    def remove(self, hostname: str) -> None:
+        if hostname not in self._hosts:
+            raise KeyError(f"Hostname '{hostname}' not found in the hash map")
+        idx = self._hosts.index(hostname)
+        last = self._hosts.pop()
+        if idx < len(self._hosts):
+            self._hosts[idx] = last
+        self.weights.pop(hostname)
+        if not self._loading:
+            self._changed()
+
+    def find(self, request_id: int) -> str:
+        members = self._members
+        if not members:
+            raise KeyError("No servers available to handle the request")
+        return members[jump_hash(self._key(request_id), len(members))]
+
+
+class RendezvousHashMap(RoutingEngine):
+    """
+    Rendezvous (highest random weight) hashing.
+
+    Every server scores each key and the highest score wins, so only keys
+    owned by an added or removed server move. Lookups are O(N). Weighted
+    servers use the logarithmic score -w / ln(u), which gives each server a
+    share of keys proportional to its weight.
+    """
+
+    name = 'rendezvous'
+
+    def __init__(self, hostnames: Optional[List[str]] = None, hash_function: str = 'polynomial'):
+        # Map: server-hostname -> 64-bit seed derived from the hostname
+        self._seeds: Dict[str, int] = {}
+        super().__init__(hostnames, hash_function)
+
+    def add(self, hostname: str, weight: float = 1.0) -> None:
+        # Seed first: super().add() publishes the new candidates
+        self._check_weight(weight)
+        self._seeds.setdefault(hostname, fnv1a64(hostname.encode()))
+        super().add(hostname, weight)
+
+    def remove(self, hostname: str) -> None:
+        super().remove(hostname)
+        self._seeds.pop(hostname)
+
+    def _changed(self) -> None:
+        super()._changed()
+        candidates = tuple((hostname, self._seeds[hostname], self.weights[hostname]) for hostname in self._hosts)
+        # (candidates, whether any weight differs from 1), published together
+        self._candidates = (candidates, any(weight != 1 for _, _, weight in candidates))
+
+    def _scores(self, request_id: int) -> List[tuple]:
+        """
+        Score every server for a request; the highest score wins.
+
+        With equal weights the raw 64-bit hash is ranked directly, avoiding
+        the float conversion on the lookup path.
+        """
+        candidates, weighted = self._candidates
+        key = self._key(request_id)
+        if not weighted:
+            return [(mix64(key ^ seed), hostname) for hostname, seed, _ in candidates]
+        return [(self._weighted_score(mix64(key ^ seed), weight), hostname) for hostname, seed, weight in candidates]
+
+    @staticmethod
+    def _weighted_score(h: int, weight: float) -> float:
+        """
+        Weighted score of a 64-bit hash.
+        """
+        if h == MASK64:
+            return math.inf
+        # u in (0, 1): -w / ln(u) grows with u and scales with the weight
+        return -weight / math.log((h + 1) / 2**64)
+
+    def find(self, request_id: int) -> str:
+        scores = self._scores(request_id)
+        if not scores:
+            raise KeyError("No servers available to handle the request")
+        return max(scores)[1]
+
+    def walk(self, request_id: int) -> Iterator[str]:
+        for _, hostname in sorted(self._scores(request_id), reverse=True):
+            yield hostname
+
+
+class MaglevHashMap(RoutingEngine):
+    """
+    Maglev lookup-table hashing.
+
+    Each server fills the table following its own permutation, giving
+    near-perfect balance and O(1) lookups. The table is rebuilt on every
+    membership change and its size bounds the number of servers.
+
+    Attributes:
+        table_size (int): Number of table entries (a prime)
+    """
+
+    name = 'maglev'
+
+    def __init__(self, hostnames: Optional[List[str]] = None, hash_function: str = 'polynomial', table_size: int = 65537):
+        """
+        Initialize the engine.
+
+        Args:
+            hostnames: List of server hostnames to add initially
+            hash_function: Request hash strategy name (see HashFunctions.HASH_FUNCTIONS)
+            table_size: Number of lookup table entries; must be prime and should be much larger than the server count
+
+        Raises:
+            ValueError: If invalid parameters are provided
+        """
+        # Every skip must be coprime to the size, or a server's permutation
+        # revisits the same entries and _build_table() never finishes
+        if not is_prime(table_size):
+            raise ValueError("Table size must be a prime number")
+        self.table_size = table_size
+        # (sorted hosts, table of entry -> index into the hosts), published together
+        self._lookup = ((), array('I'))
+        super().__init__(hostnames, hash_function)
+
+    def remaining(self) -> int:
+        return self.table_size - len(self._hosts)
+
+    def add(self, hostname: str, weight: float = 1.0) -> None:
+        if len(self._hosts) >= self.table_size:
+            raise IndexError(f"Insufficient table entries to add new server {hostname}")
+        super().add(hostname, weight)
+
+    def _changed(self) -> None:
+        super()._changed()
+        # Sorted so the table does not depend on insertion order
+        hosts = tuple(sorted(self._hosts))
+        self._lookup = (hosts, self._build_table(hosts))
+
+    def _build_table(self, hosts: tuple) -> array:
+        """
+        Build the lookup table from the servers' permutations.
+
+        Each round a server earns weight / max_weight credits and claims one
+        entry per whole credit, so entries are shared in proportion to weight.
+
+        Args:
+            hosts: Sorted server hostnames
+
+        Returns:
+            array: Table of entry -> index into hosts
+        """
+        size = self.table_size
+        table = array('I', [0]) * size
+        if not hosts:
+            return table
+
+        offsets = [fnv1a64(host.encode()) % size for host in hosts]
+        skips = [murmur3_32(host.encode()) % (size - 1) + 1 for host in hosts]
+        max_weight = max(self.weights.values())
+        shares = [self.weights[host] / max_weight for host in hosts]
+        credits = [0.0] * len(hosts)
+        next_idx = [0] * len(hosts)
+        filled = bytearray(size)
+        n_filled = 0
+
+        while True:
+            for i in range(len(hosts)):
+                credits[i] += shares[i]
+                if credits[i] < 1:
+                    continue
+                credits[i] -= 1
+                entry = (offsets[i] + next_idx[i] * skips[i]) % size
+                while filled[entry]:
+                    next_idx[i] += 1
+                    entry = (offsets[i] + next_idx[i] * skips[i]) % size
+                table[entry] = i
+                filled[entry] = 1
+                next_idx[i] += 1
+                n_filled += 1
+                if n_filled == size:
+                    return table
+
+    def _snapshot_params(self) -> Dict:
+        return {'table_size': self.table_size}
+
+    def _snapshot_payload(self) -> bytes:
+        return _int_array_bytes(self._lookup[1])
+
+    def _restore_payload(self, payload: bytes) -> None:
+        # The table is built over the sorted hosts, so it can be reused as is
+        if len(payload) != 4 * self.table_size:
+            self._changed()
+            return
+        RoutingEngine._changed(self)
+        self._lookup = (tuple(sorted(self._hosts)), _int_array('I', payload))
+
+    def find(self, request_id: int) -> str:
+        hosts, table = self._lookup
+        if not hosts:
+            raise KeyError("No servers available to handle the request")
+        return hosts[table[self._key(request_id) % self.table_size]]
+
+    def get_distribution(self) -> Dict[str, int]:
+        hosts, table = self._lookup
+        counts = [0] * len(hosts)
+        for i in table:
+            counts[i] += 1
+        return dict(zip(hosts, counts))
+
+    def ownership_fraction(self) -> Dict[str, float]:
+        return {hostname: count / self.table_size for hostname, count in self.get_distribution().items()}
+
+
+# Registry: engine name -> class
+ENGINES = {
+    'ring': ConsistentHashMap,
+    JumpHashMap.name: JumpHashMap,
+    RendezvousHashMap.name: RendezvousHashMap,
+    MaglevHashMap.name: MaglevHashMap,
+}
+
+
+def load_hash_map(data: bytes):
+    """
+    Restore a ConsistentHashMap or routing engine from its to_bytes() snapshot.
+
+    Args:
+        data: The snapshot
+
+    Returns:
+        The restored hash map or engine
+
+    Raises:
+        ValueError: If the data is not a recognised snapshot
+    """
+    if bytes(data[:4]) == SNAPSHOT_MAGIC:
+        return ConsistentHashMap.from_bytes(data)
+    return RoutingEngine.from_bytes(data)
+
+
+def create_hash_map(engine: str = 'ring', hostnames: Optional[List[str]] = None, hash_function: str = 'polynomial', **kwargs):
+    """
+    Build a routing engine by name.
+
+    Args:
+        engine: 'ring' (ConsistentHashMap), 'jump', 'rendezvous' or 'maglev'
+        hostnames: List of server hostnames to add initially
+        hash_function: Request hash strategy name
+        **kwargs: Extra engine-specific arguments (e.g. n_slots, table_size)
+
+    Returns:
+        The routing engine
+
+    Raises:
+        ValueError: If the engine name is unknown
+    """
+    try:
+        cls = ENGINES[engine.lower()]
+    except KeyError:
+        raise ValueError(f"Routing engine must be one of {list(ENGINES)}") from None
+    return cls(hostnames=hostnames if hostnames is not None else [], hash_function=hash_function, **kwargs)
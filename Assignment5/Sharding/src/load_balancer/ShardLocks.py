@@ -0,0 +1,153 @@
+import asyncio
+import collections
+import contextlib
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+
+class RWLock:
+    """
+    Readers-writer lock for asyncio tasks.
+
+    Any number of readers may hold the lock together; a writer holds it
+    alone. Waiters are served in arrival order, so once a writer is
+    waiting, later readers queue behind it and a steady stream of reads
+    cannot starve /add or a write to the same shard. Releasing never
+    awaits, so a cancelled request always gives its locks back.
+    """
+
+    __slots__ = ('readers', 'writer', '_waiters')
+
+    def __init__(self):
+        self.readers = 0
+        self.writer = False
+        self._waiters: collections.deque = collections.deque()  # (future, wants write) in arrival order
+
+    def _can_take(self, write: bool) -> bool:
+        return not self.writer and (not write or not self.readers)
+
+    def _take(self, write: bool):
+        if write:
+            self.writer = True
+        else:
+            self.readers += 1
+
+    async def acquire(self, write: bool):
+        if not self._waiters and self._can_take(write):
+            self._take(write)
+            return
+        waiter = (asyncio.get_running_loop().create_future(), write)
+        self._waiters.append(waiter)
+        try:
+            await waiter[0]
+        except asyncio.CancelledError:
+            if waiter[0].done() and not waiter[0].cancelled():
+                self.release(write)  # Granted just before the cancellation arrived
+            elif waiter in self._waiters:  # _wake() may already have dropped the cancelled waiter
+                self._waiters.remove(waiter)
+                self._wake()
+            raise
+
+    def release(self, write: bool):
+        if write:
+            self.writer = False
+        else:
+            self.readers -= 1
+        self._wake()
+
+    def _wake(self):
+        """Grant the lock to waiters at the head of the queue while they fit."""
+        while self._waiters:
+            future, write = self._waiters[0]
+            if future.done():
+                self._waiters.popleft()
+                continue
+            if not self._can_take(write):
+                return
+            self._waiters.popleft()
+            self._take(write)
+            future.set_result(None)
+
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+
+class ShardLocks:
+    """
+    One readers-writer lock per shard.
+
+    /read takes shared locks on the shards it queries; /write, /update and
+    /del take exclusive locks on the shards they change, and membership
+    operations on the shards whose replicas they change. Every request
+    takes all of its locks in one call, in sorted shard order, so two
+    requests can never wait on each other in a cycle.
+    """
+
+    def __init__(self, on_wait: Optional[Callable[[str, float], None]] = None):
+        """
+        Initialize the manager.
+
+        Args:
+            on_wait: Optional hook called with the mode ('read' or 'write')
+                and the seconds spent acquiring a request's locks
+        """
+        self.on_wait = on_wait
+        self._locks: Dict[str, RWLock] = {}
+
+    def _sorted(self, shard_ids: Iterable[str]) -> List[RWLock]:
+        """Get the locks of the shards in acquisition order, creating missing ones."""
+        return [self._locks.setdefault(shard_id, RWLock()) for shard_id in sorted(set(shard_ids))]
+
+    @contextlib.asynccontextmanager
+    async def _hold(self, mode: str, shard_ids: Iterable[str]):
+        """Hold the locks of the shards in the given mode."""
+        write = mode == 'write'
+        locks = self._sorted(shard_ids)
+        held: List[RWLock] = []
+        start = time.perf_counter()
+        try:
+            for lock in locks:
+                await lock.acquire(write)
+                held.append(lock)
+            if self.on_wait is not None:
+                self.on_wait(mode, time.perf_counter() - start)
+            yield
+        finally:
+            for lock in reversed(held):
+                lock.release(write)
+
+    def read(self, shard_ids: Iterable[str]):
+        """
+        Hold shared locks on shards.
+
+        Args:
+            shard_ids: Shards to lock
+
+        Returns:
+            An async context manager
+        """
+        return self._hold('read', shard_ids)
+
+    def write(self, shard_ids: Iterable[str]):
+        """
+        Hold exclusive locks on shards.
+
+        Args:
+            shard_ids: Shards to lock
+
+        Returns:
+            An async context manager
+        """
+        return self._hold('write', shard_ids)
+
+    def stats(self) -> dict:
+        """
+        Get the locks currently held.
+
+        Returns:
+            dict: For each shard with holders or waiters, its readers, whether a
+            writer holds it and the number of requests waiting
+        """
+        return {shard_id: {'readers': lock.readers, 'writer': lock.writer, 'waiting': lock.waiting()}
+                for shard_id, lock in self._locks.items()
+                if lock.readers or lock.writer or lock.waiting()}
@@ -9,4 +9,11 @@ CREATE TABLE IF NOT EXISTS shardT (
 	valid_at INTEGER NOT NULL DEFAULT 0
 );
 
+-- Create the Load Balancer Routing State Table (a single snapshot row)
+CREATE TABLE IF NOT EXISTS lb_state (
+	id INTEGER PRIMARY KEY,
+	snapshot BYTEA NOT NULL,
+	saved_at TIMESTAMP NOT NULL DEFAULT now()
+);
+
 COMMIT TRANSACTION;
@@ -1,41 +1,83 @@
 import logging
 import asyncpg
 import aiohttp
+import contextlib
 import os
 import random
 import sys
 import time
-from aiodocker import Docker
-from quart import Quart, request, jsonify
+from quart import Quart, Response, g, request, jsonify
 from quart_cors import cors
 from colorama import Fore, Style
-from ConsistentHashing import ConsistentHashMap
-from asyncio import Lock
+from ConsistentHashing import ConsistentHashMap, pack_snapshot, unpack_snapshot
+from RoutingEngines import create_hash_map, load_hash_map
+from HashFunctions import md5
+from HeartbeatScheduler import HeartbeatScheduler
+from ContainerPool import ContainerPool
+from ShardLocks import ShardLocks
+from Metrics import CONTENT_TYPE, DOCKER_BUCKETS, LOCK_WAIT_BUCKETS, MetricsRegistry, TimedLock, backend_trace_config
 import asyncio
-from typing import Any, Dict, List, Optional, Set, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 
 DEBUG = True
 
-mutexLock = Lock()
+metrics = MetricsRegistry()  # Counters and histograms served at /metrics
+lock_wait = metrics.histogram('lb_lock_wait_seconds', 'Time spent waiting to acquire mutexLock', LOCK_WAIT_BUCKETS).labels()
+mutexLock = TimedLock(lock_wait)  # Serializes membership changes; data operations only take shard_locks
+shard_lock_wait = metrics.histogram('lb_shard_lock_wait_seconds', 'Time spent waiting for shard locks, by mode',
+                                    LOCK_WAIT_BUCKETS, ['mode'])
+shard_locks = ShardLocks(on_wait=lambda mode, seconds: shard_lock_wait.labels(mode).observe(seconds))  # Per-shard reader/writer locks
 
 schema = {}
 
 MAX_FAIL_COUNT = 5  # Maximum number of heartbeat failures before server is considered down
-HEARTBEAT_INTERVAL = 10  # Seconds between heartbeat checks
+HEARTBEAT_INTERVAL = 10  # Seconds between heartbeat checks of a newly seen server
+HEARTBEAT_MIN_INTERVAL = 2  # Seconds between heartbeats of a server whose last heartbeat failed
+HEARTBEAT_MAX_INTERVAL = 20  # Longest interval a healthy server backs off to
+HEARTBEAT_BACKOFF = 1.5  # Interval growth after each successful heartbeat
+HEARTBEAT_JITTER = 0.2  # Relative random spread of every heartbeat interval
 STOP_TIMEOUT = 5  # Timeout for stopping containers
 REQUEST_TIMEOUT = 1  # Timeout for client requests
 REQUEST_BATCH_SIZE = 10  # Number of concurrent requests to process
 DOCKER_TASK_BATCH_SIZE = 10  # Number of concurrent Docker operations
 MAX_CONFIG_FAIL_COUNT = 15
-
-Servers = ConsistentHashMap()  # Consistent hash map for server selection
+HASH_FUNCTION = os.environ.get('HASH_FUNCTION', 'polynomial')  # Hash strategy used by the rings
+ROUTING_ENGINE = os.environ.get('ROUTING_ENGINE', 'ring')  # ring, jump, rendezvous or maglev
+LB_SNAPSHOT_PATH = os.environ.get('LB_SNAPSHOT_PATH', '')  # Routing state file; empty = store it in the lb_state table
+LB_STATE_MAGIC = b'LBS1'  # Leading bytes of a routing state snapshot
+REPLICA_PLACEMENT = os.environ.get('REPLICA_PLACEMENT', 'explicit')  # explicit (payload lists shards per server) or ring
+REPLICA_COUNT = int(os.environ.get('REPLICA_COUNT', 3))  # Replicas per shard under ring placement
+WARM_POOL_SIZE = int(os.environ.get('WARM_POOL_SIZE', 0))  # Pre-started server containers kept for /add and respawns
+
+Servers = create_hash_map(ROUTING_ENGINE, hash_function=HASH_FUNCTION)  # Consistent hash map for server selection
 heartbeat_fail_count: dict[str, int] = {}  # Track failed heartbeats for each server
 serv_ids: dict[str,int] = {}
 serv_id = 0
 shard_map: dict[str, ConsistentHashMap] = {}
+host_shards: dict[str, set[str]] = {}  # Reverse index of shard_map: shards held by each server
+
+# Metrics; values the load balancer already tracks are read when /metrics is scraped
+route_requests = metrics.counter('lb_requests_total', 'Requests handled, by route', ['route'])
+route_errors = metrics.counter('lb_request_errors_total', 'Requests answered with status >= 400, by route', ['route'])
+route_duration = metrics.histogram('lb_request_duration_seconds', 'Request handling time, by route', labelnames=['route'])
+backend_requests = metrics.counter('lb_backend_requests_total', 'Requests sent to each server', ['server'])
+backend_errors = metrics.counter('lb_backend_errors_total', 'Server requests that failed or got a 5xx answer', ['server'])
+backend_duration = metrics.histogram('lb_backend_duration_seconds', 'Server request latency, by server', labelnames=['server'])
+backend_trace = backend_trace_config(backend_requests, backend_errors, backend_duration)  # Passed to server sessions
+docker_duration = metrics.histogram('lb_docker_operation_seconds', 'Docker operation time', DOCKER_BUCKETS, ['operation'])
+respawns = metrics.counter('lb_respawns_total', 'Servers respawned after failed heartbeats').labels()
+metrics.callback('lb_ring_servers', 'Servers in the ring', lambda: len(Servers))
+metrics.callback('lb_ring_free_slots', 'Servers that can still be added', lambda: Servers.remaining())
+metrics.callback('lb_shard_replicas', 'Servers holding each shard', lambda: {s: len(m) for s, m in shard_map.items()},
+                 labelname='shard')
+metrics.callback('lb_shard_lock_waiters', 'Requests waiting for each shard lock',
+                 lambda: {s: v['waiting'] for s, v in shard_locks.stats().items()}, labelname='shard')
+metrics.callback('lb_heartbeats_total', 'Heartbeats sent', lambda: heartbeats.sent, kind='counter')
+metrics.callback('lb_heartbeat_failures_total', 'Heartbeats that failed', lambda: heartbeats.failed, kind='counter')
+metrics.callback('lb_warm_pool_ready', 'Pre-started containers ready for /add', lambda: containers.stats()['ready'])
 
 
 def err_payload(err: Exception):
@@ -55,93 +97,32 @@ DB_NAME = os.environ.get('POSTGRES_DB_NAME', 'postgres')
 
 pool: asyncpg.Pool
 
-async def gather_with_concurrency(
-    session: aiohttp.ClientSession,
-    batch: int,
-    *urls: str
-):
-    
-    await asyncio.sleep(0)  # Yield to event loop
-    semaphore = asyncio.Semaphore(batch)
-    
-    async def fetch(url: str):
-        await asyncio.sleep(0)  # Yield to event loop
-        async with semaphore:  # Limit concurrent requests
-            async with session.get(url) as response:
-                await response.read()  # Ensure response body is read
-                return response
-    
-    tasks = [fetch(url) for url in urls]
-    return [None if isinstance(r, BaseException)
-            else r for r in
-            await asyncio.gather(*tasks, return_exceptions=True)]
-
 async def get_heartbeats():
     """Background task to monitor server health via heartbeat requests"""
-    global Servers, heartbeat_fail_count, serv_id
     if DEBUG:
         print(f'{Fore.CYAN}HEARTBEAT | Heartbeat background task started{Style.RESET_ALL}', file=sys.stderr)
-    await asyncio.sleep(0)  # Yield to event loop
+    await asyncio.sleep(0)
     try:
-        while True:
-            # Get current list of servers
-            async with mutexLock:  # Thread-safe access to Servers
-                if DEBUG:
-                    print(f'{Fore.CYAN}HEARTBEAT | Checking heartbeat every {HEARTBEAT_INTERVAL} seconds{Style.RESET_ALL}', file=sys.stderr)
-                else:
-                    print('HEARTBEAT CHECK')
-                hostnames = Servers.getServerList().copy()
-                
-            # Prepare heartbeat URLs
-            heartbeat_urls = [f'http://{server_name}:5000/heartbeat' for server_name in hostnames]
-            
-            # Set timeout for heartbeat requests
-            timeout = aiohttp.ClientTimeout(connect=REQUEST_TIMEOUT)
-            
-            # Send heartbeat requests to all servers
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                heartbeats = await gather_with_concurrency(session, REQUEST_BATCH_SIZE, *heartbeat_urls)
-                
-            await asyncio.sleep(0)  # Yield to event loop
-            
-            # Handle failed heartbeats
-            semaphore = asyncio.Semaphore(DOCKER_TASK_BATCH_SIZE)
-            async def flatline_wrapper(serv_id: int, server_name: str):
-                """Wrapper for handling failed servers"""
-                await asyncio.sleep(0)  # Yield to event loop
-                async with semaphore:  # Limit concurrent Docker operations
-                    try:
-                        await handle_flatline(serv_id, server_name)
-                    except Exception as e:
-                        if DEBUG:
-                            print(f'{Fore.RED}ERROR | {e}{Style.RESET_ALL}', file=sys.stderr)
-                            
-            flatlines = []
-            async with mutexLock:  # Thread-safe access to shared data
-                for i, response in enumerate(heartbeats):
-                    if response is None or not response.status == 200:
-                        # Increment fail count for server
-                        heartbeat_fail_count[hostnames[i]] = heartbeat_fail_count.get(hostnames[i], 0) + 1
-                        if heartbeat_fail_count[hostnames[i]] >= MAX_FAIL_COUNT:
-                            # Server has failed too many times, restart it
-                            serv_id += 1
-                            flatlines.append(flatline_wrapper(serv_id, hostnames[i]))
-                    else:
-                        # Reset fail count for healthy server
-                        heartbeat_fail_count[hostnames[i]] = 0
-                        
-                # Handle failed servers
-                if flatlines:
-                    await asyncio.gather(*flatlines, return_exceptions=True)
-                    
-            # Wait until next heartbeat check
-            await asyncio.sleep(HEARTBEAT_INTERVAL)
+        async with aiohttp.ClientSession() as session:
+            await heartbeats.run(session)
     except asyncio.CancelledError:
         if DEBUG:
             print(f'{Fore.CYAN}HEARTBEAT | Heartbeat background task stopped{Style.RESET_ALL}', file=sys.stderr)
 
-async def handle_flatline(serv_id: int, hostname: str):
-    """Recreate and restart a failed server container with its previous shards"""
+async def respawn(hostname: str):
+    """Replace a server whose heartbeats keep failing; runs as its own task"""
+    respawns.inc()
+    try:
+        # Shard data is copied from the other replicas, so lock its shards like /add
+        async with mutexLock, shard_locks.write(host_shards.get(hostname, ())):
+            await handle_flatline(hostname)
+            await save_state()
+    except Exception as e:
+        if DEBUG:
+            print(f'{Fore.RED}ERROR | {e}{Style.RESET_ALL}', file=sys.stderr)
+
+async def handle_flatline(hostname: str):
+    """Replace a failed server's container (from the warm pool if possible) and restore its shards"""
     global shard_map, serv_ids
     
     await asyncio.sleep(0)  
@@ -150,155 +131,545 @@ async def handle_flatline(serv_id: int, hostname: str):
         print(f'{Fore.LIGHTRED_EX}FLATLINE | Flatline of server replica {hostname} detected{Style.RESET_ALL}', file=sys.stderr)
     
     # Store the shards that the flatlined server had
-    server_shards = []
-    for shard_id, servers in shard_map.items():
-        if hostname in servers.getServerList():
-            server_shards.append(shard_id)
+    server_shards = sorted(host_shards.get(hostname, ()))
     
     try:
-        async with Docker() as docker:
-            container_config = {
-                'image': 'server:v2',
-                'detach': True,
-                'env': [
-                    f'SERVER_ID={serv_id}', 
-                    'DEBUG=true',
-                    'POSTGRES_HOST=localhost',
-                    'POSTGRES_PORT=5432',
-                    'POSTGRES_USER=postgres',
-                    'POSTGRES_PASSWORD=postgres',
-                    'POSTGRES_DB_NAME=postgres'
-                ],
-                'hostname': hostname,
-                'tty': True,
-            }
-            
-            container = await docker.containers.create_or_replace(name=hostname, config=container_config)
-            
-            LB = await docker.networks.get('LB')
-            connect_config = {
-                'Container': container.id, 
-                'EndpointConfig': {
-                    'Aliases': [hostname]
-                }
-            }
-            await LB.connect(connect_config)
-            
-            # Start container
-            await container.start()
+        # Replaces the failed container that still holds the name
+        serv_id, warm = await containers.spawn(hostname)
+        
+        if DEBUG:
+            action = 'Claimed warm' if warm else 'Started'
+            print(f'{Fore.MAGENTA}RESPAWN | {action} container for {hostname}{Style.RESET_ALL}', file=sys.stderr)
+        
+        # Restore the shards configuration once the container is running; a
+        # warm container also needs /config to learn the hostname it now has
+        if server_shards or warm:
+            # Wait for the server to be ready
+            semaphore = asyncio.Semaphore(REQUEST_BATCH_SIZE)
+            timeout = aiohttp.ClientTimeout(connect=REQUEST_TIMEOUT)
             
-            if DEBUG:
-                print(f'{Fore.MAGENTA}RESPAWN | Started container for {hostname}{Style.RESET_ALL}', file=sys.stderr)
+            async with aiohttp.ClientSession(timeout=timeout, trace_configs=[backend_trace]) as session:
+                # Configure the server with its previous shards
+                async def post_config_wrapper():
+                    for _ in range(MAX_CONFIG_FAIL_COUNT):
+                        try:
+                            async with session.get(f'http://{hostname}:5000/heartbeat') as response:
+                                if response.status == 200:
+                                    break
+                        except Exception:
+                            pass
+                        await asyncio.sleep(2)
+                    else:
+                        if DEBUG:
+                            print(f'{Fore.RED}ERROR | Failed to establish connection to respawned server {hostname}{Style.RESET_ALL}', file=sys.stderr)
+                        return None
+
+                    try:
+                        async with session.post(f'http://{hostname}:5000/config', json={"shards": server_shards, "hostname": hostname}) as response:
+                            await response.read()
+                            return response
+                    except Exception as e:
+                        if DEBUG:
+                            print(f'{Fore.RED}ERROR | Failed to configure shards on respawned server {hostname}: {e}{Style.RESET_ALL}', file=sys.stderr)
+                        return None
             
-            # Restore the shards configuration once the container is running
-            if server_shards:
-                # Wait for the server to be ready
-                semaphore = asyncio.Semaphore(REQUEST_BATCH_SIZE)
-                timeout = aiohttp.ClientTimeout(connect=REQUEST_TIMEOUT)
-                
-                async with aiohttp.ClientSession(timeout=timeout) as session:
-                    # Configure the server with its previous shards
-                    async def post_config_wrapper():
-                        for _ in range(MAX_CONFIG_FAIL_COUNT):
-                            try:
-                                async with session.get(f'http://{hostname}:5000/heartbeat') as response:
-                                    if response.status == 200:
-                                        break
-                            except Exception:
-                                pass
-                            await asyncio.sleep(2)
-                        else:
+                # Restore data for each shard
+                async def restore_shards():
+                    # Process each shard
+                    for shard_id in server_shards:
+                        other_servers = []
+                        # Find other servers that have this shard
+                        for server in shard_map[shard_id].getServerList():
+                            if server != hostname and server in Servers.getServerList():
+                                other_servers.append(server)
+                        
+                        if not other_servers:
+                            # No other server has this shard - data loss may occur
                             if DEBUG:
-                                print(f'{Fore.RED}ERROR | Failed to establish connection to respawned server {hostname}{Style.RESET_ALL}', file=sys.stderr)
-                            return None
-
+                                print(f'{Fore.YELLOW}WARNING | Potential data loss: No other server has shard {shard_id} previously on {hostname}{Style.RESET_ALL}', file=sys.stderr)
+                            continue
+                        
+                        # Get shard data from another server
                         try:
-                            async with session.post(f'http://{hostname}:5000/config', json={"shards": server_shards}) as response:
-                                await response.read()
-                                return response
+                            source_server = random.choice(other_servers)
+                            async with pool.acquire() as conn:
+                                async with conn.transaction(readonly=True):
+                                    shard_valid_at = await conn.fetchval(
+                                        'SELECT valid_at FROM ShardT WHERE shard_id = $1::TEXT', 
+                                        shard_id
+                                    )
+                            
+                            # Get data from source server
+                            async with session.get(
+                                f'http://{source_server}:5000/copy',
+                                json={"shards": [shard_id], "valid_at": [shard_valid_at]}
+                            ) as response:
+                                if response.status == 200:
+                                    data = await response.json()
+                                    # Write data to respawned server
+                                    async with session.post(
+                                        f'http://{hostname}:5000/write',
+                                        json={
+                                            'shard': shard_id,
+                                            'data': data[shard_id],
+                                            'admin': True,
+                                            'valid_at': shard_valid_at,
+                                        }
+                                    ) as write_response:
+                                        if write_response.status == 200:
+                                            if DEBUG:
+                                                print(f'{Fore.GREEN}INFO | Successfully restored shard {shard_id} on {hostname}{Style.RESET_ALL}', file=sys.stderr)
+                                        else:
+                                            if DEBUG:
+                                                print(f'{Fore.YELLOW}WARNING | Failed to write data to shard {shard_id} on {hostname}{Style.RESET_ALL}', file=sys.stderr)
+                                else:
+                                    if DEBUG:
+                                        print(f'{Fore.YELLOW}WARNING | Failed to copy data for shard {shard_id} from {source_server}{Style.RESET_ALL}', file=sys.stderr)
                         except Exception as e:
                             if DEBUG:
-                                print(f'{Fore.RED}ERROR | Failed to configure shards on respawned server {hostname}: {e}{Style.RESET_ALL}', file=sys.stderr)
-                            return None
-                
-                    # Restore data for each shard
-                    async def restore_shards():
-                        # Process each shard
-                        for shard_id in server_shards:
-                            other_servers = []
-                            # Find other servers that have this shard
-                            for server in shard_map[shard_id].getServerList():
-                                if server != hostname and server in Servers.getServerList():
-                                    other_servers.append(server)
-                            
-                            if not other_servers:
-                                # No other server has this shard - data loss may occur
-                                if DEBUG:
-                                    print(f'{Fore.YELLOW}WARNING | Potential data loss: No other server has shard {shard_id} previously on {hostname}{Style.RESET_ALL}', file=sys.stderr)
-                                continue
-                            
-                            # Get shard data from another server
-                            try:
-                                source_server = random.choice(other_servers)
-                                async with pool.acquire() as conn:
-                                    async with conn.transaction(readonly=True):
-                                        shard_valid_at = await conn.fetchval(
-                                            'SELECT valid_at FROM ShardT WHERE shard_id = $1::TEXT', 
-                                            shard_id
-                                        )
-                                
-                                # Get data from source server
-                                async with session.get(
-                                    f'http://{source_server}:5000/copy',
-                                    json={"shards": [shard_id], "valid_at": [shard_valid_at]}
-                                ) as response:
-                                    if response.status == 200:
-                                        data = await response.json()
-                                        # Write data to respawned server
-                                        async with session.post(
-                                            f'http://{hostname}:5000/write',
-                                            json={
-                                                'shard': shard_id,
-                                                'data': data[shard_id],
-                                                'admin': True,
-                                                'valid_at': shard_valid_at,
-                                            }
-                                        ) as write_response:
-                                            if write_response.status == 200:
-                                                if DEBUG:
-                                                    print(f'{Fore.GREEN}INFO | Successfully restored shard {shard_id} on {hostname}{Style.RESET_ALL}', file=sys.stderr)
-                                            else:
-                                                if DEBUG:
-                                                    print(f'{Fore.YELLOW}WARNING | Failed to write data to shard {shard_id} on {hostname}{Style.RESET_ALL}', file=sys.stderr)
-                                    else:
-                                        if DEBUG:
-                                            print(f'{Fore.YELLOW}WARNING | Failed to copy data for shard {shard_id} from {source_server}{Style.RESET_ALL}', file=sys.stderr)
-                            except Exception as e:
-                                if DEBUG:
-                                    print(f'{Fore.YELLOW}WARNING | Failed to restore shard {shard_id} on {hostname}: {e}{Style.RESET_ALL}', file=sys.stderr)
-                
-                    # Execute both operations
-                    config_response = await post_config_wrapper()
-                    if config_response and config_response.status == 200:
-                        await restore_shards()
-                        if DEBUG:
-                            print(f'{Fore.GREEN}INFO | Successfully configured respawned server {hostname} with its previous shards{Style.RESET_ALL}', file=sys.stderr)
-                    else:
-                        if DEBUG:
-                            print(f'{Fore.YELLOW}WARNING | Could not configure respawned server {hostname} with its previous shards{Style.RESET_ALL}', file=sys.stderr)
-            
-            # Reset the heartbeat fail counter for this server
-            heartbeat_fail_count[hostname] = 0
-            serv_ids[hostname] = serv_id
+                                print(f'{Fore.YELLOW}WARNING | Failed to restore shard {shard_id} on {hostname}: {e}{Style.RESET_ALL}', file=sys.stderr)
             
+                # Execute both operations
+                config_response = await post_config_wrapper()
+                if config_response and config_response.status == 200:
+                    await restore_shards()
+                    if DEBUG:
+                        print(f'{Fore.GREEN}INFO | Successfully configured respawned server {hostname} with its previous shards{Style.RESET_ALL}', file=sys.stderr)
+                else:
+                    if DEBUG:
+                        print(f'{Fore.YELLOW}WARNING | Could not configure respawned server {hostname} with its previous shards{Style.RESET_ALL}', file=sys.stderr)
+        
+        # Reset the heartbeat fail counter for this server
+        heartbeat_fail_count[hostname] = 0
+        serv_ids[hostname] = serv_id
+        
     except Exception as e:
         if DEBUG:
             print(f'{Fore.RED}ERROR | Failed to handle flatline for {hostname}: {e}{Style.RESET_ALL}', file=sys.stderr)
 
+def next_serv_id() -> int:
+    """Allocate the server ID of a new container"""
+    global serv_id
+    serv_id += 1
+    return serv_id
+
+# Shared Docker client, network handle and warm pool for the server containers
+containers = ContainerPool(
+    image='server:v2',
+    env=lambda serv_id: [
+        f'SERVER_ID={serv_id}',
+        'DEBUG=true',
+        'POSTGRES_HOST=localhost',
+        'POSTGRES_PORT=5432',
+        'POSTGRES_USER=postgres',
+        'POSTGRES_PASSWORD=postgres',
+        'POSTGRES_DB_NAME=postgres',
+    ],
+    next_id=next_serv_id,
+    warm_size=WARM_POOL_SIZE,
+    concurrency=DOCKER_TASK_BATCH_SIZE,
+    stop_timeout=STOP_TIMEOUT,
+    on_operation=lambda operation, seconds: docker_duration.labels(operation).observe(seconds),
+)
+
+# Per-server heartbeat timers with jitter and back-off; respawns run as separate tasks
+heartbeats = HeartbeatScheduler(
+    hostnames=lambda: Servers.getServerList(),
+    on_flatline=respawn,
+    fail_counts=heartbeat_fail_count,
+    interval=HEARTBEAT_INTERVAL,
+    min_interval=HEARTBEAT_MIN_INTERVAL,
+    max_interval=HEARTBEAT_MAX_INTERVAL,
+    backoff=HEARTBEAT_BACKOFF,
+    jitter=HEARTBEAT_JITTER,
+    max_fail_count=MAX_FAIL_COUNT,
+    concurrency=REQUEST_BATCH_SIZE,
+    timeout=REQUEST_TIMEOUT,
+)
+
+def add_replica(shard_id: str, hostname: str, weight: float = 1):
+    """Add a server to a shard's hash map and to the host_shards index"""
+    shard_map[shard_id].add(hostname, weight)
+    host_shards.setdefault(hostname, set()).add(shard_id)
+
+def remove_replica(shard_id: str, hostname: str):
+    """Remove a server from a shard's hash map and from the host_shards index"""
+    shard_map[shard_id].remove(hostname)
+    host_shards.get(hostname, set()).discard(shard_id)
+
+def placement_key(shard_id: str) -> int:
+    """
+    Ring key of a shard under ring placement.
+
+    stud_id_low is no good as a key: shard bounds are usually multiples of
+    the shard size, and with the polynomial hash every multiple of the slot
+    count lands on the same slot. The MD5 of the shard ID is spread evenly
+    (the top 63 bits are kept so the key also fits an int64).
+    """
+    return md5(shard_id.encode()) >> 65
+
+def place_replicas(shard_ids: Iterable[str]) -> Dict[str, List[str]]:
+    """
+    Derive each shard's replica set from the global server ring.
+
+    A shard is placed on the first REPLICA_COUNT distinct servers clockwise
+    from its placement_key(), so placement needs one find_n per shard. The
+    servers share the shards in proportion to the key space they own.
+    """
+    return {shard_id: Servers.find_n(placement_key(shard_id), REPLICA_COUNT) for shard_id in shard_ids}
+
+def shards_by_server(replica_sets: Dict[str, List[str]], hostnames: List[str]) -> Dict[str, List[str]]:
+    """Invert shard -> replicas into server -> shards for the given servers"""
+    placed: Dict[str, List[str]] = {hostname: [] for hostname in hostnames}
+    for shard_id, replicas in replica_sets.items():
+        for hostname in replicas:
+            if hostname in placed:
+                placed[hostname].append(shard_id)
+    return placed
+
+def missing_replicas(replica_sets: Dict[str, List[str]]) -> Dict[str, List[str]]:
+    """Shards each server is placed on but does not hold yet, for every server in the ring"""
+    return {hostname: [shard_id for shard_id in placed if shard_id not in host_shards.get(hostname, ())]
+            for hostname, placed in shards_by_server(replica_sets, Servers.getServerList()).items()}
+
+async def fill_replicas(servers: Dict[str, List[str]]) -> Dict[str, BaseException]:
+    """
+    Copy shards to servers and make each server a replica of its shards once its copy succeeded.
+
+    Args:
+        servers: Shards to copy to each server
+
+    Returns:
+        Dict[str, BaseException]: The servers whose copies failed, with the error
+    """
+    semaphore = asyncio.Semaphore(DOCKER_TASK_BATCH_SIZE)  # Limit concurrent copies
+    copy_results = await asyncio.gather(*[copy_shards_to_container(ser, shards, semaphore)
+                                          for ser, shards in servers.items()], return_exceptions=True)
+    failed = {ser: result for ser, result in zip(servers, copy_results)
+              if isinstance(result, BaseException)}
+
+    # Only servers holding their copies serve the shards
+    for ser, shards in servers.items():
+        if ser in failed:
+            continue
+        for shard in shards:
+            add_replica(shard, ser, Servers.weights[ser])
+    return failed
+
+def drop_displaced_replicas(replica_sets: Dict[str, List[str]], failed: Dict[str, BaseException]):
+    """Remove the replicas outside each shard's placed replica set"""
+    for shard_id, replicas in replica_sets.items():
+        # A shard keeps its old replicas until every new one holds a copy
+        if not failed.keys().isdisjoint(replicas):
+            continue
+        for ser in set(shard_map[shard_id].getServerList()) - set(replicas):
+            remove_replica(shard_id, ser)
+
+async def copy_shards_to_container(
+    server: str,
+    shards: List[str],
+    semaphore: asyncio.Semaphore,
+    servers_flatlined: Optional[List[str]]=None
+):
+    """Configure a server with shards and fill each from one of its current replicas"""
+    if servers_flatlined is None:
+        servers_flatlined = []
+
+    global shard_map
+
+    await asyncio.sleep(0)
+
+    async def post_config_wrapper(
+        session: aiohttp.ClientSession,
+        server: str,
+        payload: dict,
+    ):
+        await asyncio.sleep(0)
+
+        async with semaphore:
+            for _ in range(50):
+                try:
+                    async with session.get(f'http://{server}:5000/heartbeat') as response:
+                        if response.status == 200:
+                            break
+                except Exception:
+                    pass
+                await asyncio.sleep(2)
+            else:
+                raise Exception()
+
+            async with session.post(f'http://{server}:5000/config',json=payload) as response:
+                await response.read()
+
+            return response
+
+    async def get_copy_wrapper(
+        session: aiohttp.ClientSession,
+        server: str,
+        payload: dict,
+    ):
+        await asyncio.sleep(0)
+
+        async with semaphore:
+            async with session.get(f'http://{server}:5000/copy',
+                                json=payload) as response:
+                await response.read()
+
+            return response
+
+    async def post_write_wrapper(
+        session: aiohttp.ClientSession,
+        server: str,
+        payload: dict,
+    ):
+        # Allow other tasks to run
+        await asyncio.sleep(0)
+
+        async with semaphore:
+            async with session.post(f'http://{server}:5000/write',json=payload) as response:
+                await response.read()
+
+            return response
+        
+    call_server_shards: dict[str, list[tuple[str, int]]] = {}
+
+    # For each shard K in `shards`:
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            stmt = await conn.prepare(
+                '''
+                SELECT
+                    valid_at
+                FROM
+                    ShardT
+                WHERE
+                    shard_id = $1::TEXT;
+                ''')
+
+            for shard in shards:
+                if len(shard_map[shard]) == 0:
+                    continue
+
+                # Copy from an existing replica; `server` is the one being filled
+                source = shard_map[shard].find(random.randint(100000, 999999))
+                if len(servers_flatlined) > 0:
+                    while source in servers_flatlined:
+                        source = shard_map[shard].find(random.randint(100000, 999999))
+
+                shard_valid_at: int = await stmt.fetchval(shard)
+
+                if source not in call_server_shards:
+                    call_server_shards[source] = []
+
+                call_server_shards[source].append((shard, shard_valid_at))
+
+    timeout = aiohttp.ClientTimeout(connect=REQUEST_TIMEOUT)
+    async with aiohttp.ClientSession(timeout=timeout, trace_configs=[backend_trace]) as session:
+
+        config_task = asyncio.create_task(
+            post_config_wrapper(
+                session,
+                server,
+                payload={
+                    "shards": shards,
+                    "hostname": server,
+                }
+            )
+        )
+        config_response = await asyncio.gather(*[config_task], return_exceptions=True)
+        config_response = (None if isinstance(config_response[0], BaseException)
+                        else config_response[0])
+
+        if config_response is None or config_response.status != 200:
+            raise Exception(f'Failed to add shards to {server}')
+
+        tasks = [asyncio.create_task(
+            get_copy_wrapper(
+                session,
+                source,
+                payload={
+                    "shards": [shard[0] for shard in source_shards],
+                    "valid_at": [shard[1] for shard in source_shards],
+                }
+            )
+        ) for source, source_shards in call_server_shards.items()]
+
+        copy_responses = await asyncio.gather(*tasks, return_exceptions=True)
+        copy_responses = [None if isinstance(response, BaseException)
+                        else response
+                        for response in copy_responses]
+
+        all_data: dict[str, tuple[list, int]] = {}
+
+        for (response, server_shards) in zip(copy_responses,
+                                            call_server_shards.values()):
+            if response is None or response.status != 200:
+                raise Exception(f'Failed to copy shards to {server}')
+
+            data: dict = await response.json()
+
+            for shard_id, valid_at in server_shards:
+                all_data[shard_id] = (data[shard_id], valid_at)
+
+        tasks = [asyncio.create_task(
+            post_write_wrapper(
+                session,
+                server,
+                payload={
+                    'shard': shard,
+                    'data': data,
+                    'admin': True,
+                    'valid_at': valid_at,
+                }
+            )
+        ) for shard, (data, valid_at) in all_data.items()]
+
+        write_responses = await asyncio.gather(*tasks, return_exceptions=True)
+        write_responses = [None if isinstance(response, BaseException)
+                        else response
+                        for response in write_responses]
+
+        if any(response is None or response.status != 200
+                for response in write_responses):
+            raise Exception(f'Failed to write shards to {server}')
+
+def dump_state() -> bytes:
+    """Serialize the routing state: Servers, shard_map, server IDs, heartbeat counts and schema"""
+    maps = [('', Servers)] + list(shard_map.items())
+    blobs = [hash_map.to_bytes() for _, hash_map in maps]
+    header = {
+        'serv_id': serv_id,
+        'serv_ids': serv_ids,
+        'heartbeat_fail_count': heartbeat_fail_count,
+        'schema': schema,
+        # [shard_id ('' for Servers), snapshot length]
+        'maps': [[shard_id, len(blob)] for (shard_id, _), blob in zip(maps, blobs)],
+    }
+    return pack_snapshot(LB_STATE_MAGIC, header, b''.join(blobs))
+
+def restore_state(data: bytes):
+    """Replace the routing state with a snapshot made by dump_state()"""
+    global Servers, shard_map, host_shards, serv_ids, heartbeat_fail_count, serv_id, schema
+
+    header, payload = unpack_snapshot(data, LB_STATE_MAGIC)
+    maps = {}
+    offset = 0
+    for shard_id, length in header['maps']:
+        maps[shard_id] = load_hash_map(payload[offset:offset + length])
+        offset += length
+
+    Servers = maps.pop('')
+    shard_map = maps
+    host_shards = {}
+    for shard_id, shard_hash_map in shard_map.items():
+        for hostname in shard_hash_map.getServerList():
+            host_shards.setdefault(hostname, set()).add(shard_id)
+    serv_ids = header['serv_ids']
+    # Updated in place: the heartbeat scheduler holds a reference to the dict
+    heartbeat_fail_count.clear()
+    heartbeat_fail_count.update(header['heartbeat_fail_count'])
+    serv_id = header['serv_id']
+    schema = header['schema']
+
+async def save_state():
+    """Persist the routing state after a membership change (call with mutexLock held)"""
+    try:
+        data = dump_state()
+        if LB_SNAPSHOT_PATH:
+            with open(LB_SNAPSHOT_PATH + '.tmp', 'wb') as f:
+                f.write(data)
+            os.replace(LB_SNAPSHOT_PATH + '.tmp', LB_SNAPSHOT_PATH)
+        else:
+            async with pool.acquire() as conn:
+                await conn.execute(
+                    '''
+                    INSERT INTO lb_state (id, snapshot)
+                    VALUES (1, $1::BYTEA)
+                    ON CONFLICT (id) DO UPDATE
+                    SET snapshot = EXCLUDED.snapshot, saved_at = now();
+                    ''', data)
+    except Exception as e:
+        print(f'{Fore.RED}ERROR | Failed to save routing state: {e}{Style.RESET_ALL}', file=sys.stderr)
+
+async def load_state():
+    """Reload the routing state saved by save_state(), if any"""
+    try:
+        if LB_SNAPSHOT_PATH:
+            if not os.path.exists(LB_SNAPSHOT_PATH):
+                return
+            with open(LB_SNAPSHOT_PATH, 'rb') as f:
+                data = f.read()
+        else:
+            async with pool.acquire() as conn:
+                data = await conn.fetchval('SELECT snapshot FROM lb_state WHERE id = 1;')
+            if data is None:
+                return
+
+        start = time.perf_counter()
+        restore_state(data)
+        print(f'{Fore.GREEN}INFO | Restored routing state for {len(Servers)} servers and {len(shard_map)} shards '
+              f'in {(time.perf_counter() - start) * 1e3:.1f} ms.{Style.RESET_ALL}')
+    except Exception as e:
+        print(f'{Fore.RED}ERROR | Failed to restore routing state: {e}{Style.RESET_ALL}', file=sys.stderr)
+
+async def lookup_shards(low: int, high: int) -> List[str]:
+    """Find the shards overlapping stud_ids low..high, without row locks (to know which shard locks to take)"""
+    async with pool.acquire() as conn:
+        records = await conn.fetch(
+            '''
+            SELECT
+                shard_id
+            FROM
+                ShardT
+            WHERE
+                (stud_id_low <= ($2::INTEGER)) AND
+                (($1::INTEGER) < stud_id_low + shard_size);
+            ''',
+            low, high)
+    return [record["shard_id"] for record in records]
+
+async def lookup_shards_of(stud_ids: List[int]) -> List[str]:
+    """Find the shards holding a list of stud_ids, without row locks"""
+    async with pool.acquire() as conn:
+        records = await conn.fetch(
+            '''
+            SELECT DISTINCT
+                shard_id
+            FROM
+                ShardT, unnest($1::INTEGER[]) AS ids(stud_id)
+            WHERE
+                (stud_id_low <= ids.stud_id) AND
+                (ids.stud_id < stud_id_low + shard_size);
+            ''',
+            stud_ids)
+    return [record["shard_id"] for record in records]
+
+def check_locked(shard_id: str, locked: List[str]):
+    """Fail a request whose shards changed (e.g. by /init) between the lookup and taking their locks"""
+    if shard_id not in locked:
+        raise Exception(f'Shard {shard_id} appeared while waiting for shard locks; retry the request')
+
 app = cors(Quart(__name__), allow_origin="*")
 
+@app.before_request
+async def start_request_timer():
+    """Note when the request started"""
+    g.request_start = time.perf_counter()
+
+@app.after_request
+async def record_request(response: Response):
+    """Count and time the request under its route"""
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    route_requests.labels(route).inc()
+    route_duration.labels(route).observe(time.perf_counter() - g.request_start)
+    if response.status_code >= 400:
+        route_errors.labels(route).inc()
+    return response
+
 @app.after_serving
 async def shutdown_db():
+    # Remove the warm containers and close the Docker client
+    await containers.close()
     if hasattr(app, 'db_pool') and pool:
         await pool.close()
         logging.info("Database connection pool closed.")
@@ -318,6 +689,8 @@ async def startup():
             port=DB_PORT
         )
         print(f'{Fore.GREEN}INFO | Database connection created.{Style.RESET_ALL}')
+        await load_state()
+        await containers.open()  # Shared Docker client; starts filling the warm pool
     except Exception as e:
         print(f'{Fore.RED}ERROR | Startup failed: '
               f'{e}'
@@ -340,6 +713,10 @@ async def help():
                         'write': '/write - Methods : GET,POST',
                         'update': '/update - Methods : PUT',
                         'del': '/del - Methods : DELETE',
+                        'weight': '/weight - Methods : GET,PUT',
+                        'rebalance': '/rebalance - Methods : POST',
+                        'heartbeats': '/heartbeats - Methods : GET',
+                        'metrics': '/metrics - Methods : GET',
                     },
                     'status': 'successful',
                 }), 200
@@ -386,6 +763,7 @@ async def init():
         schema = payload.get('schema', {})
         shards:List[Dict[str,Any]] = list(payload.get('shards', []))
         servers:Dict[str,List[str]] = dict(payload.get('servers', {}))
+        weights:Dict[str,float] = {k: float(v) for k, v in dict(payload.get('weights', {})).items()}
 
         server_name = list(servers.keys())
 
@@ -401,6 +779,9 @@ async def init():
         if len(server_name)!=N:
             raise Exception("Number of Servers not same")
 
+        if not set(weights).issubset(server_name) or any(w <= 0 for w in weights.values()):
+            raise Exception("Weights must be positive and given only for listed servers")
+
         # print(f"Schema columns: {schema['columns']}")
         # print(f"Schema dtypes: {schema['dtypes']}")
         
@@ -409,10 +790,12 @@ async def init():
                 for k in ['stud_id_low', 'shard_id', 'shard_size']):
                 raise Exception('Invalid shard description')
         
-        async with mutexLock:
+        # /init replaces every shard: wait for the data operations on old and new shards
+        async with mutexLock, shard_locks.write(set(shard_map) | {shard['shard_id'] for shard in shards}):
             heartbeat_fail_count.clear()
             serv_ids.clear()
             shard_map.clear()
+            host_shards.clear()
 
             shard_ids: Set[str] = set(shard['shard_id'] for shard in shards)
             miss_shards = set()
@@ -426,48 +809,27 @@ async def init():
 
             for shard in shards:
                 shard_id = shard['shard_id']
-                shard_map[shard_id] = ConsistentHashMap()
-            
-            docker_semaphore = asyncio.Semaphore(DOCKER_TASK_BATCH_SIZE)
+                shard_map[shard_id] = create_hash_map(ROUTING_ENGINE, hash_function=HASH_FUNCTION)
 
-            async def spawn_container(docker: Docker, serv_id: int, server: str):
-                """Create and start a new Docker container for a server instance"""
+            for server in server_name:
+                Servers.add(server, weights.get(server, 1))
+                heartbeat_fail_count[server] = 0
+
+            if REPLICA_PLACEMENT == 'ring':
+                # Shard lists in the payload are ignored; the ring decides
+                servers = shards_by_server(place_replicas(shard['shard_id'] for shard in shards), server_name)
+            
+            async def spawn_container(server: str):
+                """Start a container for a server instance, from the warm pool if possible"""
                 await asyncio.sleep(0)  # Yield to event loop
-                async with docker_semaphore:  # Limit concurrent Docker operations
-                    try:
-                        container_config = {
-                            'image': 'server:v2',
-                            'detach': True,
-                            'env': [
-                                f'SERVER_ID={serv_id}', 
-                                'DEBUG=true',
-                                'POSTGRES_PASSWORD=postgres',
-                                'POSTGRES_USER=postgres',
-                                'POSTGRES_DB=postgres'    
-                            ],
-                            'hostname': server,
-                            'tty': True,
-                        }
-                        # Create or replace container
-                        container = await docker.containers.create_or_replace(
-                            name=server,
-                            config=container_config,
-                        )
-                        # Connect to network
-                        LB = await docker.networks.get('LB')
-                        await LB.connect({'Container': container.id, 'EndpointConfig': {'Aliases': [server]}})
-                        
-                        if DEBUG:
-                            print(f'{Fore.LIGHTGREEN_EX}CREATE | Created container for {server}{Style.RESET_ALL}', file=sys.stderr)
-                        
-                        # Start container
-                        await container.start()
-                        
-                        if DEBUG:
-                            print(f'{Fore.MAGENTA}SPAWN | Started container for {server}{Style.RESET_ALL}', file=sys.stderr)
-                    except Exception as e:
-                        if DEBUG:
-                            print(f'{Fore.RED}ERROR | {e}{Style.RESET_ALL}', file=sys.stderr)
+                try:
+                    serv_ids[server], warm = await containers.spawn(server)
+                    if DEBUG:
+                        action = 'Claimed warm' if warm else 'Created and started'
+                        print(f'{Fore.MAGENTA}SPAWN | {action} container for {server}{Style.RESET_ALL}', file=sys.stderr)
+                except Exception as e:
+                    if DEBUG:
+                        print(f'{Fore.RED}ERROR | {e}{Style.RESET_ALL}', file=sys.stderr)
 
             async def post_config_wrapper(semaphore: asyncio.Semaphore,session: aiohttp.ClientSession,server: str,payload: Dict):
                 await asyncio.sleep(0)
@@ -489,23 +851,16 @@ async def init():
                         await response.read()
                     return response
 
-            async with Docker() as docker:
-                
-                new_tasks = []
-                for server in server_name:
-
-                    Servers.add(server)  
-                    heartbeat_fail_count[server] = 0
-                    
-                    for shards_ in servers[server]:
-                        shard_map[shards_].add(server)
-                    serv_id += 1
-                    new_tasks.append(spawn_container(docker, serv_id, server))
+            new_tasks = []
+            for server in server_name:
+                for shards_ in servers[server]:
+                    add_replica(shards_, server, weights.get(server, 1))
+                new_tasks.append(spawn_container(server))
 
-                res = await asyncio.gather(*new_tasks, return_exceptions=True)
+            res = await asyncio.gather(*new_tasks, return_exceptions=True)
 
-                if any(res):
-                    raise Exception('Failed to spawn containers')
+            if any(res):
+                raise Exception('Failed to spawn containers')
 
             await asyncio.sleep(0)
             
@@ -513,9 +868,9 @@ async def init():
             timeout = aiohttp.ClientTimeout(connect=REQUEST_TIMEOUT)
             
 
-            async with aiohttp.ClientSession(timeout=timeout) as session:
+            async with aiohttp.ClientSession(timeout=timeout, trace_configs=[backend_trace]) as session:
                 # Define tasks
-                new_tasks = [asyncio.create_task(post_config_wrapper(semaphore=req_semaphore,session=session,server=server,payload={"shards": servers[server]})) for server in server_name]
+                new_tasks = [asyncio.create_task(post_config_wrapper(semaphore=req_semaphore,session=session,server=server,payload={"shards": servers[server], "hostname": server})) for server in server_name]
 
                 # Wait for all tasks to complete
                 config_responses = await asyncio.gather(*new_tasks, return_exceptions=True)
@@ -545,6 +900,8 @@ async def init():
                           shard['shard_id'],
                           shard['shard_size'])
                          for shard in shards])
+
+            await save_state()
                     
         return jsonify({
             'message': 'Configured Database',
@@ -556,6 +913,19 @@ async def init():
             print(f'{Fore.RED}ERROR | {e}{Style.RESET_ALL}', file=sys.stderr)
         return jsonify(err_payload(e)), 400
 
+@app.route('/heartbeats',methods=['GET'])
+async def heartbeat_stats():
+    """Heartbeat counters and, per server, the current interval and RTT histogram"""
+    return jsonify({
+        'message': heartbeats.stats(),
+        'status': 'successful',
+    }), 200
+
+@app.route('/metrics',methods=['GET'])
+async def metrics_endpoint():
+    """Serve the load balancer's metrics in the Prometheus text format"""
+    return Response(metrics.render(), content_type=CONTENT_TYPE)
+
 @app.route('/status',methods=["GET"])
 async def status():
     global Servers, serv_ids,shard_map,schema,pool
@@ -583,16 +953,9 @@ async def status():
 
             # print(shards)    
 
-            servers_to_shards: Dict[str, List[str]] = {}
-            _shard_map = {k: v.getServerList() for k, v in shard_map.items()}
-
-            print(_shard_map)
-            for shard_id, ser in _shard_map.items():
-                for se in ser:
-                    if se in Servers.getServerList():
-                        if se not in servers_to_shards.keys():
-                            servers_to_shards[se] = []
-                        servers_to_shards[se].append(shard_id)
+            servers_to_shards: Dict[str, List[str]] = {se: sorted(host_shards[se])
+                                                       for se in Servers.getServerList()
+                                                       if host_shards.get(se)}
             print(servers_to_shards)
 
             return jsonify({
@@ -638,6 +1001,7 @@ async def add():
 
         new_shards: list[dict[str, any]] = list(payload.get('new_shards', []))
         servers: dict[str, list[str]] = dict(payload.get('servers', {}))
+        weights: dict[str, float] = {k: float(v) for k, v in dict(payload.get('weights', {})).items()}
         
         server_names = list(servers.keys())
 
@@ -648,6 +1012,8 @@ async def add():
             raise Exception('Length of hostname list is more than instances to add')
         if len(server_names) != len(set(server_names)):
             raise Exception('Hostname list contains duplicates')
+        if not set(weights).issubset(server_names) or any(w <= 0 for w in weights.values()):
+            raise Exception('Weights must be positive and given only for listed servers')
             
         for shard in new_shards:
             if not all(k in shard.keys()
@@ -655,7 +1021,7 @@ async def add():
                        ('stud_id_low', 'shard_id', 'shard_size')):
                 raise Exception('Invalid shard description')
         
-        async with mutexLock: 
+        async with mutexLock, contextlib.AsyncExitStack() as shard_locked:
             
             if n > Servers.remaining():
                 raise Exception(f'Insufficient slots. Only {Servers.remaining()} slots left')
@@ -676,247 +1042,62 @@ async def add():
                 raise Exception(f'Shard {miss_shards} are already in Servers')
 
             for s in new_shard_ids:
-                shard_map[s] = ConsistentHashMap()
-                
-            semaphore = asyncio.Semaphore(DOCKER_TASK_BATCH_SIZE)  # Limit concurrent Docker operations
+                shard_map[s] = create_hash_map(ROUTING_ENGINE, hash_function=HASH_FUNCTION)
     
-            async def spawn_container(docker: Docker, serv_id: int, server: str):
-                """Create and start a new Docker container for a server instance"""
+            async def spawn_container(server: str):
+                """Start a container for a server instance, from the warm pool if possible"""
                 await asyncio.sleep(0)  # Yield to event loop
-                async with semaphore:  # Limit concurrent Docker operations
-                    try:
-                        # Configure container
-                        container_config = {
-                            'image': 'server:v2',  # Docker image to use
-                            'detach': True,  # Run in background
-                            'env': [f'SERVER_ID={serv_id}', 
-                                    'DEBUG=true',
-                                    'POSTGRES_HOST=localhost',
-                                    'POSTGRES_PORT=5432',
-                                    'POSTGRES_USER=postgres',
-                                    'POSTGRES_PASSWORD=postgres',
-                                    'POSTGRES_DB_NAME=postgres'  
-                                ],  # Environment variables
-                            'hostname': server,  # Container hostname
-                            'tty': True,  # Allocate a terminal
-                        }
-
-                        # Create or replace container
-                        container = await docker.containers.create_or_replace(
-                            name=server,
-                            config=container_config,
-                        )
-                        # Connect to network
-                        LB = await docker.networks.get('LB')
-                        await LB.connect({'Container': container.id, 'EndpointConfig': {'Aliases': [server]}})
-                        
-                        if DEBUG:
-                            print(f'{Fore.LIGHTGREEN_EX}CREATE | Created container for {server}{Style.RESET_ALL}', file=sys.stderr)
-                        
-                        # Start container
-                        await container.start()
-                        
-                        if DEBUG:
-                            print(f'{Fore.MAGENTA}SPAWN | Started container for {server}{Style.RESET_ALL}', file=sys.stderr)
-                    except Exception as e:
-                        if DEBUG:
-                            print(f'{Fore.RED}ERROR | {e}{Style.RESET_ALL}', file=sys.stderr)
+                try:
+                    serv_ids[server], warm = await containers.spawn(server)
+                    if DEBUG:
+                        action = 'Claimed warm' if warm else 'Created and started'
+                        print(f'{Fore.MAGENTA}SPAWN | {action} container for {server}{Style.RESET_ALL}', file=sys.stderr)
+                except Exception as e:
+                    if DEBUG:
+                        print(f'{Fore.RED}ERROR | {e}{Style.RESET_ALL}', file=sys.stderr)
                             
-            async with Docker() as docker:
-                new_tasks = []
-                for server in server_names:
-                    Servers.add(server)
-                    heartbeat_fail_count[server] = 0
-                    serv_ids[server] = serv_id
-                    serv_id += 1
-                    new_tasks.append(spawn_container(docker, serv_id, server))
-                    print(f"Added {server} to hash map. Current servers: {Servers.getServerList()}")
-                    print(f"Server slots for {server}: {Servers.server_slots[server]}")
-
-                await asyncio.gather(*new_tasks, return_exceptions=True)
-
-
-            async def copy_shards_to_container(
-                server: str,
-                shards: List[str],
-                semaphore: asyncio.Semaphore,
-                servers_flatlined: Optional[List[str]]=None
-            ):
-
-                if servers_flatlined is None:
-                    servers_flatlined = []
-
-                global shard_map
-
-                await asyncio.sleep(0)
-
-                async def post_config_wrapper(
-                    session: aiohttp.ClientSession,
-                    server: str,
-                    payload: dict,
-                ):
-                    await asyncio.sleep(0)
-
-                    async with semaphore:
-                        for _ in range(50):
-                            try:
-                                async with session.get(f'http://{server}:5000/heartbeat') as response:
-                                    if response.status == 200:
-                                        break
-                            except Exception:
-                                pass
-                            await asyncio.sleep(2)
-                        else:
-                            raise Exception()
-
-                        async with session.post(f'http://{server}:5000/config',json=payload) as response:
-                            await response.read()
-
-                        return response
-    
-                async def get_copy_wrapper(
-                    session: aiohttp.ClientSession,
-                    server: str,
-                    payload: dict,
-                ):
-                    await asyncio.sleep(0)
-
-                    async with semaphore:
-                        async with session.get(f'http://{server}:5000/copy',
-                                            json=payload) as response:
-                            await response.read()
-
-                        return response
-
-                async def post_write_wrapper(
-                    session: aiohttp.ClientSession,
-                    server: str,
-                    payload: dict,
-                ):
-                    # Allow other tasks to run
-                    await asyncio.sleep(0)
-
-                    async with semaphore:
-                        async with session.post(f'http://{server}:5000/write',json=payload) as response:
-                            await response.read()
-
-                        return response
-                    
-                call_server_shards: dict[str, list[tuple[str, int]]] = {}
-
-                # For each shard K in `shards`:
-                async with pool.acquire() as conn:
-                    async with conn.transaction():
-                        stmt = await conn.prepare(
-                            '''
-                            SELECT
-                                valid_at
-                            FROM
-                                ShardT
-                            WHERE
-                                shard_id = $1::TEXT;
-                            ''')
-
-                        for shard in shards:
-                            if len(shard_map[shard]) == 0:
-                                continue
-
-                            server = shard_map[shard].find(random.randint(100000, 999999))
-                            if len(servers_flatlined) > 0:
-                                while server in servers_flatlined:
-                                    server = shard_map[shard].find(random.randint(100000, 999999))
-
-                            shard_valid_at: int = await stmt.fetchval(shard)
-
-                            if server not in call_server_shards:
-                                call_server_shards[server] = []
-
-                            call_server_shards[server].append((shard, shard_valid_at))
-
-                timeout = aiohttp.ClientTimeout(connect=REQUEST_TIMEOUT)
-                async with aiohttp.ClientSession(timeout=timeout) as session:
-
-                    config_task = asyncio.create_task(
-                        post_config_wrapper(
-                            session,
-                            server,
-                            payload={
-                                "shards": shards
-                            }
-                        )
-                    )
-                    config_response = await asyncio.gather(*[config_task], return_exceptions=True)
-                    config_response = (None if isinstance(config_response[0], BaseException)
-                                    else config_response[0])
-
-                    if config_response is None or config_response.status != 200:
-                        raise Exception(f'Failed to add shards to {server}')
-
-                    tasks = [asyncio.create_task(
-                        get_copy_wrapper(
-                            session,
-                            server,
-                            payload={
-                                "shards": [shard[0] for shard in shards],
-                                "valid_at": [shard[1] for shard in shards],
-                            }
-                        )
-                    ) for server, shards in call_server_shards.items()]
-
-                    copy_responses = await asyncio.gather(*tasks, return_exceptions=True)
-                    copy_responses = [None if isinstance(response, BaseException)
-                                    else response
-                                    for response in copy_responses]
-
-                    all_data: dict[str, tuple[list, int]] = {}
-
-                    for (response, server_shards) in zip(copy_responses,
-                                                        call_server_shards.values()):
-                        if response is None or response.status != 200:
-                            raise Exception(f'Failed to copy shards to {server}')
-
-                        data: dict = await response.json()
-
-                        for shard_id, valid_at in server_shards:
-                            all_data[shard_id] = (data[shard_id], valid_at)
-
-                    tasks = [asyncio.create_task(
-                        post_write_wrapper(
-                            session,
-                            server,
-                            payload={
-                                'shard': shard,
-                                'data': data,
-                                'admin': True,
-                                'valid_at': valid_at,
-                            }
-                        )
-                    ) for shard, (data, valid_at) in all_data.items()]
-
-                    write_responses = await asyncio.gather(*tasks, return_exceptions=True)
-                    write_responses = [None if isinstance(response, BaseException)
-                                    else response
-                                    for response in write_responses]
-
-                    if any(response is None or response.status != 200
-                            for response in write_responses):
-                        raise Exception(f'Failed to write shards to {server}')
-
-            await asyncio.sleep(0)
-            
-            new_tasks = [asyncio.create_task(
-                copy_shards_to_container(
-                    ser,
-                    servers[ser],
-                    semaphore
-                )
-            ) for ser in server_names]
-
-            await asyncio.gather(*new_tasks,return_exceptions=True)
-
-            for ser in server_names:
-                for shard in servers[ser]:
-                    shard_map[shard].add(ser)
+            new_tasks = []
+            for server in server_names:
+                Servers.add(server, weights.get(server, 1))
+                heartbeat_fail_count[server] = 0
+                new_tasks.append(spawn_container(server))
+                print(f"Added {server} to hash map. Current servers: {Servers.getServerList()}")
+                print(f"Key space share for {server}: {Servers.ownership_fraction()[server]:.3f}")
+
+            await asyncio.gather(*new_tasks, return_exceptions=True)
+
+            if REPLICA_PLACEMENT == 'ring':
+                # Servers take the shards whose successor lists they joined (old
+                # servers only new shards); the replicas pushed out are dropped
+                # once the copies finish
+                replica_sets = place_replicas(shard_map.keys())
+                servers = {hostname: placed for hostname, placed in missing_replicas(replica_sets).items()
+                           if placed or hostname in server_names}
+
+            # Writes to the shards being copied would miss the new replicas;
+            # data operations on all other shards keep going
+            await shard_locked.enter_async_context(shard_locks.write(new_shard_ids.union(*servers.values())))
+
+            failed = await fill_replicas(servers)
+
+            if REPLICA_PLACEMENT == 'ring':
+                drop_displaced_replicas(replica_sets, failed)
+
+            # New servers whose copies failed leave again, and so do new
+            # shards that did not get a single replica
+            for ser in failed.keys() & set(server_names):
+                Servers.remove(ser)
+                heartbeat_fail_count.pop(ser, None)
+                serv_ids.pop(ser, None)
+                try:
+                    await containers.remove(ser)
+                except Exception as e:
+                    if DEBUG:
+                        print(f'{Fore.RED}ERROR | {e}{Style.RESET_ALL}', file=sys.stderr)
+            for shard_id in new_shard_ids:
+                if len(shard_map[shard_id]) == 0:
+                    del shard_map[shard_id]
+            new_shards = [shard for shard in new_shards if shard['shard_id'] in shard_map]
 
             if len(new_shards) > 0:
                 async with pool.acquire() as conn:
@@ -939,6 +1120,12 @@ async def add():
                               shard['shard_size'])
                              for shard in new_shards])  
 
+            await save_state()
+
+            if failed:
+                raise Exception('Failed to copy shards to ' +
+                                ', '.join(f'{ser} ({result})' for ser, result in failed.items()))
+
             final_hostnames = Servers.getServerList()
     
 
@@ -989,7 +1176,7 @@ async def delete():
         if len(servers) > n:
             raise Exception('Length of hostname list is more than instances to delete')
 
-        async with mutexLock:
+        async with mutexLock, contextlib.AsyncExitStack() as shard_locked:
             
             choices = set(Servers.getServerList())
             if not set(servers).issubset(choices):
@@ -998,32 +1185,53 @@ async def delete():
             choices = list(choices - set(servers))
             random_hostnames = random.sample(choices, k=n - len(servers))
             servers.extend(random_hostnames)
+
+            # Wait for data operations still using the removed replicas
+            affected = set().union(*(host_shards.get(hostname, ()) for hostname in servers))
+            await shard_locked.enter_async_context(shard_locks.write(affected))
             
-            semaphore = asyncio.Semaphore(DOCKER_TASK_BATCH_SIZE)  
-            
-            async def remove_container(docker: Docker, hostname: str):
+            async def remove_container(hostname: str):
                 """Stop and remove a Docker container"""
                 await asyncio.sleep(0) 
-                async with semaphore:  
-                    try:
-                        container = await docker.containers.get(hostname)
-                        await container.stop(timeout=STOP_TIMEOUT)
-                        await container.delete(force=True)
+                try:
+                    await containers.remove(hostname)
+                    
+                    if DEBUG:
+                        print(f'{Fore.LIGHTYELLOW_EX}REMOVE | Deleted container for {hostname}{Style.RESET_ALL}', file=sys.stderr)
+                except Exception as e:
+                    if DEBUG:
+                        print(f'{Fore.RED}ERROR | {e}{Style.RESET_ALL}', file=sys.stderr)
                         
-                        if DEBUG:
-                            print(f'{Fore.LIGHTYELLOW_EX}REMOVE | Deleted container for {hostname}{Style.RESET_ALL}', file=sys.stderr)
-                    except Exception as e:
-                        if DEBUG:
-                            print(f'{Fore.RED}ERROR | {e}{Style.RESET_ALL}', file=sys.stderr)
-                            
-            async with Docker() as docker:  
-                tasks = []
-                for hostname in servers:
-                    Servers.remove(hostname)
-                    heartbeat_fail_count.pop(hostname, None)
-                    tasks.append(remove_container(docker, hostname))
-
-                await asyncio.gather(*tasks, return_exceptions=True)
+            tasks = []
+            for hostname in servers:
+                Servers.remove(hostname)
+                heartbeat_fail_count.pop(hostname, None)
+                for shard_id in list(host_shards.pop(hostname, ())):
+                    shard_map[shard_id].remove(hostname)
+                for family in (backend_requests, backend_errors, backend_duration):
+                    family.remove(hostname)
+                tasks.append(remove_container(hostname))
+
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+            failed = {}
+            if REPLICA_PLACEMENT == 'ring':
+                # The shards that lost a replica take the next server on the
+                # ring, under the write locks taken above
+                replica_sets = place_replicas(affected)
+                lost = {shard_id for shard_id in affected if len(shard_map[shard_id]) == 0}
+                if lost and DEBUG:
+                    print(f'{Fore.YELLOW}WARNING | No replica left to copy shards {sorted(lost)} from{Style.RESET_ALL}', file=sys.stderr)
+                servers = {hostname: [shard_id for shard_id in placed if shard_id not in lost]
+                           for hostname, placed in missing_replicas(replica_sets).items()}
+                failed = await fill_replicas({hostname: placed for hostname, placed in servers.items() if placed})
+                drop_displaced_replicas(replica_sets, failed)
+
+            await save_state()
+
+            if failed:
+                raise Exception('Failed to copy shards to ' +
+                                ', '.join(f'{ser} ({result})' for ser, result in failed.items()))
 
             final_hostnames = Servers.getServerList()
         
@@ -1035,7 +1243,96 @@ async def delete():
         'status': 'success'
         }), 200
     except Exception as e:
-        print(e)   
+        if DEBUG:
+            print(f'{Fore.RED}ERROR | {e}{Style.RESET_ALL}', file=sys.stderr)
+        return jsonify(err_payload(e)), 400
+
+@app.route('/weight',methods=['GET'])
+async def weight_get():
+    example_payload = {
+        "weights" : {"Server0": 2, "Server1": 0.5}
+    }
+
+    return jsonify({
+        "message": "Change server weights",
+        "payload_structure": example_payload,
+        "status": "success"
+    }), 200
+
+@app.route('/weight',methods=['PUT'])
+async def set_weight():
+    """Change the weights of running servers in Servers and every shard map"""
+    global Servers,shard_map
+
+    await asyncio.sleep(0)
+
+    try:
+        payload: dict = await request.get_json()
+
+        if payload is None:
+            raise Exception('Payload is empty')
+
+        weights: dict[str, float] = {k: float(v) for k, v in dict(payload.get('weights', {})).items()}
+
+        if not weights:
+            raise Exception('No weights given')
+        if any(w <= 0 for w in weights.values()):
+            raise Exception('Server weights must be greater than 0')
+
+        async with mutexLock:
+
+            choices = set(Servers.getServerList())
+            if not set(weights).issubset(choices):
+                raise Exception(f'Hostnames {set(weights) - choices} are not in Servers')
+
+            for hostname, weight in weights.items():
+                Servers.set_weight(hostname, weight)
+                for shard_id in host_shards.get(hostname, ()):
+                    shard_map[shard_id].set_weight(hostname, weight)
+                print(f"Set weight of {hostname} to {weight}. Key space share: {Servers.ownership_fraction()[hostname]:.3f}")
+
+            final_weights = dict(Servers.weights)
+
+            await save_state()
+
+        return jsonify({
+            'message': {
+                'N': len(Servers),
+                'weights': final_weights
+            },
+            'status': 'success'
+        }), 200
+    except Exception as e:
+        if DEBUG:
+            print(f'{Fore.RED}ERROR | {e}{Style.RESET_ALL}', file=sys.stderr)
+        return jsonify(err_payload(e)), 400
+
+@app.route('/rebalance',methods=['POST'])
+async def rebalance():
+    """Re-place displaced virtual nodes in Servers and every shard map and report the migration plan"""
+    global Servers,shard_map
+
+    await asyncio.sleep(0)
+
+    try:
+        async with mutexLock:
+            servers_plan = Servers.rebalance()
+            shards_plan = {shard_id: shard_hash_map.rebalance() for shard_id, shard_hash_map in shard_map.items()}
+            await save_state()
+
+        # Replicas hold whole shards, so a new owner already has the rows:
+        # the plan only says which key ranges now read from a different replica
+        return jsonify({
+            'message': {
+                'servers': servers_plan,
+                'shards': {shard_id: plan for shard_id, plan in shards_plan.items() if plan},
+            },
+            'status': 'success'
+        }), 200
+    except Exception as e:
+        if DEBUG:
+            print(f'{Fore.RED}ERROR | {e}{Style.RESET_ALL}', file=sys.stderr)
+        return jsonify(err_payload(e)), 400
 
 @app.route('/read',methods=['GET'])
 async def read_get():
@@ -1076,7 +1373,10 @@ async def read():
         shard_ids: list[str] = []
         shard_valid_ats: list[int] = []
 
-        async with mutexLock:
+        # No mutexLock: shared locks on the queried shards only keep /add, /rm and
+        # writes to those shards out; FOR SHARE keeps the shards' valid_at stable
+        locked = await lookup_shards(low, high)
+        async with shard_locks.read(locked):
             async with pool.acquire() as con:
                 async with con.transaction():
                     async for record in con.cursor(
@@ -1093,6 +1393,7 @@ async def read():
                         ''',
                             low, high):
 
+                        check_locked(record["shard_id"], locked)
                         shard_ids.append(record["shard_id"])
                         shard_valid_ats.append(record["valid_at"])  
 
@@ -1111,7 +1412,7 @@ async def read():
                         server_name: str,
                         json_payload: Dict
                     ):
-                        
+                    
                         await asyncio.sleep(0)
 
                         async with session.get(f'http://{server_name}:5000/read',json=json_payload) as response:
@@ -1120,7 +1421,7 @@ async def read():
                         return response
     
                     timeout = aiohttp.ClientTimeout(connect=REQUEST_TIMEOUT)
-                    async with aiohttp.ClientSession(timeout=timeout) as session:
+                    async with aiohttp.ClientSession(timeout=timeout, trace_configs=[backend_trace]) as session:
                         for shard_id, shard_valid_at in zip(shard_ids, shard_valid_ats):
                             if len(shard_map[shard_id]) == 0:
                                 continue
@@ -1139,17 +1440,17 @@ async def read():
                                         }
                                     )
                                 ))
-                        
+                    
                         serv_response = await asyncio.gather(*new_tasks, return_exceptions=True)
                         serv_response = [None if isinstance(r, BaseException) else r for r in serv_response]
-                        
+                    
                     for r in serv_response:
                         if r is None or r.status != 200:
                             raise Exception('Failed to read data entry')
-                            
+                        
                         _r = dict(await r.json())
                         data.extend(_r["data"])
-                
+            
         return jsonify({
             'shards_queried': shard_ids,
             'data': data,
@@ -1196,7 +1497,9 @@ async def write():
             
         shard_data: Dict[str, Tuple[List[Dict[str, Any]], int]] = {}
         
-        async with mutexLock:
+        # Writes to different shards run concurrently; each shard's replicas see its writes in one order
+        shard_ids = await lookup_shards_of([int(entry["stud_id"]) for entry in data])
+        async with shard_locks.write(shard_ids):
             async with pool.acquire() as con:
                 async with con.transaction():
                     get_shard_id_stmt = await con.prepare(
@@ -1239,6 +1542,7 @@ async def write():
                             raise Exception(f'Shard for {stud_id = } does not exist')
 
                         shard_id: str = record["shard_id"]
+                        check_locked(shard_id, shard_ids)
 
                         if shard_id not in shard_data:
                             shard_data[shard_id] = ([], 0)
@@ -1265,7 +1569,7 @@ async def write():
                         server_names = shard_map[shard_id].getServerList()
                         timeout = aiohttp.ClientTimeout(
                             connect=REQUEST_TIMEOUT)
-                        async with aiohttp.ClientSession(timeout=timeout) as session:
+                        async with aiohttp.ClientSession(timeout=timeout, trace_configs=[backend_trace]) as session:
                             tasks = [asyncio.create_task(
                                 write_wrapper(
                                     session=session,
@@ -1348,7 +1652,8 @@ async def update():
         if stud_id != data["stud_id"]:
             raise Exception("Cannot change stud_id field")
 
-        async with mutexLock:
+        shard_ids = await lookup_shards(stud_id, stud_id)
+        async with shard_locks.write(shard_ids):
             async with pool.acquire() as con:
                 async with con.transaction():
                     response = await con.fetchrow(
@@ -1371,6 +1676,7 @@ async def update():
 
                     shard_id: str = response["shard_id"]
                     shard_valid_at: int = response["valid_at"]
+                    check_locked(shard_id, shard_ids)
 
                     server_names = shard_map[shard_id].getServerList()
                     valid_at = shard_valid_at
@@ -1388,7 +1694,7 @@ async def update():
                         return response
 
                     timeout = aiohttp.ClientTimeout(connect=REQUEST_TIMEOUT)
-                    async with aiohttp.ClientSession(timeout=timeout) as session:
+                    async with aiohttp.ClientSession(timeout=timeout, trace_configs=[backend_trace]) as session:
                         tasks = [asyncio.create_task(
                             update_wrapper(
                                 session=session,
@@ -1465,7 +1771,8 @@ async def dele():
         if stud_id == -1:
             raise Exception('Payload dont contain stud_id')
 
-        async with mutexLock:
+        shard_ids = await lookup_shards(stud_id, stud_id)
+        async with shard_locks.write(shard_ids):
             async with pool.acquire() as con:
                 async with con.transaction():
                     record = await con.fetchrow(
@@ -1487,6 +1794,7 @@ async def dele():
 
                     shard_id: str = record["shard_id"]
                     shard_valid_at: int = record["valid_at"]
+                    check_locked(shard_id, shard_ids)
 
                     server_names = shard_map[shard_id].getServerList()
                     
@@ -1503,7 +1811,7 @@ async def dele():
                         return response
     
                     timeout = aiohttp.ClientTimeout(connect=REQUEST_TIMEOUT)
-                    async with aiohttp.ClientSession(timeout=timeout) as session:
+                    async with aiohttp.ClientSession(timeout=timeout, trace_configs=[backend_trace]) as session:
                         tasks = [asyncio.create_task(
                             del_wrapper(
                                 session=session,
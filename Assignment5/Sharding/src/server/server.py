@@ -103,9 +103,12 @@ async def heartbeat():
 @app.route('/config', methods=["POST"])
 async def server_config():
     """ Assigns the list of shards whose data the server must store """
+    global HOSTNAME
     try:
         payload: dict = await request.get_json()
         shard_list: list = payload.get("shards", [])
+        # A container claimed from the warm pool was started as warm-<id>
+        HOSTNAME = payload.get("hostname", HOSTNAME)
 
         response_payload = {}
         async with pool.acquire() as conn:
@@ -161,11 +164,9 @@ async def copy():
                     async for row in stmt.cursor(shard_id, valid_time):
                         shard_data[shard_id].append(dict(row))
 
-                fetch_tasks = [
-                    asyncio.create_task(fetch_records(shard, ts))
-                    for shard, ts in zip(shards, valid_at)
-                ]
-                await asyncio.gather(*fetch_tasks)
+                # One cursor at a time: a connection runs a single operation
+                for shard, ts in zip(shards, valid_at):
+                    await fetch_records(shard, ts)
 
         shard_data['status'] = 'success'
         return jsonify(shard_data), 200
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The load balancer's modules import each other by their file names
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'load_balancer'))
@@ -0,0 +1,69 @@
+import asyncio
+import collections
+
+import pytest
+
+import loadBalancer as lb
+from RoutingEngines import create_hash_map
+
+SHARDS = [f'sh{i}' for i in range(1, 21)]
+
+
+@pytest.fixture
+def ring(monkeypatch):
+    """Ring placement over six servers, with no containers or databases behind them."""
+    servers = create_hash_map('ring', hostnames=[f'Server{i}' for i in range(6)], hash_function='md5')
+    monkeypatch.setattr(lb, 'Servers', servers)
+    monkeypatch.setattr(lb, 'REPLICA_PLACEMENT', 'ring')
+    monkeypatch.setattr(lb, 'shard_map', {})
+    monkeypatch.setattr(lb, 'host_shards', {})
+    monkeypatch.setattr(lb, 'heartbeat_fail_count', {})
+    return servers
+
+
+def test_shards_spread_over_replica_sets(ring):
+    assert len(ring) > lb.REPLICA_COUNT
+    replica_sets = lb.place_replicas(SHARDS)
+    assert all(len(set(replicas)) == lb.REPLICA_COUNT for replicas in replica_sets.values())
+    assert len({tuple(replicas) for replicas in replica_sets.values()}) >= len(ring)
+    counts = collections.Counter(hostname for replicas in replica_sets.values() for hostname in replicas)
+    assert set(counts) == set(ring.getServerList())
+
+
+def test_placement_ignores_shard_bounds(monkeypatch):
+    # With the polynomial hash, every multiple of 512 used to map to the same slot
+    monkeypatch.setattr(lb, 'Servers', create_hash_map('ring', hostnames=[f'Server{i}' for i in range(6)]))
+    replica_sets = lb.place_replicas(SHARDS)
+    assert len({tuple(replicas) for replicas in replica_sets.values()}) > 1
+
+
+def test_rm_re_replicates_lost_shards(ring, monkeypatch):
+    copies = []
+
+    async def copy_shards_to_container(server, shards, semaphore):
+        copies.append((server, sorted(shards)))
+
+    async def no_op(*args):
+        pass
+
+    monkeypatch.setattr(lb, 'copy_shards_to_container', copy_shards_to_container)
+    monkeypatch.setattr(lb, 'save_state', no_op)
+    monkeypatch.setattr(lb.containers, 'remove', no_op)
+
+    for shard_id, replicas in lb.place_replicas(SHARDS).items():
+        lb.shard_map[shard_id] = create_hash_map('ring', hash_function='md5')
+        for hostname in replicas:
+            lb.add_replica(shard_id, hostname)
+    affected = set(lb.host_shards['Server2'])
+
+    async def scenario():
+        client = lb.app.test_client()
+        response = await client.delete('/rm', json={'n': 1, 'servers': ['Server2']})
+        assert response.status_code == 200
+
+    asyncio.run(scenario())
+
+    assert copies and {shard for _, shards in copies for shard in shards} == affected
+    for shard_id, replicas in lb.place_replicas(SHARDS).items():
+        assert 'Server2' not in replicas
+        assert sorted(lb.shard_map[shard_id].getServerList()) == sorted(replicas)
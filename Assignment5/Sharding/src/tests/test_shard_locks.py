@@ -0,0 +1,153 @@
+import asyncio
+
+from ShardLocks import RWLock, ShardLocks
+
+
+async def settle():
+    """Let every ready task run until it blocks again."""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_waiters_served_in_arrival_order():
+    async def scenario():
+        lock = RWLock()
+        order = []
+
+        async def take(name, write):
+            await lock.acquire(write)
+            order.append(name)
+
+        await lock.acquire(True)
+        tasks = [asyncio.create_task(take('r1', False)),
+                 asyncio.create_task(take('w', True)),
+                 asyncio.create_task(take('r2', False))]
+        await settle()
+        assert order == [] and lock.waiting() == 3
+        lock.release(True)
+        await settle()
+        assert order == ['r1']
+        lock.release(False)
+        await settle()
+        assert order == ['r1', 'w']
+        lock.release(True)
+        await settle()
+        assert order == ['r1', 'w', 'r2']
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+
+
+def test_readers_queue_behind_waiting_writer():
+    async def scenario():
+        lock = RWLock()
+        await lock.acquire(False)
+        writer = asyncio.create_task(lock.acquire(True))
+        await settle()
+        reader = asyncio.create_task(lock.acquire(False))
+        await settle()
+        assert lock.readers == 1 and not writer.done() and not reader.done()
+        lock.release(False)
+        await settle()
+        assert writer.done() and lock.writer and not reader.done()
+        lock.release(True)
+        await settle()
+        assert reader.done() and lock.readers == 1
+
+    asyncio.run(scenario())
+
+
+def test_cancel_while_queued_wakes_next_waiter():
+    async def scenario():
+        lock = RWLock()
+        await lock.acquire(False)
+        writer = asyncio.create_task(lock.acquire(True))
+        await settle()
+        reader = asyncio.create_task(lock.acquire(False))
+        await settle()
+        writer.cancel()
+        await settle()
+        assert writer.cancelled()
+        assert reader.done() and lock.readers == 2 and not lock.writer and lock.waiting() == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancel_waiter_dropped_by_release():
+    """A queued reader cancelled before the writer releases leaves the lock usable."""
+    async def scenario():
+        lock = RWLock()
+        await lock.acquire(True)
+        reader = asyncio.create_task(lock.acquire(False))
+        await asyncio.sleep(0)
+        reader.cancel()
+        lock.release(True)  # Drops the cancelled waiter before the reader task runs
+        await settle()
+        assert reader.cancelled()
+        assert (lock.readers, lock.writer, lock.waiting()) == (0, False, 0)
+        await asyncio.wait_for(lock.acquire(True), 1)
+
+    asyncio.run(scenario())
+
+
+def test_cancel_after_grant_gives_lock_back():
+    async def scenario():
+        lock = RWLock()
+        await lock.acquire(True)
+        writer = asyncio.create_task(lock.acquire(True))
+        await settle()
+        lock.release(True)  # Grants the lock to the queued writer ...
+        writer.cancel()  # ... which is cancelled before it resumes
+        await settle()
+        assert writer.cancelled()
+        assert (lock.readers, lock.writer, lock.waiting()) == (0, False, 0)
+
+    asyncio.run(scenario())
+
+
+def test_shards_locked_in_sorted_order():
+    async def scenario():
+        locks = ShardLocks()
+        async with locks.write(['sh1']):
+            # Waits on sh1 before taking sh2, so sh2 stays free meanwhile
+            blocked = asyncio.create_task(locks.write(['sh2', 'sh1']).__aenter__())
+            await settle()
+            assert not blocked.done()
+            assert locks.stats() == {'sh1': {'readers': 0, 'writer': True, 'waiting': 1}}
+            async with locks.read(['sh2']):
+                pass
+            blocked.cancel()
+            await settle()
+        assert locks.stats() == {}
+
+    asyncio.run(scenario())
+
+
+def test_opposite_order_requests_do_not_deadlock():
+    async def scenario():
+        locks = ShardLocks()
+        done = []
+
+        async def update(shard_ids):
+            async with locks.write(shard_ids):
+                await asyncio.sleep(0)
+                done.append(shard_ids)
+
+        requests = [['sh1', 'sh2', 'sh3'], ['sh3', 'sh2', 'sh1'], ['sh2', 'sh1']] * 20
+        await asyncio.wait_for(asyncio.gather(*[update(shard_ids) for shard_ids in requests]), 5)
+        assert len(done) == len(requests) and locks.stats() == {}
+
+    asyncio.run(scenario())
+
+
+def test_on_wait_reports_mode():
+    async def scenario():
+        waits = []
+        locks = ShardLocks(on_wait=lambda mode, seconds: waits.append(mode))
+        async with locks.read(['sh1', 'sh2']):
+            pass
+        async with locks.write([]):
+            pass
+        assert waits == ['read', 'write']
+
+    asyncio.run(scenario())